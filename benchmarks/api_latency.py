@@ -0,0 +1,76 @@
+"""Measure the JSON poll list against the HTML index it replaces for dashboards.
+
+Usage: python benchmarks/api_latency.py [--questions 10000] [--requests 200]
+
+Seeds ``--questions`` open polls into a scratch copy of the default (SQLite)
+database, then times ``--requests`` GETs of the first page of ``polls:api_polls``
+through the test client: with a warm cache, with a warm cache and gzip, and with
+the cache cleared before every request. The HTML index, which shows the same
+page of polls, is timed alongside for comparison.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kuPolls.settings')
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.core.cache import caches
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+    from django.utils import timezone
+    from polls.benchmark import percentile
+    from polls.models import Question
+
+    directory = tempfile.mkdtemp(prefix='polls-api-bench-')
+    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        now = timezone.now()
+        Question.objects.bulk_create([Question(question_text='Poll %d?' % i, pub_date=now - timezone.timedelta(
+            minutes=i)) for i in range(args.questions)], batch_size=5000)
+        client = Client()
+        cache = caches[settings.POLLS_RESULTS_CACHE]
+        runs = (
+            ('api warm', reverse('polls:api_polls'), {}, False),
+            ('api gzip', reverse('polls:api_polls'), {'HTTP_ACCEPT_ENCODING': 'gzip'}, False),
+            ('api cold', reverse('polls:api_polls'), {}, True),
+            ('html page', reverse('polls:index'), {}, False),
+        )
+        print("%-9s %9s %9s %9s %10s" % ('run', 'p50 ms', 'p95 ms', 'p99 ms', 'bytes'))
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, url, headers, cold in runs:
+                latencies = []
+                for _ in range(args.requests):
+                    if cold:
+                        cache.clear()
+                    started = time.perf_counter()
+                    response = client.get(url, **headers)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                latencies.sort()
+                print("%-9s %9.2f %9.2f %9.2f %10d" % (
+                    name, percentile(latencies, 0.50), percentile(latencies, 0.95), percentile(latencies, 0.99),
+                    len(response.content)))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
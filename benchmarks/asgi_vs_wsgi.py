@@ -0,0 +1,125 @@
+"""Compare the sync views under WSGI with the async views under ASGI.
+
+Usage: python benchmarks/asgi_vs_wsgi.py [--requests 500] [--concurrency 50]
+
+Each stack runs in its own process on a fresh scratch database:
+
+* ``wsgi``: kuPolls.wsgi.application with the sync views, driven by a pool of
+  ``--concurrency`` threads.
+* ``asgi``: kuPolls.asgi.application with POLLS_ASYNC_VIEWS enabled, driven by
+  ``--concurrency`` concurrent tasks on one event loop.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kuPolls.settings')
+
+ENDPOINTS = ('index', 'results', 'vote')
+
+
+def run_stack(stack, db_name, args):
+    """Seed a scratch database and drive every endpoint through one stack."""
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_name
+    settings.ALLOWED_HOSTS = ['127.0.0.1']
+    # Every simulated voter comes from 127.0.0.1.
+    settings.POLLS_RATE_LIMITS = {}
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.urls import reverse
+    from kuPolls.asgi import application as asgi_application
+    from kuPolls.wsgi import application as wsgi_application
+    from polls.benchmark import AsgiClient, InProcessClient, login_cookie, seed, summarize, timed
+    from polls.models import Choice
+
+    for name in ('polls', 'django.request'):
+        logging.getLogger(name).setLevel(logging.CRITICAL)
+    call_command('migrate', verbosity=0)
+    question_ids, user_ids = seed(args.questions, args.choices, args.users, args.votes)
+    logins = [login_cookie(user) for user in get_user_model().objects.filter(pk__in=user_ids[:50])]
+    choice_ids = {}
+    for choice_id, question_id in Choice.objects.values_list('pk', 'question_id'):
+        choice_ids.setdefault(question_id, []).append(choice_id)
+
+    def request_args(name):
+        cookie, token = random.choice(logins)
+        question_id = random.choice(question_ids)
+        if name == 'index':
+            return ('GET', reverse('polls:index'), cookie)
+        if name == 'results':
+            return ('GET', reverse('polls:results', args=(question_id,)), cookie)
+        body = ('choice=%d' % random.choice(choice_ids[question_id])).encode()
+        return ('POST', reverse('polls:vote', args=(question_id,)), cookie, token, body)
+
+    report = {}
+    for name in ENDPOINTS:
+        calls = [request_args(name) for _ in range(args.requests)]
+        started = time.perf_counter()
+        if stack == 'wsgi':
+            client = InProcessClient(wsgi_application)
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                samples = list(pool.map(lambda call: timed(client, *call), calls))
+        else:
+            client = AsgiClient(asgi_application)
+            limit = asyncio.Semaphore(args.concurrency)
+
+            async def bounded(call):
+                async with limit:
+                    return await client.timed(*call)
+
+            async def run_all():
+                return await asyncio.gather(*[bounded(call) for call in calls])
+
+            samples = asyncio.run(run_all())
+        report[name] = summarize(samples, time.perf_counter() - started)
+    return report
+
+
+def main():
+    """Run both stacks in child processes and print a comparison."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--choices', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--votes', type=int, default=5000)
+    parser.add_argument('--stack', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stack:
+        print(json.dumps(run_stack(args.stack, args.db, args)))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='polls-asgi-bench-') as directory:
+        for stack in ('wsgi', 'asgi'):
+            command = [sys.executable, os.path.abspath(__file__), '--stack', stack,
+                       '--db', os.path.join(directory, stack + '.sqlite3')]
+            for option in ('requests', 'concurrency', 'questions', 'choices', 'users', 'votes'):
+                command += ['--' + option, str(getattr(args, option))]
+            env = dict(os.environ, POLLS_ASYNC_VIEWS=str(stack == 'asgi'))
+            output = subprocess.run(command, capture_output=True, text=True, check=True, env=env).stdout
+            results[stack] = json.loads(output.strip().splitlines()[-1])
+    print("%-5s %-8s %9s %9s %9s %10s" % ('stack', 'endpoint', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s'))
+    for stack, report in results.items():
+        for name, result in report.items():
+            print("%-5s %-8s %9.2f %9.2f %9.2f %10.1f" % (
+                stack, name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['requests_per_s']))
+
+
+if __name__ == '__main__':
+    main()
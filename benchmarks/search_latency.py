@@ -0,0 +1,80 @@
+"""Measure poll search latency with the FTS5 index against LIKE scans.
+
+Usage: python benchmarks/search_latency.py [--questions 100000] [--searches 200]
+
+Seeds ``--questions`` polls with four choices each into a scratch copy of the
+default (SQLite) database, then runs the same random one- and two-word searches
+through ``polls.search.search`` and through the ``LIKE '%term%'`` filter the
+admin used before, fetching one index page of results each time.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kuPolls.settings')
+
+WORDS = ('python rust java kotlin swift pizza pasta sushi curry tacos football tennis hockey rugby chess '
+         'summer winter autumn spring holiday movie music novel podcast theatre coffee tea juice water').split()
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--searches', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=20)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.db import connection
+    from django.db.models import Q
+    from django.utils import timezone
+    from polls.benchmark import percentile
+    from polls.models import Choice, Question
+    from polls.search import search
+
+    directory = tempfile.mkdtemp(prefix='polls-search-bench-')
+    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        random.seed(0)
+        now = timezone.now()
+        started = time.perf_counter()
+        Question.objects.bulk_create([Question(question_text='Poll %d: %s or %s?' % (
+            i, random.choice(WORDS), random.choice(WORDS)), pub_date=now) for i in range(args.questions)],
+            batch_size=5000)
+        Choice.objects.bulk_create([Choice(question_id=question_id, choice_text=random.choice(WORDS))
+                                    for question_id in Question.objects.values_list('pk', flat=True)
+                                    for _ in range(4)], batch_size=5000)
+        print("Seeded %d questions in %.1f s" % (args.questions, time.perf_counter() - started))
+
+        def like(terms):
+            words = Q()
+            for word in terms.split():
+                words &= Q(question_text__icontains=word) | Q(choice__choice_text__icontains=word)
+            return Question.objects.filter(pk__in=Question.objects.filter(words).values('pk')).order_by('-pk')
+
+        searches = [' '.join(random.sample(WORDS, random.choice((1, 2)))) for _ in range(args.searches)]
+        print("%-6s %9s %9s %9s" % ('method', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for name, run in (('fts5', lambda terms: search(Question.objects.all(), terms)), ('like', like)):
+            latencies = []
+            for terms in searches:
+                started = time.perf_counter()
+                list(run(terms)[:args.page_size])
+                latencies.append((time.perf_counter() - started) * 1000)
+            latencies.sort()
+            print("%-6s %9.2f %9.2f %9.2f" % (
+                name, percentile(latencies, 0.50), percentile(latencies, 0.95), percentile(latencies, 0.99)))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Measure ballot throughput when many writers vote for the same choice, with and without shards.
+
+Usage: python benchmarks/shard_contention.py [--writers 16] [--votes 200] [--shards 8]
+
+Every writer casts ``--votes`` ballots for one hot choice through
+``polls.voting.cast_vote``, once with a single counter row and once with
+``--shards`` shard rows. The benchmark runs on a scratch copy of the configured
+default database. SQLite serialises every writer on the database lock, so the
+row-lock gain only shows on a backend with row locking such as MySQL or
+PostgreSQL; point DJANGO_SETTINGS_MODULE at such settings to see it.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kuPolls.settings')
+
+
+def run(shards, users, question, choice, writers, votes):
+    """Let every writer vote for the same choice and return (ballots/s, errors)."""
+    from django.conf import settings
+    from django.db import DatabaseError, connection
+    from polls.voting import cast_vote
+
+    settings.POLLS_VOTE_SHARDS = shards
+    errors = [0]
+    lock = threading.Lock()
+
+    def writer(mine):
+        for user in mine:
+            try:
+                cast_vote(user, question, choice)
+            except DatabaseError:
+                with lock:
+                    errors[0] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=writer, args=(users[i * votes:(i + 1) * votes],)) for i in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return (writers * votes - errors[0]) / elapsed, errors[0]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--votes', type=int, default=200, help="Ballots per writer.")
+    parser.add_argument('--shards', type=int, default=8)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.utils import timezone
+    from polls.models import Choice, ChoiceShard, Question
+
+    directory = tempfile.mkdtemp(prefix='polls-shard-bench-')
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        User = get_user_model()
+        count = args.writers * args.votes
+        User.objects.bulk_create([User(username='shard%d' % i, password='!') for i in range(count * 2)])
+        users = list(User.objects.order_by('pk'))
+        print("%-8s %12s %8s" % ('shards', 'ballots/s', 'errors'))
+        for shards, batch in ((0, users[:count]), (args.shards, users[count:])):
+            question = Question.objects.create(question_text='Hot question', pub_date=timezone.now())
+            choice = Choice.objects.create(question=question, choice_text='Hot choice')
+            connection.close()
+            rate, errors = run(shards, batch, question, choice, args.writers, args.votes)
+            tally = Choice.objects.with_tally().get(pk=choice.pk).tally
+            rows = ChoiceShard.objects.filter(choice=choice).count()
+            print("%-8d %12.1f %8d   (tally %d, %d shard rows)" % (shards, rate, errors, tally, rows))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Compare read/write throughput of concurrent voters with and without the SQLite tuning profile.
+
+Usage: python benchmarks/sqlite_concurrency.py [--readers 8] [--writers 4] [--seconds 5]
+
+Each profile runs in its own process on a fresh scratch database:
+
+* ``baseline``: rollback journal and no pragmas, like a bare db.sqlite3.
+* ``tuned``: the ``SQLITE_PRAGMAS`` profile from kuPolls/settings.py (WAL, busy timeout, ...).
+
+Readers load a question's tallies, writers cast ballots through ``polls.voting.cast_vote``.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kuPolls.settings')
+
+# What a bare db.sqlite3 gets: rollback journal and the sqlite3 module's default 5 s timeout.
+BASELINE = {'journal_mode': 'DELETE'}
+
+
+def run_profile(profile, db_name, args):
+    """Seed a scratch database, hammer it with readers and writers and return the counts."""
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_name
+    if profile == 'baseline':
+        settings.SQLITE_PRAGMAS = BASELINE
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import OperationalError, close_old_connections, connection
+    from polls.benchmark import seed
+    from polls.models import Choice, Question
+    from polls.voting import cast_vote
+
+    call_command('migrate', verbosity=0)
+    question_ids, user_ids = seed(args.questions, args.choices, args.users, 0)
+    users = list(get_user_model().objects.filter(pk__in=user_ids))
+    questions = {question.pk: question for question in Question.objects.all()}
+    choices = {}
+    for choice in Choice.objects.all():
+        choices.setdefault(choice.question_id, []).append(choice)
+    connection.close()
+    counts = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(kind):
+        while time.perf_counter() < deadline:
+            question_id = random.choice(question_ids)
+            try:
+                if kind == 'reads':
+                    list(Choice.objects.filter(question_id=question_id).values_list('choice_text', 'votes'))
+                else:
+                    cast_vote(random.choice(users), questions[question_id], random.choice(choices[question_id]))
+                key = kind
+            except OperationalError:
+                key = kind[:-1] + '_errors'
+            with lock:
+                counts[key] += 1
+        close_old_connections()
+        connection.close()
+
+    threads = [threading.Thread(target=worker, args=('reads',)) for _ in range(args.readers)]
+    threads += [threading.Thread(target=worker, args=('writes',)) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts['reads_per_s'] = round(counts['reads'] / args.seconds, 1)
+    counts['writes_per_s'] = round(counts['writes'] / args.seconds, 1)
+    return counts
+
+
+def main():
+    """Run every profile in a child process and print a comparison."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--choices', type=int, default=4)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--profile', choices=('baseline', 'tuned'), help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args.db, args)))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='polls-sqlite-bench-') as directory:
+        for profile in ('baseline', 'tuned'):
+            command = [sys.executable, os.path.abspath(__file__), '--profile', profile,
+                       '--db', os.path.join(directory, profile + '.sqlite3')]
+            for option in ('readers', 'writers', 'seconds', 'questions', 'choices', 'users'):
+                command += ['--' + option, str(getattr(args, option))]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            results[profile] = json.loads(output.strip().splitlines()[-1])
+    print("%-9s %10s %10s %12s %13s" % ('profile', 'reads/s', 'writes/s', 'read errors', 'write errors'))
+    for profile, counts in results.items():
+        print("%-9s %10.1f %10.1f %12d %13d" % (profile, counts['reads_per_s'], counts['writes_per_s'],
+                                                counts['read_errors'], counts['write_errors']))
+
+
+if __name__ == '__main__':
+    main()
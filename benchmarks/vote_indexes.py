@@ -0,0 +1,107 @@
+"""Compare query plans and latency of the vote lookups before and after the 0015 indexes.
+
+Usage: python benchmarks/vote_indexes.py [--votes 1000000] [--questions 100]
+
+The benchmark builds a scratch SQLite database in a temporary directory, seeds it at
+migration 0014 (no indexes), times the hot lookups, migrates to 0015 and times
+them again.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kuPolls.settings')
+
+
+def setup_django(db_name):
+    """Point the default database at a scratch file and set Django up."""
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_name
+    django.setup()
+
+
+def seed(questions, choices, votes):
+    """Insert users, questions, choices and votes with raw bulk inserts."""
+    from django.db import connection, transaction
+    from django.utils import timezone
+    users = votes // questions
+    now = timezone.now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO auth_user (id, password, is_superuser, username, first_name, last_name, email,"
+            " is_staff, is_active, date_joined) VALUES (%s, '', 0, %s, '', '', '', 0, 1, %s)",
+            [(u, 'user%d' % u, now) for u in range(1, users + 1)])
+        cursor.executemany(
+            "INSERT INTO polls_question (id, question_text, pub_date, end_date) VALUES (%s, %s, %s, NULL)",
+            [(q, 'Question %d' % q, now) for q in range(1, questions + 1)])
+        cursor.executemany(
+            "INSERT INTO polls_choice (id, question_id, choice_text, votes) VALUES (%s, %s, %s, 0)",
+            [((q - 1) * choices + c, q, 'Choice %d' % c)
+             for q in range(1, questions + 1) for c in range(1, choices + 1)])
+        for q in range(1, questions + 1):
+            cursor.executemany(
+                "INSERT INTO polls_vote (question_id, selected_choice_id, user_id) VALUES (%s, %s, %s)",
+                [(q, (q - 1) * choices + 1 + (u % choices), u) for u in range(1, users + 1)])
+
+
+def lookups(questions, users):
+    """Return the hot lookups issued by the views, as (label, queryset) pairs."""
+    from django.db.models import Count
+    from django.utils import timezone
+    from polls.models import Question, Vote
+    question_id = questions // 2
+    user_id = users // 2
+    return [
+        ('tally by (question, choice)',
+         Vote.objects.filter(question_id=question_id).values('selected_choice').annotate(total=Count('id'))),
+        ('ballot by (user, question)',
+         Vote.objects.filter(user_id=user_id, question_id__in=range(1, 21))),
+        ('voters by (question, user)',
+         Vote.objects.filter(question_id=question_id, user_id__lte=50)),
+        ('index by pub_date',
+         Question.objects.filter(pub_date__lte=timezone.now()).order_by('-pub_date')[:20]),
+    ]
+
+
+def measure(label, questions, users, repeat):
+    """Print the query plan and mean latency of every lookup."""
+    print("== %s ==" % label)
+    for name, queryset in lookups(questions, users):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.all())
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        print("%-28s %9.3f ms" % (name, elapsed))
+        for line in queryset.explain().splitlines():
+            print("    " + line)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--votes', type=int, default=1000000)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--choices', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='polls-bench-')
+    setup_django(os.path.join(directory, 'bench.sqlite3'))
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    call_command('migrate', 'polls', '0014', verbosity=0)
+    seed(args.questions, args.choices, args.votes)
+    users = args.votes // args.questions
+    measure("before (0014, FK indexes only)", args.questions, users, args.repeat)
+    call_command('migrate', 'polls', '0015', verbosity=0)
+    measure("after (0015, composite indexes)", args.questions, users, args.repeat)
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,11 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from polls.warmup import warm_templates
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kuPolls.settings')
 
 application = get_asgi_application()
+
+# Only the serving processes compile the templates, not migrate or the other commands.
+warm_templates()
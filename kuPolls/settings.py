@@ -44,7 +44,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'polls.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'polls.middleware.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -54,11 +56,19 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'kuPolls.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Keep compiled templates in memory outside development, so template edits still show up
+# without a restart when DEBUG is on; the WSGI and ASGI applications compile them all at startup.
+if config('TEMPLATE_CACHE', default=not DEBUG, cast=bool):
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -66,6 +76,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # APP_DIRS cannot be combined with explicit loaders, so the app directories loader is listed here.
+            'loaders': TEMPLATE_LOADERS,
         },
     },
 ]
@@ -80,9 +92,76 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=0, cast=int),
     }
 }
 
+# Read replicas of the polls app. POLLS_SQLITE_REPLICAS adds that many SQLite
+# copies of the primary for local testing; keep them in sync with
+# `python manage.py sync_replicas --interval 1`. Tests read them from the test database.
+for replica in range(1, config('POLLS_SQLITE_REPLICAS', default=0, cast=int) + 1):
+    DATABASES['replica%d' % replica] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / ('db.replica%d.sqlite3' % replica),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['polls.routers.ReplicaRouter']
+
+# Applied to every new SQLite connection by polls.sqlite.apply_pragmas.
+# https://www.sqlite.org/pragma.html
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-20000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=268435456, cast=int),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='ku-polls'),
+    },
+    # Used by the {% cache %} tag for the index rows and the detail choice list;
+    # set FRAGMENT_CACHE_BACKEND to django.core.cache.backends.dummy.DummyCache to turn it off.
+    'template_fragments': {
+        'BACKEND': config('FRAGMENT_CACHE_BACKEND',
+                          default=config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')),
+        'LOCATION': config('CACHE_LOCATION', default='ku-polls'),
+    },
+}
+
+
+# Logging
+# https://docs.djangoproject.com/en/3.1/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'audit': {'()': 'polls.audit.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        # Queues audit records in memory; a listener thread writes them to a rotating file.
+        'audit': {
+            '()': 'polls.audit.AuditHandler',
+            'filename': config('POLLS_AUDIT_LOG', default=str(BASE_DIR / 'audit.log')),
+            'max_bytes': config('POLLS_AUDIT_LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int),
+            'backup_count': config('POLLS_AUDIT_LOG_BACKUPS', default=5, cast=int),
+            'formatter': 'audit',
+        },
+    },
+    'loggers': {
+        'polls': {'handlers': ['console'], 'level': config('POLLS_LOG_LEVEL', default='INFO')},
+        'polls.audit': {'handlers': ['audit'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -127,3 +206,62 @@ AUTHENTICATION_BACKENDS = (
  # username/password authentication
 'django.contrib.auth.backends.ModelBackend',
 )
+
+# Polls
+POLLS_INDEX_PAGE_SIZE = config('POLLS_INDEX_PAGE_SIZE', default=20, cast=int)
+POLLS_RESULTS_CACHE = config('POLLS_RESULTS_CACHE', default='default')
+POLLS_RESULTS_CACHE_TIMEOUT = config('POLLS_RESULTS_CACHE_TIMEOUT', default=300, cast=int)
+# The ETag and Last-Modified of the index, the results pages and the poll list API come
+# from versions kept in POLLS_RESULTS_CACHE, so every worker process must share that
+# cache (Memcached, Redis, the database cache). With a per-process cache such as
+# LocMemCache a vote handled by one worker leaves the versions of the others unchanged
+# and their ETags keep matching stale copies, so these validators are then off unless
+# DEBUG, where runserver is a single process; `check --deploy` flags them turned on.
+POLLS_CONDITIONAL_GET = config('POLLS_CONDITIONAL_GET', cast=bool, default=DEBUG or not CACHES.get(
+    POLLS_RESULTS_CACHE, {}).get('BACKEND', '').endswith('.LocMemCache'))
+POLLS_VOTE_BUFFER = {
+    'ENABLED': config('POLLS_VOTE_BUFFER', default=False, cast=bool),
+    'FLUSH_INTERVAL_MS': config('POLLS_VOTE_BUFFER_FLUSH_INTERVAL_MS', default=200, cast=int),
+    'MAX_BATCH': config('POLLS_VOTE_BUFFER_MAX_BATCH', default=500, cast=int),
+    'DURABILITY': config('POLLS_VOTE_BUFFER_DURABILITY', default='memory'),
+    'PATH': config('POLLS_VOTE_BUFFER_PATH', default=str(BASE_DIR / 'vote_buffer.ndjson')),
+}
+POLLS_QUERY_BUDGETS = {
+    'default': {
+        'queries': config('POLLS_QUERY_BUDGET', default=20, cast=int),
+        'db_ms': config('POLLS_DB_MS_BUDGET', default=100, cast=float),
+        'wall_ms': config('POLLS_WALL_MS_BUDGET', default=500, cast=float),
+    },
+    'IndexView': {'queries': 5},
+    'DetailView': {'queries': 5},
+    'ResultsView': {'queries': 5},
+    'vote': {'queries': 10},
+    'poll_list': {'queries': 3},
+    'poll_detail': {'queries': 5},
+    'poll_results': {'queries': 4},
+    'vote_batch': {'queries': 12},
+}
+POLLS_ASYNC_VIEWS = config('POLLS_ASYNC_VIEWS', default=False, cast=bool)
+POLLS_LIVE_INTERVAL_MS = config('POLLS_LIVE_INTERVAL_MS', default=1000, cast=int)
+POLLS_VOTE_SHARDS = config('POLLS_VOTE_SHARDS', default=0, cast=int)
+POLLS_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+POLLS_REPLICA_STICKY_SECONDS = config('POLLS_REPLICA_STICKY_SECONDS', default=5, cast=int)
+# Token buckets per user and per client ip: up to `capacity` requests at once, refilled at `per_second`.
+POLLS_RATE_LIMIT_CACHE = config('POLLS_RATE_LIMIT_CACHE', default='default')
+POLLS_RATE_LIMITS = {
+    'vote': {
+        'user': {'capacity': config('POLLS_VOTE_RATE_USER_BURST', default=20, cast=int),
+                 'per_second': config('POLLS_VOTE_RATE_USER_PER_SECOND', default=1, cast=float)},
+        'ip': {'capacity': config('POLLS_VOTE_RATE_IP_BURST', default=200, cast=int),
+               'per_second': config('POLLS_VOTE_RATE_IP_PER_SECOND', default=20, cast=float)},
+    },
+    # One token per request; each of its ballots also takes a 'vote' token.
+    'vote_batch': {
+        'user': {'capacity': config('POLLS_VOTE_BATCH_RATE_USER_BURST', default=5, cast=int),
+                 'per_second': config('POLLS_VOTE_BATCH_RATE_USER_PER_SECOND', default=0.2, cast=float)},
+        'ip': {'capacity': config('POLLS_VOTE_BATCH_RATE_IP_BURST', default=100, cast=int),
+               'per_second': config('POLLS_VOTE_BATCH_RATE_IP_PER_SECOND', default=10, cast=float)},
+    },
+}
+# Keep it within the 'vote' user burst, or full batches are always refused.
+POLLS_VOTE_BATCH_MAX = config('POLLS_VOTE_BATCH_MAX', default=20, cast=int)
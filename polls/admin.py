@@ -1,6 +1,8 @@
 """Administration site."""
 from django.contrib import admin
+from django.contrib.admin.views.main import SEARCH_VAR
 from .models import Question, Choice
+from .search import is_ranked, search
 
 
 class ChoiceInLine(admin.TabularInline):
@@ -23,6 +25,30 @@ class QuestionAdmin(admin.ModelAdmin):
     list_filter = ['pub_date']
     search_fields = ['question_text']
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search the questions and their choices through the full-text index instead of LIKE scans.
+
+        :param request is the HttpRequest object.
+        :param queryset is the questions left by the filters.
+        :param search_term is the text typed in the search box.
+        :return (matching questions, False as the results never contain duplicates).
+        """
+        if not search_term.strip():
+            return queryset, False
+        return search(queryset, search_term), False
+
+    def get_ordering(self, request):
+        """
+        Order search results best match first, unless a column header was clicked.
+
+        :param request is the HttpRequest object.
+        :return the default ordering of the change list.
+        """
+        if request.GET.get(SEARCH_VAR, '').strip():
+            return ['search__rank'] if is_ranked(self.model.objects.db) else ['-pk']
+        return super().get_ordering(request)
+
 
 admin.site.site_url = 'http://127.0.0.1:8000/polls/'
 admin.site.register(Question, QuestionAdmin)
@@ -0,0 +1,198 @@
+"""Read-only JSON API: the open polls, one poll with its choices, and a poll's results.
+
+Rows are read with ``.values()``, so no model instances are built, and the
+encoded body is kept in the results cache together with its gzip
+compression. Bodies are keyed by the same versions as the HTML pages: the list,
+paginated like the index, by the index state that any edit, publication or end
+moves, a poll by ``Question.version`` and its results by their results version.
+A cached page of the list costs no query; a poll or its results cost one small
+query for that version or for the question's existence. A matching
+``If-None-Match`` gets a 304 after it.
+The gzip body is sent under its own ETag, the identity one with ``-gz`` added.
+Pass ``?fields=`` with a comma separated list to keep only some fields.
+"""
+import hashlib
+import json
+import re
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from . import cache as results_cache
+from .conditional import add_validators, index_state, not_modified, results_etag, results_version
+from .models import Choice, Question
+from .pagination import keyset_page
+from .results import get_results
+
+POLL_FIELDS = ('id', 'question_text', 'pub_date', 'end_date')
+DETAIL_FIELDS = POLL_FIELDS + ('choices',)
+RESULTS_FIELDS = ('question', 'total', 'registered', 'participation', 'choices')
+
+# Bodies shorter than this are not worth compressing, as in GZipMiddleware.
+MIN_GZIP_LENGTH = 200
+
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def error(message, status):
+    """
+    Build a JSON error response.
+
+    :param message is the error message.
+    :param status is the HTTP status code.
+    :return the response.
+    """
+    return JsonResponse({'error': message}, status=status)
+
+
+def selected_fields(request, allowed):
+    """
+    Read the fields a client asked for.
+
+    :param request is the HttpRequest object.
+    :param allowed is the fields of the resource, in output order.
+    :return the requested fields in output order, all of them when ``?fields=`` is missing.
+    :raise ValueError if an unknown field is asked for.
+    """
+    requested = request.GET.get('fields')
+    if not requested:
+        return allowed
+    names = {name.strip() for name in requested.split(',') if name.strip()}
+    unknown = names.difference(allowed)
+    if unknown:
+        raise ValueError("Unknown field(s): %s. Choose from: %s." % (', '.join(sorted(unknown)), ', '.join(allowed)))
+    return tuple(name for name in allowed if name in names)
+
+
+def encode(data):
+    """
+    Encode data as compact JSON.
+
+    :param data is the data, which may hold dates and times.
+    :return (body, gzip compressed body) as bytes.
+    """
+    body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return body, compress_string(body)
+
+
+def respond(request, key, build, etag=None, last_modified=None):
+    """
+    Answer with the cached JSON body for a key, building it on a miss.
+
+    :param request is the HttpRequest object.
+    :param key is the cache key of the body, which must include its version and fields.
+    :param build is a function returning the data to encode.
+    :param etag is the unquoted ETag of the resource, or None.
+    :param last_modified is the modification time of the resource, or None.
+    :return the JSON response, gzip encoded when the client accepts it, or a 304.
+    """
+    accepts_gzip = _accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if etag and accepts_gzip:
+        # The gzip and identity bodies are different bytes, so they must not share a strong ETag.
+        etag += '-gz'
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        encoded = results_cache.get_body(key)
+        if encoded is None:
+            encoded = encode(build())
+            results_cache.set_body(key, encoded)
+        body, compressed = encoded
+        if len(body) >= MIN_GZIP_LENGTH and accepts_gzip:
+            response = HttpResponse(compressed, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body, content_type='application/json')
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return add_validators(response, etag, last_modified)
+
+
+def published_state(pk):
+    """
+    Load the version and modification time of a question the index would list.
+
+    :param pk is the id of the question.
+    :return (version, modified), or None if the question does not exist or is not published yet.
+    """
+    return Question.objects.filter(pk=pk, pub_date__lte=timezone.now()).values_list('version', 'modified').first()
+
+
+def poll_list(request):
+    """
+    List one page of the polls that are open for voting, newest first.
+
+    Pass the ``next_cursor`` of a page as ``?cursor=`` to get the next one. Pages
+    are cached under the index state, which edits, publications and ends move.
+
+    :param request is the HttpRequest object.
+    :return JSON with a ``polls`` list and the ``next_cursor``, null on the last page.
+    """
+    try:
+        fields = selected_fields(request, POLL_FIELDS)
+    except ValueError as exc:
+        return error(str(exc), 400)
+    cursor = request.GET.get('cursor', '')
+    state = index_state(request)
+    version = hashlib.md5(('%d|%s|%s' % (state['version'], state['since'].isoformat(), cursor)).encode()).hexdigest()
+    key = 'polls:%s:%s' % (version, ','.join(fields))
+
+    def build():
+        questions = Question.objects.open().values('pk', 'pub_date', *fields)
+        rows, next_cursor = keyset_page(questions, cursor, settings.POLLS_INDEX_PAGE_SIZE)
+        return {'polls': [{name: row[name] for name in fields} for row in rows], 'next_cursor': next_cursor}
+    # No Last-Modified: a poll that ends leaves the list without anything getting newer.
+    return respond(request, key, build, version if settings.POLLS_CONDITIONAL_GET else None)
+
+
+def poll_detail(request, pk):
+    """
+    Show a poll with its choices.
+
+    :param request is the HttpRequest object.
+    :param pk is the id of the question.
+    :return JSON with the poll's fields and a ``choices`` list, or a 404 if the poll is not published.
+    """
+    if not request.user.is_authenticated:
+        return error("Authentication required.", 401)
+    try:
+        fields = selected_fields(request, DETAIL_FIELDS)
+    except ValueError as exc:
+        return error(str(exc), 400)
+    state = published_state(pk)
+    if state is None:
+        return error("No question matches the given query.", 404)
+    key = 'poll:%d:%d:%s' % (pk, state[0], ','.join(fields))
+
+    def build():
+        columns = [name for name in fields if name != 'choices']
+        data = Question.objects.filter(pk=pk).values(*columns).first() if columns else {}
+        if 'choices' in fields:
+            data['choices'] = list(Choice.objects.filter(question_id=pk).order_by('pk').values('id', 'choice_text'))
+        return data
+    return respond(request, key, build, 'poll%d-v%d' % (pk, state[0]), state[1])
+
+
+def poll_results(request, pk):
+    """
+    Show a poll's results: every choice's tally, share and rank, the total and the participation.
+
+    :param request is the HttpRequest object.
+    :param pk is the id of the question.
+    :return JSON results, as computed by polls.results, or a 404 if the poll is not published.
+    """
+    if not request.user.is_authenticated:
+        return error("Authentication required.", 401)
+    try:
+        fields = selected_fields(request, RESULTS_FIELDS)
+    except ValueError as exc:
+        return error(str(exc), 400)
+    if published_state(pk) is None:
+        return error("No question matches the given query.", 404)
+    version = results_version(request, pk)
+    key = 'results:%d:%d:%s' % (pk, version, ','.join(fields))
+
+    def build():
+        results = get_results(pk, version)
+        return {name: results[name] for name in fields}
+    return respond(request, key, build, results_etag(request, pk))
@@ -6,3 +6,12 @@ class PollsConfig(AppConfig):
     """Config the name of the app."""
 
     name = 'polls'
+
+    def ready(self):
+        """Connect the signal receivers and the connection setup."""
+        from django.db.backends.signals import connection_created
+        from . import audit, checks, signals  # noqa: F401
+        from .middleware import install_query_counter
+        from .sqlite import apply_pragmas
+        connection_created.connect(apply_pragmas, dispatch_uid='polls.sqlite.apply_pragmas')
+        connection_created.connect(install_query_counter, dispatch_uid='polls.middleware.install_query_counter')
@@ -0,0 +1,188 @@
+"""Async views for index page, result page and voting, for ASGI deployments.
+
+Django 3.1 has no async ORM, so each view gathers all of its database work into
+a single ``sync_to_async`` call and does everything else on the event loop.
+They are enabled in polls/urls.py by ``POLLS_ASYNC_VIEWS``.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import get_user
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils import timezone
+from . import audit, cache as results_cache
+from .buffer import get_buffer
+from .conditional import (add_validators, index_etag, index_last_modified, not_modified, results_etag,
+                          results_version)
+from .models import Question
+from .pagination import keyset_page, offset_page
+from .ratelimit import take, too_many_requests
+from .results import get_results
+from .routers import primary
+from .search import search
+from .snapshots import get_snapshot, render_results
+from .voting import cast_vote
+
+
+async def _load_user(request):
+    """
+    Resolve the lazy ``request.user`` off the event loop.
+
+    :param request is the HttpRequest object.
+    :return the user, also stored back on the request.
+    """
+    request.user = await sync_to_async(get_user)(request)
+    return request.user
+
+
+def _index_page(request):
+    """
+    Load one page of the index, the same way IndexView does, unless the client's copy is current.
+
+    :return (etag, last_modified, page) where page is (questions, next_cursor, next_page),
+            or None on a conditional hit.
+    """
+    etag, last_modified = index_etag(request), index_last_modified(request)
+    if not_modified(request, etag, last_modified) is not None:
+        return etag, last_modified, None
+    now = timezone.now()
+    questions = Question.objects.filter(pub_date__lte=now).with_status(now)
+    if request.GET.get('status') == 'open':
+        questions = questions.open(now)
+    terms = request.GET.get('q', '').strip()
+    next_cursor = next_page = None
+    if terms:
+        questions, next_page = offset_page(search(questions, terms), request.GET.get('page'),
+                                           settings.POLLS_INDEX_PAGE_SIZE)
+    else:
+        questions, next_cursor = keyset_page(questions.order_by('-pub_date', '-pk'), request.GET.get('cursor'),
+                                             settings.POLLS_INDEX_PAGE_SIZE)
+    return etag, last_modified, (questions, next_cursor, next_page)
+
+
+async def index(request):
+    """
+    Show one page of published questions.
+
+    :param request is the HttpRequest object.
+    :return the index page.
+    """
+    await _load_user(request)
+    etag, last_modified, page = await sync_to_async(_index_page)(request)
+    if page is None:
+        return add_validators(not_modified(request, etag, last_modified), etag, last_modified)
+    questions, next_cursor, next_page = page
+    return add_validators(render(request, 'polls/index.html', {
+        'latest_question_list': questions,
+        'next_cursor': next_cursor,
+        'next_page': next_page,
+        'q': request.GET.get('q', '').strip(),
+        'status': request.GET.get('status', 'all'),
+    }), etag, last_modified)
+
+
+def _results_content(question_id, version):
+    """Return the rendered results page of a version from the cache or the snapshot, rendering it on a miss."""
+    content = results_cache.get_results(question_id, version)
+    if content is not None:
+        return content
+    with primary():
+        try:
+            question = Question.objects.select_related('snapshot').get(pk=question_id)
+        except Question.DoesNotExist:
+            raise Http404("No question found matching the query")
+        snapshot = get_snapshot(question)
+        if snapshot is not None:
+            content = snapshot.html
+        else:
+            content = render_results(question, get_results(question.id, version))
+    results_cache.set_results(question_id, version, content)
+    return content
+
+
+def _results_page(request, pk):
+    """
+    Load a results page unless the client's copy is current.
+
+    :return (etag, content) where content is None on a conditional hit.
+    """
+    etag = results_etag(request, pk)
+    if not_modified(request, etag, None) is not None:
+        return etag, None
+    return etag, _results_content(pk, results_version(request, pk))
+
+
+async def results(request, pk):
+    """
+    Show the results of a question.
+
+    :param request is the HttpRequest object.
+    :param pk is the id of the question.
+    :return the results page, or a redirect to the login page.
+    """
+    user = await _load_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    etag, content = await sync_to_async(_results_page)(request, pk)
+    if content is None:
+        return add_validators(not_modified(request, etag, None), etag, None)
+    return add_validators(HttpResponse(content), etag, None)
+
+
+def _submit(request, user, question_id, choice_id):
+    """
+    Validate and record a ballot.
+
+    :return (outcome, question) where outcome is ended, no_choice or voted,
+            or ('limited', seconds to wait) when the user or ip is over the rate limit.
+    """
+    wait = take('vote', request, user)
+    if wait:
+        return 'limited', wait
+    try:
+        question = Question.objects.prefetch_related('choice_set').get(pk=question_id)
+    except Question.DoesNotExist:
+        raise Http404("No Question matches the given query.")
+    if not question.can_vote():
+        return 'ended', question
+    selected_choice = next((choice for choice in question.choice_set.all() if str(choice.id) == choice_id), None)
+    if selected_choice is None:
+        return 'no_choice', question
+    buffer = get_buffer()
+    if buffer is not None:
+        buffer.enqueue(user.id, question.id, selected_choice.id)
+    else:
+        cast_vote(user, question, selected_choice)
+    return 'voted', question
+
+
+async def vote(request, question_id):
+    """
+    Submit the vote for the poll.
+
+    :param request is the HttpRequest object.
+    :param question_id is the id of the question.
+    :return 429 if the user or the ip is over the vote rate limit,
+            redirect to index page if question can't be voted,
+            the question page with an error message if the choice is not selected,
+            redirect to the results page otherwise.
+    """
+    user = await _load_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    outcome, question = await sync_to_async(_submit)(request, user, question_id, request.POST.get('choice'))
+    if outcome == 'limited':
+        return too_many_requests(question)
+    if outcome == 'ended':
+        error = "You can't vote on this poll because this poll is already ended."
+        return HttpResponseRedirect(reverse('polls:index'), messages.error(request, error))
+    if outcome == 'no_choice':
+        return render(request, 'polls/detail.html', {
+            'question': question,
+            'error_message': "You didn't select a choice.",
+        })
+    audit.record('vote', request, user, question=question.id, choice=int(request.POST['choice']))
+    return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
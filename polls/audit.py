@@ -0,0 +1,122 @@
+"""Audit trail of logins, logouts, failed logins and votes.
+
+Events go to the ``polls.audit`` logger as structured records. The
+``AuditHandler`` configured for it in ``LOGGING`` only puts them on an
+in-memory queue; a ``QueueListener`` thread writes them to a rotating file as
+JSON lines, so the request thread never waits on log I/O.
+"""
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
+from django.dispatch import receiver
+
+log = logging.getLogger("polls.audit")
+
+
+def get_client_ip(request):
+    """Get the client's ip address."""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[-1].strip()
+    else:
+        ip = request.META.get('REMOTE_ADDR')
+    return ip
+
+
+def record(event, request=None, user=None, level=logging.INFO, **fields):
+    """
+    Log an audit event.
+
+    :param event is the name of the event, e.g. login or vote.
+    :param request is the HttpRequest object the event came from, if any.
+    :param user is the user, or the username, the event is about.
+    :param level is the logging level.
+    :param **fields is any other data to keep with the event.
+    """
+    if request is not None:
+        fields['ip'] = get_client_ip(request)
+    if user is not None:
+        fields['user'] = str(user)
+    log.log(level, event, extra={'audit': fields})
+
+
+@receiver(user_logged_in)
+def log_user_logged_in(sender, request, user, **kwargs):
+    """Log when user login."""
+    record('login', request, user)
+
+
+@receiver(user_logged_out)
+def log_user_logged_out(sender, request, user, **kwargs):
+    """Log when user logout."""
+    record('logout', request, user)
+
+
+@receiver(user_login_failed)
+def log_user_login_failed(sender, request, credentials, **kwargs):
+    """Log when user fail to login."""
+    record('login_failed', request, credentials.get('username'), level=logging.WARNING)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as one JSON object: time, level, event and the audit fields."""
+
+    def format(self, record):
+        """
+        Format a record.
+
+        :param record is the LogRecord.
+        :return the JSON text.
+        """
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        data.update(getattr(record, 'audit', {}))
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class AuditHandler(QueueHandler):
+    """Queue records in memory and write them to a rotating file from a listener thread."""
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5):
+        """
+        Create the file handler and start the listener.
+
+        :param filename is the path of the log file.
+        :param max_bytes is the size at which the file is rotated.
+        :param backup_count is the number of rotated files to keep.
+        """
+        # Created first so logging.shutdown() closes it after this handler has drained the queue.
+        self.target = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                          encoding='utf-8', delay=True)
+        super().__init__(queue.SimpleQueue())
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def reopen(self, filename):
+        """
+        Write out what is still queued, then send the next records to another file.
+
+        :param filename is the path of the new log file.
+        """
+        self.listener.stop()
+        self.target.close()
+        self.target = RotatingFileHandler(filename, maxBytes=self.target.maxBytes,
+                                          backupCount=self.target.backupCount, encoding='utf-8', delay=True)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def close(self):
+        """Write out what is still queued, then stop the listener and close the file."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.target.close()
+        super().close()
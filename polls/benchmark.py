@@ -0,0 +1,317 @@
+"""Helpers shared by the polls benchmarks: seeding, sessions and a WSGI request driver."""
+import io
+import math
+import random
+import statistics
+import threading
+import time
+from http.client import HTTPConnection
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.template.backends.django import Template
+from django.utils import timezone
+from .models import Choice, Question, Vote
+
+HOST = '127.0.0.1'
+
+
+def seed(questions, choices, users, votes, batch_size=1000):
+    """
+    Fill the database with polls, voters and ballots, then rebuild the tallies.
+
+    :param questions is the number of questions.
+    :param choices is the number of choices per question.
+    :param users is the number of voters.
+    :param votes is the number of ballots, capped at users * questions.
+    :param batch_size is the number of rows per bulk insert.
+    :return (question ids, user ids).
+    """
+    User = get_user_model()
+    now = timezone.now()
+    User.objects.bulk_create([User(username='bench%d' % i, password='!') for i in range(users)],
+                             batch_size=batch_size)
+    Question.objects.bulk_create([Question(question_text='Question %d' % i, pub_date=now)
+                                  for i in range(questions)], batch_size=batch_size)
+    question_ids = list(Question.objects.values_list('pk', flat=True))
+    Choice.objects.bulk_create([Choice(question_id=question_id, choice_text='Choice %d' % i)
+                                for question_id in question_ids for i in range(choices)], batch_size=batch_size)
+    user_ids = list(User.objects.filter(username__startswith='bench').values_list('pk', flat=True))
+    choice_ids = {}
+    for choice_id, question_id in Choice.objects.values_list('pk', 'question_id'):
+        choice_ids.setdefault(question_id, []).append(choice_id)
+    pairs = random.sample(range(len(user_ids) * len(question_ids)), min(votes, len(user_ids) * len(question_ids)))
+    ballots = []
+    for pair in pairs:
+        user_id, question_id = user_ids[pair % len(user_ids)], question_ids[pair // len(user_ids)]
+        ballots.append(Vote(user_id=user_id, question_id=question_id,
+                            selected_choice_id=random.choice(choice_ids[question_id])))
+    Vote.objects.bulk_create(ballots, batch_size=batch_size)
+    call_command('reconcile_votes', batch_size=batch_size, stdout=io.StringIO())
+    return question_ids, user_ids
+
+
+def login_cookie(user):
+    """
+    Create a logged in session and a CSRF token for a user.
+
+    :param user is the user to log in.
+    :return (Cookie header value, CSRF token for the X-CSRFToken header).
+    """
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    request = HttpRequest()
+    token = get_token(request)
+    cookie = '%s=%s; %s=%s' % (settings.SESSION_COOKIE_NAME, session.session_key,
+                               settings.CSRF_COOKIE_NAME, request.META['CSRF_COOKIE'])
+    return cookie, token
+
+
+def counting(application):
+    """
+    Wrap a WSGI application so every response reports its query count in X-Bench-Queries.
+
+    :param application is the WSGI application.
+    :return the wrapped application.
+    """
+    def wrapper(environ, start_response):
+        queries = [0]
+        head = []
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = application(environ, lambda status, headers, exc_info=None: head.append((status, headers)))
+            body = b''.join(response)
+            if hasattr(response, 'close'):
+                response.close()
+        status, headers = head[0]
+        start_response(status, headers + [('X-Bench-Queries', str(queries[0]))])
+        return [body]
+    return wrapper
+
+
+class RenderTimer:
+    """Add up the time spent rendering templates, in every thread, while the timer is active."""
+
+    def __init__(self):
+        """Create a stopped timer."""
+        self.seconds = 0.0
+        self.renders = 0
+        self._lock = threading.Lock()
+        self._render = None
+
+    def __enter__(self):
+        """Start timing Template.render of the Django template backend."""
+        self._render = render = Template.render
+
+        def timed_render(template, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return render(template, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.seconds += time.perf_counter() - started
+                    self.renders += 1
+
+        Template.render = timed_render
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop timing."""
+        Template.render = self._render
+
+
+class InProcessClient:
+    """Send requests straight into a WSGI application, without a socket."""
+
+    def __init__(self, application):
+        """
+        Create the client.
+
+        :param application is the WSGI application.
+        """
+        self.application = counting(application)
+
+    def request(self, method, path, cookie='', token='', body=b''):
+        """
+        Send one request.
+
+        :return (status code, number of queries).
+        """
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+            'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST, 'REMOTE_ADDR': HOST,
+            'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_COOKIE': cookie, 'HTTP_X_CSRFTOKEN': token,
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded', 'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body), 'wsgi.errors': io.StringIO(), 'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        result = {}
+
+        def start_response(status, headers, exc_info=None):
+            result['status'] = int(status.split()[0])
+            result['queries'] = int(dict(headers).get('X-Bench-Queries', 0))
+
+        body = self.application(environ, start_response)
+        b''.join(body)
+        return result['status'], result['queries']
+
+    def close(self):
+        """Nothing to release for in-process calls."""
+
+
+class AsgiClient:
+    """Send requests straight into an ASGI application, without a socket."""
+
+    def __init__(self, application):
+        """
+        Create the client.
+
+        :param application is the ASGI application.
+        """
+        self.application = application
+
+    async def request(self, method, path, cookie='', token='', body=b''):
+        """
+        Send one request.
+
+        :return (status code, number of queries); queries are not counted under ASGI and reported as 0.
+        """
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'client': (HOST, 0), 'server': (HOST, 80),
+            'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode()), (b'x-csrftoken', token.encode()),
+                        (b'content-type', b'application/x-www-form-urlencoded'),
+                        (b'content-length', str(len(body)).encode())],
+        }
+        incoming = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        result = {}
+
+        async def receive():
+            return incoming.pop(0) if incoming else {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                result['status'] = message['status']
+
+        await self.application(scope, receive, send)
+        return result['status'], 0
+
+    async def timed(self, *args, **kwargs):
+        """
+        Send one request and time it.
+
+        :return (latency in seconds, status code, number of queries).
+        """
+        started = time.perf_counter()
+        status, queries = await self.request(*args, **kwargs)
+        return time.perf_counter() - started, status, queries
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """WSGI server handling every connection in its own thread."""
+
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    """Request handler that does not log every request."""
+
+    def log_message(self, *args):
+        """Drop the access log line."""
+
+
+class ServerClient:
+    """Send requests over HTTP to a local threaded WSGI server."""
+
+    def __init__(self, application):
+        """
+        Start the server on a free local port.
+
+        :param application is the WSGI application.
+        """
+        self.server = make_server(HOST, 0, counting(application), server_class=_ThreadingWSGIServer,
+                                  handler_class=_QuietHandler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def request(self, method, path, cookie='', token='', body=b''):
+        """
+        Send one request.
+
+        :return (status code, number of queries).
+        """
+        http = HTTPConnection(HOST, self.port)
+        http.request(method, path, body=body or None, headers={
+            'Cookie': cookie, 'X-CSRFToken': token, 'Content-Type': 'application/x-www-form-urlencoded'})
+        response = http.getresponse()
+        response.read()
+        http.close()
+        return response.status, int(response.getheader('X-Bench-Queries', 0))
+
+    def close(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(values, fraction):
+    """
+    Return the nearest-rank percentile of the values.
+
+    :param values is a sorted list.
+    :param fraction is the percentile as a fraction, e.g. 0.95.
+    """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(samples, elapsed):
+    """
+    Summarize the samples of one endpoint.
+
+    :param samples is a list of (latency in seconds, status code, number of queries).
+    :param elapsed is the wall time of the run in seconds.
+    :return dict with request count, latency percentiles in ms, requests/s and queries per request.
+    """
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.mean(latencies), 3) if latencies else 0.0,
+        'requests_per_s': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'queries_per_request': round(statistics.mean(sample[2] for sample in samples), 2) if samples else 0.0,
+        'statuses': statuses,
+    }
+
+
+def timed(client, *args, **kwargs):
+    """
+    Send one request and time it.
+
+    :return (latency in seconds, status code, number of queries).
+    """
+    started = time.perf_counter()
+    status, queries = client.request(*args, **kwargs)
+    return time.perf_counter() - started, status, queries
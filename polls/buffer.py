@@ -0,0 +1,254 @@
+"""Write-behind buffer that batches ballots into bulk writes.
+
+When ``POLLS_VOTE_BUFFER['ENABLED']`` is set, the vote view only validates the
+ballot and enqueues it. A background flusher applies the queued ballots with
+``apply_ballots`` every ``FLUSH_INTERVAL_MS`` milliseconds, or as soon as
+``MAX_BATCH`` ballots are waiting. Later ballots by the same user on the same
+question replace earlier ones (last writer wins).
+
+``DURABILITY`` controls what survives a crash:
+
+* ``memory`` keeps the queue in process memory only.
+* ``file`` also appends every ballot to a journal next to ``PATH``.
+* ``fsync`` does the same and fsyncs the journal after every ballot.
+
+Every process keeps its own journal, ``PATH`` followed by its process id, and
+replays the journals left behind by processes that are no longer running when
+its buffer starts.
+
+When a batch fails, its ballots are applied one at a time. A ballot the
+database refuses, such as one for a choice deleted while it was queued, is
+logged and dropped; any other error puts the remaining ballots back in the
+queue for the next flush.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from .voting import apply_ballots
+
+log = logging.getLogger("polls")
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _running(pid):
+    """Check whether another process with this id may still be writing its journal."""
+    if pid == os.getpid():
+        return False
+    if os.name != 'posix':
+        # Signal 0 only probes a process on POSIX; elsewhere leave the other journals alone.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class VoteBuffer:
+    """In-process queue of ballots flushed to the database in batches."""
+
+    def __init__(self, flush_interval_ms=200, max_batch=500, durability='memory', path=None):
+        """
+        Create an idle buffer; call start() to run the flusher thread.
+
+        :param flush_interval_ms is the longest time a ballot waits before it is written.
+        :param max_batch is the number of waiting ballots that triggers an early flush.
+        :param durability is one of memory, file or fsync.
+        :param path is the base path of the journals used by the file and fsync modes.
+        """
+        if durability not in ('memory', 'file', 'fsync'):
+            raise ValueError("Unknown vote buffer durability: %s" % durability)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.durability = durability
+        self.path = '%s.%d' % (path, os.getpid()) if path else None
+        self.base_path = str(path) if path else None
+        self.pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._journal = None
+        if durability != 'memory':
+            self._replay()
+            self._journal = open(self.path, 'a')
+
+    def _orphaned_journals(self):
+        """List the journals of the processes that are gone, oldest first, including one without a process id."""
+        journals = []
+        for path in glob.glob(glob.escape(self.base_path) + '*'):
+            owner = re.fullmatch(r'(?:\.(\d+))?(\.flushing)?', path[len(self.base_path):])
+            if owner is None or owner.group(1) and _running(int(owner.group(1))):
+                continue
+            try:
+                journals.append((os.path.getmtime(path), not owner.group(2), path))
+            except FileNotFoundError:
+                continue
+        return [path for _, _, path in sorted(journals)]
+
+    def _replay(self):
+        """Load the ballots of the journals left behind by previous processes."""
+        for path in self._orphaned_journals():
+            try:
+                with open(path) as journal:
+                    for line in journal:
+                        try:
+                            user_id, question_id, choice_id = json.loads(line)
+                        except ValueError:
+                            continue
+                        self.pending[(user_id, question_id)] = choice_id
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process starting at the same time took it first.
+                continue
+        if self.pending:
+            with open(self.path, 'a') as journal:
+                for (user_id, question_id), choice_id in self.pending.items():
+                    journal.write(json.dumps([user_id, question_id, choice_id]) + '\n')
+
+    def _write_journal(self, user_id, question_id, choice_id):
+        """Append one ballot to the journal."""
+        self._journal.write(json.dumps([user_id, question_id, choice_id]) + '\n')
+        self._journal.flush()
+        if self.durability == 'fsync':
+            os.fsync(self._journal.fileno())
+
+    def enqueue(self, user_id, question_id, choice_id):
+        """
+        Queue a validated ballot.
+
+        :param user_id is the id of the voter.
+        :param question_id is the id of the question.
+        :param choice_id is the id of the selected choice.
+        """
+        with self._lock:
+            self.pending[(user_id, question_id)] = choice_id
+            if self._journal is not None:
+                self._write_journal(user_id, question_id, choice_id)
+            full = len(self.pending) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Write every queued ballot in one transaction.
+
+        :return the number of ballots that changed a tally.
+        """
+        with self._flush_lock:
+            with self._lock:
+                ballots, self.pending = self.pending, {}
+                if not ballots:
+                    return 0
+                if self._journal is not None:
+                    self._journal.close()
+                    os.replace(self.path, self.path + '.flushing')
+                    self._journal = open(self.path, 'a')
+            try:
+                applied = apply_ballots(ballots)
+            except Exception:
+                log.exception("Vote buffer flush of %d ballot(s) failed, retrying them one at a time.", len(ballots))
+                applied = self._apply_each(ballots)
+            finally:
+                if self.path and os.path.exists(self.path + '.flushing'):
+                    os.remove(self.path + '.flushing')
+            return applied
+
+    def _apply_each(self, ballots):
+        """
+        Apply ballots one per transaction, dropping those the database refuses.
+
+        :param ballots is a dict mapping (user id, question id) to the selected choice id.
+        :return the number of ballots that changed a tally.
+        """
+        applied = 0
+        ballots = list(ballots.items())
+        for index, (key, choice_id) in enumerate(ballots):
+            try:
+                applied += apply_ballots({key: choice_id})
+            except IntegrityError:
+                log.exception("Dropped the buffered ballot of user %d on question %d for choice %d.",
+                              key[0], key[1], choice_id)
+            except Exception:
+                self._requeue(ballots[index:])
+                raise
+        return applied
+
+    def _requeue(self, ballots):
+        """Put ballots back in the queue unless a newer ballot of the same user and question arrived meanwhile."""
+        with self._lock:
+            for key, choice_id in ballots:
+                if key not in self.pending:
+                    self.pending[key] = choice_id
+                    if self._journal is not None:
+                        self._write_journal(key[0], key[1], choice_id)
+
+    def _run(self):
+        """Flush on every interval or early wake-up until stopped."""
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Vote buffer flush failed, %d ballot(s) are waiting for the next one.",
+                              len(self.pending))
+        close_old_connections()
+
+    def start(self):
+        """Start the background flusher thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='polls-vote-buffer', daemon=True)
+            self._thread.start()
+
+    def drain(self):
+        """Stop the flusher and write every ballot still queued."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+def get_buffer():
+    """
+    Get the process-wide buffer, starting it on first use.
+
+    :return the VoteBuffer, or None when buffering is disabled.
+    """
+    global _buffer
+    options = settings.POLLS_VOTE_BUFFER
+    if not options.get('ENABLED'):
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = VoteBuffer(options.get('FLUSH_INTERVAL_MS', 200), options.get('MAX_BATCH', 500),
+                                 options.get('DURABILITY', 'memory'), options.get('PATH'))
+            _buffer.start()
+            atexit.register(drain)
+    return _buffer
+
+
+def drain():
+    """Shutdown hook that writes every queued ballot before the process exits."""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.drain()
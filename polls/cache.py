@@ -0,0 +1,175 @@
+"""Versioned cache for rendered and computed poll results."""
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0}
+
+
+def _cache():
+    """Return the cache configured for results."""
+    return caches[settings.POLLS_RESULTS_CACHE]
+
+
+def _version_key(question_id):
+    """Return the cache key holding the question's results version."""
+    return 'polls:results:%d:version' % question_id
+
+
+def _count(name):
+    """Add one to a hit/miss counter."""
+    with _lock:
+        _counters[name] += 1
+
+
+def _first_version():
+    """
+    Pick the version a question starts at when the cache holds none.
+
+    It is the current time in microseconds, so a version that was evicted never
+    comes back and a client's ETag for it never matches newer results.
+
+    :return the version number.
+    """
+    return int(time.time() * 1000000)
+
+
+def get_version(question_id):
+    """
+    Get the current results version of a question.
+
+    :param question_id is the id of the question.
+    :return the version number.
+    """
+    return _cache().get_or_set(_version_key(question_id), _first_version, None)
+
+
+def bump_version(question_id):
+    """
+    Invalidate the cached results of a question by moving it to a new version.
+
+    :param question_id is the id of the question.
+    """
+    cache = _cache()
+    try:
+        cache.incr(_version_key(question_id))
+    except ValueError:
+        cache.set(_version_key(question_id), _first_version(), None)
+
+
+def get_catalogue_version():
+    """
+    Get the current version of the list of questions and their choices.
+
+    :return the version number.
+    """
+    return _cache().get_or_set('polls:catalogue:version', _first_version, None)
+
+
+def bump_catalogue_version():
+    """Move the list of questions to a new version after a question or a choice was added, edited or removed."""
+    cache = _cache()
+    try:
+        cache.incr('polls:catalogue:version')
+    except ValueError:
+        cache.set('polls:catalogue:version', _first_version(), None)
+
+
+def get_index_state(version):
+    """
+    Get the state of the index pages at a catalogue version.
+
+    :param version is the catalogue version.
+    :return the state dict, or None on a miss.
+    """
+    return _cache().get('polls:index:%d' % version)
+
+
+def set_index_state(version, state):
+    """
+    Store the state of the index pages at a catalogue version.
+
+    :param version is the catalogue version.
+    :param state is the state dict.
+    """
+    _cache().set('polls:index:%d' % version, state, settings.POLLS_RESULTS_CACHE_TIMEOUT)
+
+
+def get_results(question_id, version):
+    """
+    Get the rendered results page of a question.
+
+    :param question_id is the id of the question.
+    :param version is the results version to look up.
+    :return the rendered page, or None on a miss.
+    """
+    content = _cache().get('polls:results:%d:%d' % (question_id, version))
+    _count('misses' if content is None else 'hits')
+    return content
+
+
+def set_results(question_id, version, content):
+    """
+    Store the rendered results page of a question.
+
+    :param question_id is the id of the question.
+    :param version is the results version the page was rendered from.
+    :param content is the rendered page.
+    """
+    _cache().set('polls:results:%d:%d' % (question_id, version), content, settings.POLLS_RESULTS_CACHE_TIMEOUT)
+
+
+def get_data(question_id, version):
+    """
+    Get the computed results of a question.
+
+    :param question_id is the id of the question.
+    :param version is the results version to look up.
+    :return the results dict, or None on a miss.
+    """
+    return _cache().get('polls:results:%d:%d:data' % (question_id, version))
+
+
+def set_data(question_id, version, data):
+    """
+    Store the computed results of a question.
+
+    :param question_id is the id of the question.
+    :param version is the results version the results were computed at.
+    :param data is the results dict.
+    """
+    _cache().set('polls:results:%d:%d:data' % (question_id, version), data, settings.POLLS_RESULTS_CACHE_TIMEOUT)
+
+
+def get_body(key):
+    """
+    Get an encoded API response body.
+
+    :param key is the key of the body, including its version.
+    :return (body, gzip compressed body), or None on a miss.
+    """
+    return _cache().get('polls:api:%s' % key)
+
+
+def set_body(key, encoded):
+    """
+    Store an encoded API response body.
+
+    :param key is the key of the body, including its version.
+    :param encoded is (body, gzip compressed body).
+    """
+    _cache().set('polls:api:%s' % key, encoded, settings.POLLS_RESULTS_CACHE_TIMEOUT)
+
+
+def stats():
+    """
+    Get the hit/miss counters of this process.
+
+    :return dict with hits, misses and hit_rate.
+    """
+    with _lock:
+        hits, misses = _counters['hits'], _counters['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
@@ -0,0 +1,21 @@
+"""System checks for the polls settings."""
+from django.conf import settings
+from django.core import checks
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_conditional_get_cache(app_configs, **kwargs):
+    """
+    Refuse conditional GETs whose versions live in a cache of each process.
+
+    :return a polls.E001 error when POLLS_CONDITIONAL_GET is on and POLLS_RESULTS_CACHE is a LocMemCache.
+    """
+    backend = settings.CACHES.get(settings.POLLS_RESULTS_CACHE, {}).get('BACKEND', '')
+    if settings.POLLS_CONDITIONAL_GET and backend.endswith('.LocMemCache'):
+        return [checks.Error(
+            "POLLS_CONDITIONAL_GET is on but POLLS_RESULTS_CACHE is local to each process.",
+            hint="A vote handled by one worker would leave the ETags of the others unchanged. Point "
+                 "POLLS_RESULTS_CACHE at a cache every worker shares, or set POLLS_CONDITIONAL_GET=False.",
+            id='polls.E001',
+        )]
+    return []
@@ -0,0 +1,169 @@
+"""ETag and Last-Modified validators for the index and results pages.
+
+The results ETag is the question's results version, read from the results
+cache, which votes and admin edits move forward; it costs no query, and the
+page is then served under the same version. The index validators come from a
+catalogue version that edits of questions and choices move forward, and from
+the next time a question is published or ends, both kept in the same cache.
+The values are looked up once per request through a memo, so a matching
+conditional GET is answered with 304 before any template or choice query runs.
+
+These versions are only authoritative when every worker process shares the
+results cache, so the validators are only sent with ``POLLS_CONDITIONAL_GET``;
+polls.E001 flags it turned on with a per-process cache.
+"""
+import datetime
+import hashlib
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from . import cache as results_cache
+from .models import Question
+
+
+def _memo(request, key, load):
+    """Compute a value once per request."""
+    memo = request.__dict__.setdefault('_polls_conditional', {})
+    if key not in memo:
+        memo[key] = load()
+    return memo[key]
+
+
+def question_state(request, pk):
+    """
+    Load the version and modification time of a question.
+
+    :param request is the HttpRequest object.
+    :param pk is the id of the question.
+    :return (version, modified), or None if the question does not exist.
+    """
+    return _memo(request, ('question', pk),
+                 lambda: Question.objects.filter(pk=pk).values_list('version', 'modified').first())
+
+
+def results_version(request, pk):
+    """
+    Get the results version of a question from the results cache.
+
+    :param request is the HttpRequest object.
+    :param pk is the id of the question.
+    :return the version number, the same for the whole request.
+    """
+    return _memo(request, ('results', pk), lambda: results_cache.get_version(int(pk)))
+
+
+def results_etag(request, pk):
+    """
+    Get the ETag of a results page.
+
+    Results pages get no Last-Modified: votes move the version without recording when.
+
+    :param request is the HttpRequest object.
+    :param pk is the id of the question.
+    :return the ETag, or None if conditional GETs are off, or if the client asks for any ETag
+            and the question does not exist.
+    """
+    if not settings.POLLS_CONDITIONAL_GET:
+        return None
+    # "If-None-Match: *" matches any ETag, so it is the one case that needs to know the question exists.
+    if request.META.get('HTTP_IF_NONE_MATCH', '').strip() == '*' and question_state(request, pk) is None:
+        return None
+    return 'q%d-v%d' % (int(pk), results_version(request, pk))
+
+
+def _next_change(now):
+    """
+    Find when the index next changes without an edit, because a question is published or ends.
+
+    :param now is the current time.
+    :return the time, or None if no question is waiting to be published or to end.
+    """
+    published = Question.objects.filter(pub_date__gt=now).order_by('pub_date').values_list('pub_date', flat=True)
+    ended = Question.objects.filter(end_date__gte=now).order_by('end_date').values_list('end_date', flat=True)
+    published, ended = published.first(), ended.first()
+    # A question is still open at its end date and closed right after it.
+    moments = [moment for moment in (published, ended and ended + datetime.timedelta(microseconds=1)) if moment]
+    return min(moments) if moments else None
+
+
+def index_state(request):
+    """
+    Get what every index page depends on, besides the user and the query string.
+
+    Edits of questions and choices move the catalogue version. Between edits the
+    index only changes when a question is published or ends, so the state is kept
+    in the results cache per catalogue version until the next of those moments;
+    only building it again costs two indexed queries.
+
+    :param request is the HttpRequest object.
+    :return dict with the catalogue version, the time the state was built, which is the
+            last modification of the index, and the time it runs out, or None.
+    """
+    def load():
+        version = results_cache.get_catalogue_version()
+        now = timezone.now()
+        state = results_cache.get_index_state(version)
+        if state is None or state['until'] is not None and now >= state['until']:
+            state = {'version': version, 'since': now, 'until': _next_change(now)}
+            results_cache.set_index_state(version, state)
+        return state
+    return _memo(request, 'index', load)
+
+
+def index_etag(request):
+    """
+    Get the ETag of an index page, which also depends on the user and the query string.
+
+    Pages carrying flash messages get no ETag, so the messages are always shown.
+
+    :param request is the HttpRequest object.
+    :return the ETag, or None.
+    """
+    if not settings.POLLS_CONDITIONAL_GET or len(get_messages(request)):
+        return None
+    state = index_state(request)
+    key = '%s|%s|%d|%s' % (request.user.pk, request.GET.urlencode(), state['version'], state['since'].isoformat())
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def index_last_modified(request):
+    """
+    Get the Last-Modified time of an index page.
+
+    :param request is the HttpRequest object.
+    :return the time the last change to the listed questions was noticed, or None.
+    """
+    if not settings.POLLS_CONDITIONAL_GET or len(get_messages(request)):
+        return None
+    return index_state(request)['since']
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Answer a conditional GET the way the ``condition`` decorator does, for the async views.
+
+    :param request is the HttpRequest object.
+    :param etag is the unquoted ETag of the page, or None.
+    :param last_modified is the modification time of the page, or None.
+    :return a 304 (or 412) response if the client's copy is current, None otherwise.
+    """
+    return get_conditional_response(request, etag=etag and quote_etag(etag),
+                                    last_modified=last_modified and int(last_modified.timestamp()))
+
+
+def add_validators(response, etag, last_modified):
+    """
+    Set the ETag and Last-Modified headers on a response.
+
+    :param response is the HttpResponse.
+    :param etag is the unquoted ETag of the page, or None.
+    :param last_modified is the modification time of the page, or None.
+    :return the response.
+    """
+    if etag:
+        response['ETag'] = quote_etag(etag)
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -0,0 +1,95 @@
+"""Per-view query count, database time and wall time histograms."""
+import threading
+import time
+from bisect import bisect_left
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+MS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class Histogram:
+    """Counts of samples falling into fixed upper-bound buckets."""
+
+    def __init__(self, bounds):
+        """
+        Create an empty histogram.
+
+        :param bounds is the sorted upper bounds; larger samples go to an overflow bucket.
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, value):
+        """Record one sample."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def as_dict(self):
+        """Return the buckets keyed by their upper bound, plus the mean and max."""
+        count = sum(self.counts)
+        buckets = {'<=%s' % bound: n for bound, n in zip(self.bounds, self.counts)}
+        buckets['>%s' % self.bounds[-1]] = self.counts[-1]
+        return {'buckets': buckets, 'mean': self.total / count if count else 0.0, 'max': self.maximum}
+
+
+class ViewStats:
+    """Aggregated measurements of every view, shared by all threads of the process."""
+
+    def __init__(self):
+        """Create an empty store."""
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, queries, db_ms, wall_ms):
+        """
+        Add one request to the view's histograms.
+
+        :param view is the name of the view.
+        :param queries is the number of queries the request ran.
+        :param db_ms is the time spent in the database, in ms.
+        :param wall_ms is the time spent handling the request, in ms.
+        """
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = {'requests': 0, 'queries': Histogram(QUERY_BUCKETS),
+                                             'db_ms': Histogram(MS_BUCKETS), 'wall_ms': Histogram(MS_BUCKETS)}
+            stats['requests'] += 1
+            stats['queries'].add(queries)
+            stats['db_ms'].add(db_ms)
+            stats['wall_ms'].add(wall_ms)
+
+    def snapshot(self):
+        """Return every view's histograms as plain dicts."""
+        with self._lock:
+            return {view: {key: value if key == 'requests' else value.as_dict() for key, value in stats.items()}
+                    for view, stats in self._views.items()}
+
+    def reset(self):
+        """Forget every measurement."""
+        with self._lock:
+            self._views.clear()
+
+
+view_stats = ViewStats()
+
+
+class QueryTimer:
+    """Database execute wrapper that counts queries and adds up their time."""
+
+    def __init__(self):
+        """Start with no queries."""
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Run the query and time it."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
@@ -0,0 +1,172 @@
+"""In-process fan-out of live tallies to Server-Sent Events subscribers.
+
+Votes mark their question as changed. Once per ``POLLS_LIVE_INTERVAL_MS`` a
+single ticker thread loads the tally of every changed question that has
+subscribers, once, and hands the same event to all of them. However many
+clients are watching, a question costs at most one query per tick.
+
+Each stream is a blocking generator, so under WSGI every connected client holds
+one worker thread for as long as it watches; size the thread pool for the
+expected number of watchers. Django 3.1 iterates streaming responses on the
+event loop under ASGI, where one client would stall the whole worker, so the
+stream is not served with the async views and the results page then renders
+without live updates.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from .results import compute_results
+
+log = logging.getLogger("polls")
+
+
+def current_tally(question_id):
+    """
+    Load the tally of a question.
+
+    :param question_id is the id of the question.
+    :return the question's results, as returned by polls.results.compute_results().
+    """
+    return compute_results(question_id)
+
+
+def format_event(tally):
+    """
+    Encode a tally as a Server-Sent Event.
+
+    :param tally is the tally from current_tally().
+    :return the event text.
+    """
+    return 'event: tally\ndata: %s\n\n' % json.dumps(tally, separators=(',', ':'))
+
+
+class Subscription:
+    """One client's mailbox; it only ever holds the newest event."""
+
+    def __init__(self, question_id):
+        """
+        Create an empty mailbox.
+
+        :param question_id is the id of the watched question.
+        """
+        self.question_id = question_id
+        self.events = queue.Queue(maxsize=1)
+
+    def deliver(self, event):
+        """Replace any event the client has not read yet with the newer one."""
+        try:
+            self.events.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            pass
+
+    def stream(self, hub, keepalive=15):
+        """
+        Yield events as they arrive, with a comment line as keep-alive.
+
+        :param hub is the hub to leave when the client disconnects.
+        :param keepalive is the number of seconds between keep-alive comments.
+        """
+        try:
+            while True:
+                try:
+                    yield self.events.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            hub.unsubscribe(self)
+
+
+class TallyHub:
+    """Subscribers per question, and the set of questions changed since the last tick."""
+
+    def __init__(self, interval_ms=1000):
+        """
+        Create a hub with no subscribers.
+
+        :param interval_ms is the shortest time between two events of the same question.
+        """
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._changed = set()
+        self._thread = None
+
+    def subscribe(self, question_id):
+        """
+        Start watching a question; the current tally is delivered right away.
+
+        :param question_id is the id of the question.
+        :return the Subscription.
+        """
+        subscription = Subscription(question_id)
+        subscription.deliver(format_event(current_tally(question_id)))
+        with self._lock:
+            self._subscribers.setdefault(question_id, set()).add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop delivering events to a subscription."""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.question_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.question_id, None)
+
+    def publish(self, question_id):
+        """
+        Note that a question's tally changed; subscribers hear about it on the next tick.
+
+        :param question_id is the id of the question.
+        """
+        with self._lock:
+            if question_id in self._subscribers:
+                self._changed.add(question_id)
+
+    def tick(self):
+        """
+        Send one event per changed question to all of its subscribers.
+
+        :return the number of tallies loaded.
+        """
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            targets = {question_id: list(self._subscribers.get(question_id, ())) for question_id in changed}
+        loaded = 0
+        for question_id, subscribers in targets.items():
+            if not subscribers:
+                continue
+            event = format_event(current_tally(question_id))
+            loaded += 1
+            for subscription in subscribers:
+                subscription.deliver(event)
+        return loaded
+
+    def _run(self):
+        """Tick every interval for as long as the process lives."""
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.tick()
+            except Exception:
+                log.exception("Live tally tick failed.")
+            finally:
+                close_old_connections()
+
+    def start(self):
+        """Start the ticker thread if it is not running yet."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='polls-live-hub', daemon=True)
+                self._thread.start()
+
+
+hub = TallyHub(settings.POLLS_LIVE_INTERVAL_MS)
@@ -0,0 +1,30 @@
+"""Freeze the results of every ended question."""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from polls.models import Question, ResultsSnapshot
+from polls.snapshots import freeze
+
+
+class Command(BaseCommand):
+    """Create the results snapshots that first reads would otherwise create lazily."""
+
+    help = "Store a results snapshot for every ended question that has none."
+
+    def add_arguments(self, parser):
+        """Add the command line options."""
+        parser.add_argument('--rebuild', action='store_true', help="Also replace the snapshots that already exist.")
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Questions fetched from the database at a time.")
+
+    def handle(self, *args, **options):
+        """Freeze the ended questions one by one, streaming them with iterator()."""
+        questions = Question.objects.filter(end_date__lt=timezone.now()).order_by('pk')
+        if options['rebuild']:
+            ResultsSnapshot.objects.filter(question__in=questions).delete()
+        else:
+            questions = questions.filter(snapshot__isnull=True)
+        count = 0
+        for question in questions.iterator(chunk_size=options['chunk_size']):
+            freeze(question)
+            count += 1
+        self.stdout.write(self.style.SUCCESS("Froze %d question(s)." % count))
@@ -0,0 +1,139 @@
+"""Load test the polls pages through the project's WSGI application.
+
+Run it once with the defaults and once with ``TEMPLATE_CACHE=False
+FRAGMENT_CACHE_BACKEND=django.core.cache.backends.dummy.DummyCache`` to compare
+the render time of every view with and without template and fragment caching.
+"""
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from polls.benchmark import InProcessClient, RenderTimer, ServerClient, login_cookie, seed, summarize, timed
+from polls.models import Choice
+
+ENDPOINTS = ('index', 'detail', 'results', 'vote')
+
+
+class Command(BaseCommand):
+    """Seed a scratch database and measure latency, throughput and queries per request."""
+
+    help = "Benchmark the index, detail, results and vote endpoints against a scratch database."
+
+    def add_arguments(self, parser):
+        """Add the command line options."""
+        parser.add_argument('--questions', type=int, default=100)
+        parser.add_argument('--choices', type=int, default=4)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--votes', type=int, default=5000, help="Ballots seeded before the run.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests sent to each endpoint.")
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent client threads.")
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help="Comma separated subset of %s." % ', '.join(ENDPOINTS))
+        parser.add_argument('--server', action='store_true',
+                            help="Go through a local threaded WSGI server instead of calling the application.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+
+    def handle(self, *args, **options):
+        """Run the benchmark on a scratch copy of the database."""
+        endpoints = [name for name in options['endpoints'].split(',') if name]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError("Unknown endpoint(s): %s" % ', '.join(sorted(unknown)))
+        random.seed(options['seed'])
+        from kuPolls.wsgi import application
+        quiet = {name: logging.getLogger(name) for name in ('polls', 'django.request')}
+        levels = {name: logger.level for name, logger in quiet.items()}
+        for logger in quiet.values():
+            logger.setLevel(logging.CRITICAL)
+        directory = tempfile.mkdtemp(prefix='bench-polls-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=['127.0.0.1'], POLLS_RATE_LIMITS={}):
+                report = self.run(application, endpoints, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+            for name, logger in quiet.items():
+                logger.setLevel(levels[name])
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write("Results written to %s" % options['output'])
+
+    def run(self, application, endpoints, options):
+        """Seed the scratch database and drive every endpoint."""
+        started = time.perf_counter()
+        question_ids, user_ids = seed(options['questions'], options['choices'], options['users'], options['votes'])
+        seed_seconds = time.perf_counter() - started
+        User = get_user_model()
+        logins = [login_cookie(user) for user in User.objects.filter(pk__in=user_ids[:options['workers'] * 4])]
+        choice_ids = {}
+        for choice_id, question_id in Choice.objects.values_list('pk', 'question_id'):
+            choice_ids.setdefault(question_id, []).append(choice_id)
+        client = ServerClient(application) if options['server'] else InProcessClient(application)
+        report = {
+            'commit': _git_commit(),
+            'date': timezone.now().isoformat(),
+            'transport': 'server' if options['server'] else 'in-process',
+            'options': {key: options[key] for key in ('questions', 'choices', 'users', 'votes',
+                                                      'requests', 'workers', 'seed')},
+            'seed_seconds': round(seed_seconds, 3),
+            'endpoints': {},
+        }
+
+        def request(name):
+            cookie, token = random.choice(logins)
+            question_id = random.choice(question_ids)
+            if name == 'index':
+                return timed(client, 'GET', reverse('polls:index'), cookie)
+            if name == 'detail':
+                return timed(client, 'GET', reverse('polls:detail', args=(question_id,)), cookie)
+            if name == 'results':
+                return timed(client, 'GET', reverse('polls:results', args=(question_id,)), cookie)
+            body = ('choice=%d' % random.choice(choice_ids[question_id])).encode()
+            return timed(client, 'POST', reverse('polls:vote', args=(question_id,)), cookie, token, body)
+
+        try:
+            for name in endpoints:
+                connection.close()
+                started = time.perf_counter()
+                with RenderTimer() as renders, ThreadPoolExecutor(options['workers']) as pool:
+                    samples = list(pool.map(request, [name] * options['requests']))
+                report['endpoints'][name] = summarize(samples, time.perf_counter() - started)
+                report['endpoints'][name]['render_ms_per_request'] = round(
+                    renders.seconds * 1000 / len(samples), 3) if samples else 0.0
+        finally:
+            client.close()
+        return report
+
+    def print_report(self, report):
+        """Print one line per endpoint."""
+        self.stdout.write("%-8s %8s %9s %9s %9s %10s %9s %10s" % (
+            'endpoint', 'requests', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries', 'render ms'))
+        for name, result in report['endpoints'].items():
+            self.stdout.write("%-8s %8d %9.2f %9.2f %9.2f %10.1f %9.2f %10.3f" % (
+                name, result['requests'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                result['requests_per_s'], result['queries_per_request'], result['render_ms_per_request']))
+
+
+def _git_commit():
+    """Return the current git commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,34 @@
+"""Fold the sharded vote counters back into Choice.votes."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from polls.models import Choice, ChoiceShard
+
+
+class Command(BaseCommand):
+    """Move the votes held in ChoiceShard rows into Choice.votes; run it periodically, e.g. from cron."""
+
+    help = "Add the ChoiceShard counters to Choice.votes and reset the shards."
+
+    def add_arguments(self, parser):
+        """Add the command line options."""
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Number of choices folded per transaction.")
+
+    def handle(self, *args, **options):
+        """Fold the shards of every choice that has unfolded votes."""
+        choice_ids = list(ChoiceShard.objects.exclude(votes=0).values_list('choice_id', flat=True).distinct())
+        folded = 0
+        for start in range(0, len(choice_ids), options['batch_size']):
+            batch = choice_ids[start:start + options['batch_size']]
+            with transaction.atomic():
+                shards = ChoiceShard.objects.select_for_update().filter(choice_id__in=batch)
+                totals = dict(shards.order_by().values_list('choice_id').annotate(total=Sum('votes')))
+                totals = {choice_id: total for choice_id, total in totals.items() if total}
+                if totals:
+                    shift = Case(*[When(pk=choice_id, then=Value(total)) for choice_id, total in totals.items()],
+                                 output_field=IntegerField())
+                    Choice.objects.filter(pk__in=totals).update(votes=F('votes') + shift)
+                shards.update(votes=0)
+            folded += len(totals)
+        self.stdout.write(self.style.SUCCESS("Folded the shards of %d choice(s)." % folded))
@@ -0,0 +1,45 @@
+"""Stream questions, choices and votes as newline-delimited JSON."""
+import json
+import sys
+from django.core.management.base import BaseCommand
+from polls.models import Choice, Question, Vote
+
+
+class Command(BaseCommand):
+    """Export every poll with its choices and ballots, one JSON object per line."""
+
+    help = "Write questions, then choices, then votes as NDJSON to a file or stdout."
+
+    def add_arguments(self, parser):
+        """Add the command line options."""
+        parser.add_argument('--output', '-o', help="File to write; defaults to stdout.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched from the database at a time.")
+
+    def handle(self, *args, **options):
+        """Stream each table with iterator() so memory stays flat however many rows there are."""
+        output = open(options['output'], 'w') if options['output'] else sys.stdout
+        chunk_size = options['chunk_size']
+        counts = {'question': 0, 'choice': 0, 'vote': 0}
+        try:
+            questions = Question.objects.order_by('pk').values('pk', 'question_text', 'pub_date', 'end_date')
+            for row in questions.iterator(chunk_size=chunk_size):
+                self.write(output, counts, 'question', id=row['pk'], question_text=row['question_text'],
+                           pub_date=row['pub_date'].isoformat(),
+                           end_date=row['end_date'].isoformat() if row['end_date'] else None)
+            choices = Choice.objects.with_tally().order_by('pk').values('pk', 'question_id', 'choice_text', 'tally')
+            for row in choices.iterator(chunk_size=chunk_size):
+                self.write(output, counts, 'choice', id=row['pk'], question=row['question_id'],
+                           choice_text=row['choice_text'], votes=row['tally'])
+            votes = Vote.objects.order_by('pk').values('question_id', 'selected_choice_id', 'user__username')
+            for row in votes.iterator(chunk_size=chunk_size):
+                self.write(output, counts, 'vote', question=row['question_id'], choice=row['selected_choice_id'],
+                           user=row['user__username'])
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write("Exported %(question)d question(s), %(choice)d choice(s), %(vote)d vote(s)." % counts)
+
+    def write(self, output, counts, model, **fields):
+        """Write one record."""
+        output.write(json.dumps({'model': model, **fields}, separators=(',', ':')) + '\n')
+        counts[model] += 1
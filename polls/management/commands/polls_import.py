@@ -0,0 +1,136 @@
+"""Load questions, choices and votes from newline-delimited JSON."""
+import json
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+from polls.cache import bump_catalogue_version
+from polls.models import Choice, Question, Vote
+from polls.voting import reconcile_votes
+
+
+class Command(BaseCommand):
+    """Import a polls_export file as new polls, remapping every id."""
+
+    help = "Read NDJSON written by polls_export and bulk insert it in chunked transactions."
+
+    def add_arguments(self, parser):
+        """Add the command line options."""
+        parser.add_argument('input', nargs='?', help="File to read; defaults to stdin.")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows inserted per transaction.")
+        parser.add_argument('--create-users', action='store_true',
+                            help="Create voters that do not exist yet, with unusable passwords.")
+
+    def handle(self, *args, **options):
+        """Read the records in order and flush each model's rows in batches."""
+        self.batch_size = options['batch_size']
+        self.create_users = options['create_users']
+        self.question_ids, self.choice_ids, self.user_ids = {}, {}, {}
+        self.pending = {'question': [], 'choice': [], 'vote': []}
+        self.votes_read = 0
+        source = open(options['input']) if options['input'] else sys.stdin
+        try:
+            for number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    model = record.pop('model')
+                    self.pending[model].append(record)
+                except (ValueError, KeyError, AttributeError):
+                    raise CommandError("Line %d is not a polls_export record." % number)
+                if model == 'vote':
+                    self.votes_read += 1
+                if len(self.pending[model]) >= self.batch_size:
+                    self.flush(model)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        for model in ('question', 'choice', 'vote'):
+            self.flush(model)
+        counts = self.reconcile()
+        # bulk_create sends no post_save, so move the index to a new version here.
+        bump_catalogue_version()
+        counts['skipped'] = self.votes_read - counts['vote']
+        self.stdout.write(self.style.SUCCESS(
+            "Imported %(question)d question(s), %(choice)d choice(s), %(vote)d vote(s); "
+            "skipped %(skipped)d vote(s); recounted %(recounted)d choice(s)." % counts))
+
+    def reconcile(self):
+        """
+        Recount the imported choices from the votes that were stored and count what landed in the database.
+
+        The exported tallies are copied as they are, but votes of unknown users and duplicate
+        ballots are not stored, so the tallies are rebuilt from the Vote rows like reconcile_votes does.
+
+        :return dict with the number of imported questions, choices and votes, and of choices recounted.
+        """
+        counts = {'question': 0, 'choice': 0, 'vote': 0, 'recounted': 0}
+        question_ids = sorted(self.question_ids.values())
+        for start in range(0, len(question_ids), self.batch_size):
+            chunk = question_ids[start:start + self.batch_size]
+            counts['recounted'] += reconcile_votes(chunk, self.batch_size)
+            counts['question'] += Question.objects.filter(pk__in=chunk).count()
+            counts['choice'] += Choice.objects.filter(question_id__in=chunk).count()
+            counts['vote'] += Vote.objects.filter(question_id__in=chunk).count()
+        return counts
+
+    def flush(self, model):
+        """Insert the pending rows of a model, flushing their parents first."""
+        if model == 'choice':
+            self.flush('question')
+        elif model == 'vote':
+            self.flush('choice')
+        records, self.pending[model] = self.pending[model], []
+        if records:
+            with transaction.atomic():
+                getattr(self, 'insert_%ss' % model)(records)
+
+    def create(self, model, objects, records, id_map):
+        """Bulk insert new rows and remember which new id each exported id became."""
+        if not connection.features.can_return_rows_from_bulk_insert:
+            next_id = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+            for offset, obj in enumerate(objects):
+                obj.pk = next_id + offset
+        model.objects.bulk_create(objects)
+        for record, obj in zip(records, objects):
+            id_map[record['id']] = obj.pk
+
+    def insert_questions(self, records):
+        """Insert a batch of questions."""
+        objects = [Question(question_text=record['question_text'], pub_date=parse_datetime(record['pub_date']),
+                            end_date=parse_datetime(record['end_date']) if record['end_date'] else None)
+                   for record in records]
+        self.create(Question, objects, records, self.question_ids)
+
+    def insert_choices(self, records):
+        """Insert a batch of choices under their remapped questions."""
+        objects = [Choice(question_id=self.question_ids[record['question']], choice_text=record['choice_text'],
+                          votes=record['votes']) for record in records]
+        self.create(Choice, objects, records, self.choice_ids)
+
+    def insert_votes(self, records):
+        """Insert a batch of votes for their remapped questions, choices and users."""
+        self.load_users({record['user'] for record in records if record['user'] not in self.user_ids})
+        objects = []
+        for record in records:
+            user_id = self.user_ids.get(record['user'])
+            if user_id is None:
+                continue
+            objects.append(Vote(question_id=self.question_ids[record['question']],
+                                selected_choice_id=self.choice_ids[record['choice']], user_id=user_id))
+        Vote.objects.bulk_create(objects, ignore_conflicts=True)
+
+    def load_users(self, usernames):
+        """Look up voters by username, creating the missing ones when asked to."""
+        usernames.discard(None)
+        if not usernames:
+            return
+        User = get_user_model()
+        self.user_ids.update(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        missing = usernames - set(self.user_ids)
+        if missing and self.create_users:
+            User.objects.bulk_create([User(username=username, password='!') for username in missing])
+            self.user_ids.update(User.objects.filter(username__in=missing).values_list('username', 'pk'))
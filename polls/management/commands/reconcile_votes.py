@@ -0,0 +1,21 @@
+"""Rebuild Choice.votes from the Vote rows."""
+from django.core.management.base import BaseCommand
+from polls.voting import reconcile_votes
+
+
+class Command(BaseCommand):
+    """Repair any drift between Choice.votes and the recorded ballots."""
+
+    help = "Recount Choice.votes from Vote rows and fix the choices that drifted."
+
+    def add_arguments(self, parser):
+        """Add the command line options."""
+        parser.add_argument('--question', type=int, action='append', dest='questions',
+                            help="Only reconcile this question id (can be repeated).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of choices written per bulk update.")
+
+    def handle(self, *args, **options):
+        """Recount every choice in one aggregate query, reset the shards and bulk update the choices that differ."""
+        drifted = reconcile_votes(options['questions'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS("Reconciled %d choice(s)." % drifted))
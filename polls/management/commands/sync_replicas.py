@@ -0,0 +1,57 @@
+"""Copy the primary SQLite database onto its replicas, standing in for real replication."""
+import sqlite3
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+def copy_database(source, target, pages=-1):
+    """
+    Copy one SQLite database file onto another with the online backup API.
+
+    Readers of the target keep working while it is copied; they see the new
+    data from their next transaction.
+
+    :param source is the path of the database to copy.
+    :param target is the path of the copy.
+    :param pages is the number of pages copied per step, -1 for all at once.
+    """
+    src, dst = sqlite3.connect(str(source)), sqlite3.connect(str(target))
+    try:
+        src.backup(dst, pages=pages)
+    finally:
+        dst.close()
+        src.close()
+
+
+class Command(BaseCommand):
+    """Keep the SQLite replicas of POLLS_READ_REPLICAS in step with the primary."""
+
+    help = "Copy the primary SQLite database onto every read replica, once or every --interval seconds."
+
+    def add_arguments(self, parser):
+        """Add the command line options."""
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Seconds between copies; the replicas lag the primary by up to this long.")
+        parser.add_argument('--pages', type=int, default=-1,
+                            help="Pages copied per backup step, -1 for the whole file in one step.")
+
+    def handle(self, *args, **options):
+        """Copy the primary to each replica, forever when an interval is given."""
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        aliases = settings.POLLS_READ_REPLICAS
+        if not aliases:
+            raise CommandError("No read replicas are configured; set POLLS_SQLITE_REPLICAS.")
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if settings.DATABASES[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError("%s is not an SQLite database." % alias)
+        while True:
+            started = time.perf_counter()
+            for alias in aliases:
+                copy_database(primary['NAME'], settings.DATABASES[alias]['NAME'], options['pages'])
+            self.stdout.write("Copied %s to %s in %.1f ms." % (
+                DEFAULT_DB_ALIAS, ', '.join(aliases), (time.perf_counter() - started) * 1000))
+            if options['interval'] <= 0:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,206 @@
+"""Middleware that measures the queries and time spent by every view, and pins requests to the primary database."""
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.urls import reverse
+from .instrumentation import QueryTimer, view_stats
+from .routers import replicas
+
+log = logging.getLogger("polls")
+
+_request_timer = ContextVar('polls_request_timer', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """
+    Execute wrapper that adds the query to the timer of the request being handled, if any.
+
+    It reads the timer from a context variable rather than being pushed around
+    each request, so it also sees the queries an async view runs in the
+    ``sync_to_async`` thread, and concurrent requests each count their own.
+    """
+    timer = _request_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """
+    Put ``count_queries`` in front of the execute wrappers of every new connection, of every alias.
+
+    :param sender is the database wrapper class.
+    :param connection is the new database connection.
+    """
+    if count_queries not in connection.execute_wrappers:
+        # First in the list, so the wrappers pushed and popped by execute_wrapper() leave it in place.
+        connection.execute_wrappers.insert(0, count_queries)
+
+
+def view_name(request):
+    """
+    Name the view that handled a request.
+
+    :param request is the HttpRequest object.
+    :return the class name of class-based views, the function name otherwise.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    func = match.func
+    view_class = getattr(func, 'view_class', None)
+    return view_class.__name__ if view_class else getattr(func, '__name__', match.view_name)
+
+
+def budget_for(view):
+    """
+    Get the query and time budget of a view.
+
+    :param view is the name of the view.
+    :return dict with queries, db_ms and wall_ms limits.
+    """
+    budgets = settings.POLLS_QUERY_BUDGETS
+    return {**budgets.get('default', {}), **budgets.get(view, {})}
+
+
+class HybridMiddleware:
+    """
+    Middleware that runs sync under WSGI and async under ASGI.
+
+    A sync-only middleware would hold Django's one thread for sync code while
+    the async view under it awaits, so the requests would run one at a time.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Keep the next handler, and run as a coroutine when it is one."""
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Django calls the middleware as a coroutine when it has this marker.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+
+class QueryBudgetMiddleware(HybridMiddleware):
+    """Record query count, database time and wall time per view and log the requests over budget."""
+
+    def __call__(self, request):
+        """Handle the request while counting its queries."""
+        if self.is_async:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = _request_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timer.reset(token)
+        self.record(request, timer, started)
+        return response
+
+    async def __acall__(self, request):
+        """Handle the request of an async handler while counting its queries."""
+        timer = QueryTimer()
+        token = _request_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_timer.reset(token)
+        self.record(request, timer, started)
+        return response
+
+    def record(self, request, timer, started):
+        """Add the request to its view's histograms and check it against the view's budget."""
+        wall_ms = (time.perf_counter() - started) * 1000
+        view = view_name(request)
+        if view is not None:
+            db_ms = timer.seconds * 1000
+            view_stats.record(view, timer.queries, db_ms, wall_ms)
+            self.check_budget(request, view, timer.queries, db_ms, wall_ms)
+
+    def check_budget(self, request, view, queries, db_ms, wall_ms):
+        """Log a warning when a request went over its view's budget."""
+        budget = budget_for(view)
+        over = [name for name, value in (('queries', queries), ('db_ms', db_ms), ('wall_ms', wall_ms))
+                if name in budget and value > budget[name]]
+        if over:
+            log.warning("Over budget (%s): %s %s, view: %s, queries: %d, db: %.1f ms, wall: %.1f ms",
+                        ', '.join(over), request.method, request.path, view, queries, db_ms, wall_ms)
+
+
+class ReplicaMiddleware(HybridMiddleware):
+    """
+    Read the polls app from the replicas for requests that can do with slightly old data.
+
+    Requests that may write and requests to the admin stay on the primary. So
+    do the requests of a client in the ``POLLS_REPLICA_STICKY_SECONDS`` after
+    it wrote, such as a vote, which is marked with a short-lived signed cookie
+    rather than the session so voting costs no extra query.
+    """
+
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+    sticky_cookie = 'polls_primary'
+
+    def __init__(self, get_response):
+        """Keep the next handler."""
+        super().__init__(get_response)
+        self.admin_prefix = None
+
+    def __call__(self, request):
+        """Handle the request, reading the replicas unless it needs the primary."""
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.reads_replicas(request):
+            return self.mark_writer(request, self.get_response(request))
+        with replicas():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        """Handle the request of an async handler, reading the replicas unless it needs the primary."""
+        if not self.reads_replicas(request):
+            return self.mark_writer(request, await self.get_response(request))
+        with replicas():
+            return await self.get_response(request)
+
+    def reads_replicas(self, request):
+        """
+        Check whether a request may read the replicas.
+
+        :param request is the HttpRequest object.
+        :return True if replicas are set up and the request neither writes nor needs the latest writes.
+        """
+        if not settings.POLLS_READ_REPLICAS or request.method not in self.safe_methods:
+            return False
+        return not self.needs_primary(request)
+
+    def mark_writer(self, request, response):
+        """
+        Keep a client that has just written on the primary for ``POLLS_REPLICA_STICKY_SECONDS``.
+
+        :param request is the HttpRequest object.
+        :param response is the response to the request.
+        :return the response, with the sticky cookie after a successful write.
+        """
+        if settings.POLLS_READ_REPLICAS and request.method not in self.safe_methods and response.status_code < 400:
+            response.set_signed_cookie(self.sticky_cookie, '1', max_age=settings.POLLS_REPLICA_STICKY_SECONDS,
+                                       httponly=True, samesite='Lax')
+        return response
+
+    def needs_primary(self, request):
+        """
+        Check whether a read has to see the latest writes.
+
+        :param request is the HttpRequest object of a GET, HEAD or OPTIONS request.
+        :return True for the admin and for clients that wrote recently, False otherwise.
+        """
+        if self.admin_prefix is None:
+            self.admin_prefix = reverse('admin:index')
+        if request.path_info.startswith(self.admin_prefix):
+            return True
+        return request.get_signed_cookie(self.sticky_cookie, default=None,
+                                         max_age=settings.POLLS_REPLICA_STICKY_SECONDS) is not None
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0013_auto_20201028_1853'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='question',
+            name='last_vote',
+        ),
+    ]
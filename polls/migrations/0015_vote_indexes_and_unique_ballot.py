@@ -0,0 +1,48 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:20
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    """Keep only the latest ballot per (user, question) and take the stale ones off the tallies."""
+    Vote = apps.get_model('polls', 'Vote')
+    Choice = apps.get_model('polls', 'Choice')
+    duplicates = (Vote.objects.filter(user__isnull=False).values('user', 'question')
+                  .annotate(latest=Max('id'), total=Count('id')).filter(total__gt=1))
+    for row in list(duplicates):
+        stale = Vote.objects.filter(user=row['user'], question=row['question']).exclude(pk=row['latest'])
+        for choice_id in list(stale.values_list('selected_choice', flat=True)):
+            Choice.objects.filter(pk=choice_id).update(votes=F('votes') - 1)
+        stale.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0014_remove_question_last_vote'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['pub_date'], name='polls_question_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['end_date'], name='polls_question_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['question', 'selected_choice'], name='polls_vote_question_choice_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['question', 'user'], name='polls_vote_question_user_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='polls_vote_unique_user_question'),
+        ),
+    ]
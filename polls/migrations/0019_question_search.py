@@ -0,0 +1,76 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import polls.models
+
+# Choice triggers only fire on the columns that change the index,
+# so votes (UPDATE ... SET votes) never touch it.
+REINDEX_CHOICES = """
+    UPDATE polls_search SET choice_text = coalesce(
+        (SELECT group_concat(choice_text, ' ') FROM polls_choice WHERE question_id = %s), '')
+    WHERE rowid = %s;
+"""
+CREATE_SEARCH = [
+    """CREATE VIRTUAL TABLE polls_search USING fts5(
+        question_text, choice_text, tokenize = 'unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER polls_search_question_insert AFTER INSERT ON polls_question BEGIN
+        INSERT INTO polls_search (rowid, question_text, choice_text) VALUES (NEW.id, NEW.question_text, '');
+    END""",
+    """CREATE TRIGGER polls_search_question_update AFTER UPDATE OF question_text ON polls_question BEGIN
+        UPDATE polls_search SET question_text = NEW.question_text WHERE rowid = NEW.id;
+    END""",
+    """CREATE TRIGGER polls_search_question_delete AFTER DELETE ON polls_question BEGIN
+        DELETE FROM polls_search WHERE rowid = OLD.id;
+    END""",
+    "CREATE TRIGGER polls_search_choice_insert AFTER INSERT ON polls_choice BEGIN %s END"
+    % (REINDEX_CHOICES % ('NEW.question_id', 'NEW.question_id')),
+    "CREATE TRIGGER polls_search_choice_update AFTER UPDATE OF choice_text, question_id ON polls_choice BEGIN "
+    "%s %s END" % (REINDEX_CHOICES % ('OLD.question_id', 'OLD.question_id'),
+                   REINDEX_CHOICES % ('NEW.question_id', 'NEW.question_id')),
+    "CREATE TRIGGER polls_search_choice_delete AFTER DELETE ON polls_choice BEGIN %s END"
+    % (REINDEX_CHOICES % ('OLD.question_id', 'OLD.question_id')),
+    """INSERT INTO polls_search (rowid, question_text, choice_text)
+        SELECT id, question_text, coalesce((SELECT group_concat(choice_text, ' ') FROM polls_choice
+                                            WHERE question_id = polls_question.id), '')
+        FROM polls_question""",
+]
+DROP_SEARCH = [
+    'DROP TRIGGER IF EXISTS polls_search_%s' % name
+    for name in ('question_insert', 'question_update', 'question_delete',
+                 'choice_insert', 'choice_update', 'choice_delete')
+] + ['DROP TABLE IF EXISTS polls_search']
+
+
+def run(statements):
+    """Return a RunPython function that runs the statements on SQLite only."""
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement, params=None)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0018_question_version_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSearch',
+            fields=[
+                ('question', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='polls.question')),
+                ('question_text', models.TextField()),
+                ('choice_text', models.TextField()),
+                ('document', polls.models.SearchDocumentField(db_column='polls_search')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'polls_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(run(CREATE_SEARCH), run(DROP_SEARCH)),
+    ]
@@ -2,16 +2,85 @@
 import datetime
 import django.contrib.auth.models
 from django.db import models
+from django.db.models import BooleanField, Case, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
+def _is_open(now):
+    """Return the condition for questions that are published and not yet ended at ``now``."""
+    return Q(pub_date__lte=now) & (Q(end_date__isnull=True) | Q(end_date__gte=now))
+
+
+class QuestionQuerySet(models.QuerySet):
+    """Queries over questions."""
+
+    def open(self, now=None):
+        """
+        Keep only the questions that can be voted on.
+
+        :param now is the time to compare against, defaults to the current time.
+        :return the filtered queryset.
+        """
+        return self.filter(_is_open(now or timezone.now()))
+
+    def with_status(self, now=None):
+        """
+        Annotate every question with ``is_open``, computed in SQL against a single ``now``.
+
+        :param now is the time to compare against, defaults to the current time.
+        :return the annotated queryset.
+        """
+        is_open = _is_open(now or timezone.now())
+        return self.annotate(is_open=Case(When(is_open, then=Value(True)), default=Value(False),
+                                          output_field=BooleanField()))
+
+    def touch(self):
+        """
+        Mark the questions as changed: bump their version and set their modification time to now.
+
+        :return the number of questions touched.
+        """
+        return self.update(version=F('version') + 1, modified=timezone.now())
+
+
+class Match(models.Lookup):
+    """``field__match=expression``: SQLite full-text ``MATCH``."""
+
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        """Compile to ``lhs MATCH rhs``."""
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return '%s MATCH %s' % (lhs, rhs), lhs_params + rhs_params
+
+
+class SearchDocumentField(models.TextField):
+    """The hidden FTS5 column named after its table; matching it searches every column."""
+
+
+SearchDocumentField.register_lookup(Match)
+
+
 class Question(models.Model):
     """A question for voting."""
 
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField("date published")
     end_date = models.DateTimeField("date ended", default=None, null=True)
-    last_vote = models.CharField(max_length=200, default="")
+    version = models.PositiveIntegerField(default=1, editable=False)
+    modified = models.DateTimeField("date modified", default=timezone.now, editable=False)
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        """Index the dates the index page filters and sorts on."""
+
+        indexes = [
+            models.Index(fields=['pub_date'], name='polls_question_pub_date_idx'),
+            models.Index(fields=['end_date'], name='polls_question_end_date_idx'),
+        ]
 
     def __str__(self):
         """
@@ -56,6 +125,18 @@ class Question(models.Model):
         return False
 
 
+class ChoiceQuerySet(models.QuerySet):
+    """Queries over choices."""
+
+    def with_tally(self):
+        """
+        Annotate every choice with ``tally``: its folded votes plus its not yet folded shards.
+
+        :return the annotated queryset.
+        """
+        return self.annotate(tally=F('votes') + Coalesce(Sum('shards__votes'), 0))
+
+
 class Choice(models.Model):
     """A choice for a question's answer."""
 
@@ -63,6 +144,8 @@ class Choice(models.Model):
     choice_text = models.CharField(max_length=200)
     votes = models.IntegerField(default=0)
 
+    objects = ChoiceQuerySet.as_manager()
+
     def __str__(self):
         """
         Return choice's text.
@@ -72,8 +155,67 @@ class Choice(models.Model):
         return self.choice_text
 
 
+class ChoiceShard(models.Model):
+    """One slice of a choice's vote counter, so concurrent ballots do not all update the same row."""
+
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    votes = models.IntegerField(default=0)
+
+    class Meta:
+        """One row per shard of a choice."""
+
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'shard'], name='polls_choiceshard_unique_choice_shard'),
+        ]
+
+
 class Vote(models.Model):
+    """A user's ballot on a question."""
 
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     user = models.ForeignKey(django.contrib.auth.models.User,null=True,blank=True,on_delete=models.CASCADE)
+
+    class Meta:
+        """One ballot per user and question, and indexes for the tally and last-vote lookups."""
+
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'], name='polls_vote_unique_user_question'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'selected_choice'], name='polls_vote_question_choice_idx'),
+            models.Index(fields=['question', 'user'], name='polls_vote_question_user_idx'),
+        ]
+
+
+class ResultsSnapshot(models.Model):
+    """The frozen results of an ended question: its tallies and the rendered results page."""
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    total = models.IntegerField()
+    tallies = models.JSONField()
+    html = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class QuestionSearch(models.Model):
+    """
+    Full-text index row of a question: its text and the texts of its choices.
+
+    The SQLite FTS5 table is created by migration 0019 and kept in sync by
+    triggers on polls_question and polls_choice; its rowid is the question id.
+    """
+
+    question = models.OneToOneField(Question, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                    related_name='search')
+    question_text = models.TextField()
+    choice_text = models.TextField()
+    document = SearchDocumentField(db_column='polls_search')
+    rank = models.FloatField()
+
+    class Meta:
+        """The FTS5 table is created and filled by migration 0019, not by Django."""
+
+        managed = False
+        db_table = 'polls_search'
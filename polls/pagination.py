@@ -0,0 +1,87 @@
+"""Keyset (cursor) pagination over questions ordered by newest first, and numbered pages for search results."""
+import base64
+import binascii
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Largest integer the database can store, a signed 64-bit integer: the bound for ids and offsets.
+MAX_INT = 2 ** 63 - 1
+
+
+def encode_cursor(question):
+    """
+    Build the cursor token that points just after the given question.
+
+    :param question is the last question of the current page, or its ``values()`` row with pub_date and pk.
+    :return url safe token for (pub_date, id).
+    """
+    if isinstance(question, dict):
+        pub_date, pk = question['pub_date'], question['pk']
+    else:
+        pub_date, pk = question.pub_date, question.pk
+    raw = "%s|%d" % (pub_date.isoformat(), pk)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Read a cursor token back into (pub_date, id).
+
+    :param token is the token from the url.
+    :return (pub_date, id), or None if the token is missing, malformed or its id is out of range.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None or not 0 < pk <= MAX_INT:
+        return None
+    return pub_date, pk
+
+
+def keyset_page(queryset, token, size):
+    """
+    Fetch one page of questions after the cursor, newest first.
+
+    Every page costs one indexed range query of ``size + 1`` rows, however deep it is.
+
+    :param queryset is the questions to paginate, as models or as ``values()`` rows that include pub_date and pk.
+    :param token is the cursor of the previous page, or None for the first page.
+    :param size is the number of questions per page.
+    :return (questions on this page, cursor of the next page or None).
+    """
+    cursor = decode_cursor(token)
+    if cursor is not None:
+        pub_date, pk = cursor
+        queryset = queryset.filter(Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+    rows = list(queryset.order_by('-pub_date', '-pk')[:size + 1])
+    if len(rows) > size:
+        return rows[:size], encode_cursor(rows[size - 1])
+    return rows, None
+
+
+def offset_page(queryset, number, size):
+    """
+    Fetch one numbered page of an already ordered queryset, such as ranked search results.
+
+    :param queryset is the ordered rows to paginate.
+    :param number is the page number from the url, 1 when missing, malformed or too large to query.
+    :param size is the number of rows per page.
+    :return (rows on this page, number of the next page or None).
+    """
+    try:
+        number = max(int(number), 1)
+    except (TypeError, ValueError):
+        number = 1
+    if number * size >= MAX_INT:
+        number = 1
+    start = (number - 1) * size
+    rows = list(queryset[start:start + size + 1])
+    if len(rows) > size:
+        return rows[:size], number + 1
+    return rows, None
@@ -0,0 +1,127 @@
+"""Token bucket rate limits for the write endpoints of the polls app.
+
+Every endpoint listed in ``POLLS_RATE_LIMITS`` gets one bucket per user and
+one per client ip, kept in the ``POLLS_RATE_LIMIT_CACHE`` cache as
+``(tokens, time)``. A request takes one token from each of its buckets, or
+one per ballot for a batch of ballots, and is refused with 429 when any of them
+holds too few, before the view touches the database. A bucket that expired from
+the cache is full again.
+"""
+import math
+import threading
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from .audit import get_client_ip
+
+_lock = threading.Lock()
+_rejected = {}
+
+
+def _cache():
+    """Return the cache configured for the buckets."""
+    return caches[settings.POLLS_RATE_LIMIT_CACHE]
+
+
+def _bucket_keys(endpoint, limits, request, user):
+    """Return the cache key of every bucket a request draws from, by scope."""
+    keys = {}
+    if 'user' in limits and user is not None and user.is_authenticated:
+        keys['user'] = 'polls:ratelimit:%s:user:%s' % (endpoint, user.pk)
+    ip = get_client_ip(request)
+    if 'ip' in limits and ip:
+        keys['ip'] = 'polls:ratelimit:%s:ip:%s' % (endpoint, ip)
+    return keys
+
+
+def take(endpoint, request, user=None, cost=1):
+    """
+    Take tokens from every bucket of a request.
+
+    Nothing is taken when one of the buckets holds fewer than ``cost`` tokens, and
+    a cost above a bucket's capacity is always refused. Processes sharing the
+    cache can race between reading and writing a bucket, which lets at most a
+    few extra requests through.
+
+    :param endpoint is the name of the endpoint in ``POLLS_RATE_LIMITS``.
+    :param request is the HttpRequest object.
+    :param user is the user making the request, defaults to ``request.user``.
+    :param cost is the number of tokens to take from each bucket.
+    :return 0 if the request may go ahead, otherwise the seconds until it may be retried.
+    """
+    limits = settings.POLLS_RATE_LIMITS.get(endpoint)
+    if not limits:
+        return 0
+    keys = _bucket_keys(endpoint, limits, request, request.user if user is None else user)
+    if not keys:
+        return 0
+    cache = _cache()
+    now = time.time()
+    with _lock:
+        stored = cache.get_many(keys.values())
+        tokens, empty, wait = {}, [], 0.0
+        for scope, key in keys.items():
+            capacity, rate = limits[scope]['capacity'], limits[scope]['per_second']
+            left, stamp = stored.get(key, (capacity, now))
+            tokens[key] = min(capacity, left + (now - stamp) * rate)
+            if tokens[key] < cost:
+                empty.append(scope)
+                wait = max(wait, (cost - tokens[key]) / rate)
+        if empty:
+            for scope in empty:
+                counters = _rejected.setdefault(endpoint, {})
+                counters[scope] = counters.get(scope, 0) + 1
+            return wait
+        refill = max(limits[scope]['capacity'] / limits[scope]['per_second'] for scope in keys)
+        cache.set_many({key: (left - cost, now) for key, left in tokens.items()}, math.ceil(refill))
+    return 0
+
+
+def too_many_requests(wait):
+    """
+    Build the response refusing a rate limited request.
+
+    :param wait is the seconds until the request may be retried.
+    :return a 429 response with a Retry-After header.
+    """
+    response = HttpResponse("Too many requests, please try again in a moment.", status=429)
+    response['Retry-After'] = max(math.ceil(wait), 1)
+    return response
+
+
+def rate_limit(endpoint):
+    """
+    Refuse requests to a view once its user or ip has used up its tokens.
+
+    Put it under ``login_required`` so the limit applies per user as well.
+
+    :param endpoint is the name of the endpoint in ``POLLS_RATE_LIMITS``.
+    :return the view decorator.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            wait = take(endpoint, request)
+            if wait:
+                return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stats():
+    """
+    Get the rejection counters of this process.
+
+    :return dict of endpoint to the number of requests refused per scope (user or ip).
+    """
+    with _lock:
+        return {endpoint: dict(counters) for endpoint, counters in _rejected.items()}
+
+
+def reset():
+    """Clear the rejection counters."""
+    with _lock:
+        _rejected.clear()
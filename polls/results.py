@@ -0,0 +1,73 @@
+"""Results of a question: every choice's tally, share and rank, the total and the participation.
+
+compute_results() gets all of it from one query: each choice's tally (its
+folded votes plus its shards) comes from a correlated subquery, the total and
+the rank from window functions over it, and the number of registered users from
+a scalar subquery. get_results() keeps the result in the results cache under
+the question's results version, so between votes it costs no query at all; a
+miss is computed on the primary so a lagging replica never fills the cache.
+The results page, the snapshots and the live stream are all built from it.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Window
+from django.db.models.functions import Coalesce, Rank
+from . import cache as results_cache
+from .models import Choice, ChoiceShard
+from .routers import primary
+
+
+def _registered_users():
+    """Return a subquery counting the active users."""
+    users = get_user_model().objects.filter(is_active=True).order_by()
+    return Subquery(users.values('is_active').annotate(count=Count('pk')).values('count'))
+
+
+def compute_results(question_id):
+    """
+    Aggregate the results of a question in one query.
+
+    :param question_id is the id of the question.
+    :return dict with the question id, the total votes, the number of registered users,
+            the participation in percent of them, and the choices in id order, each with
+            its id, choice_text, tally, percent of the total and rank (1 for the most votes).
+    """
+    shards = ChoiceShard.objects.filter(choice=OuterRef('pk')).order_by().values('choice')
+    shard_votes = Subquery(shards.annotate(votes=Sum('votes')).values('votes'), output_field=IntegerField())
+    rows = list(Choice.objects.filter(question_id=question_id).annotate(
+        tally=F('votes') + Coalesce(shard_votes, 0),
+    ).annotate(
+        total=Window(Sum('tally')),
+        rank=Window(Rank(), order_by=F('tally').desc()),
+        registered=Coalesce(_registered_users(), 0),
+    ).order_by('pk').values('pk', 'choice_text', 'tally', 'total', 'rank', 'registered'))
+    if rows:
+        total, registered = rows[0]['total'], rows[0]['registered']
+    else:
+        total, registered = 0, get_user_model().objects.filter(is_active=True).count()
+    return {
+        'question': question_id,
+        'total': total,
+        'registered': registered,
+        'participation': round(100 * total / registered, 1) if registered else 0.0,
+        'choices': [{'id': row['pk'], 'choice_text': row['choice_text'], 'tally': row['tally'],
+                     'percent': round(100 * row['tally'] / total, 1) if total else 0.0, 'rank': row['rank']}
+                    for row in rows],
+    }
+
+
+def get_results(question_id, version=None):
+    """
+    Get the results of a question from the results cache, computing them on a miss.
+
+    :param question_id is the id of the question.
+    :param version is the results version if already looked up, otherwise it is read from the cache.
+    :return the results, as returned by compute_results().
+    """
+    if version is None:
+        version = results_cache.get_version(question_id)
+    data = results_cache.get_data(question_id, version)
+    if data is None:
+        with primary():
+            data = compute_results(question_id)
+        results_cache.set_data(question_id, version, data)
+    return data
@@ -0,0 +1,107 @@
+"""Database router that reads the polls app from replicas and writes it to the primary.
+
+Replicas are the aliases listed in ``POLLS_READ_REPLICAS``; with none listed
+every query goes to ``default``. Reads only go to a replica inside a
+``replicas()`` block, which ReplicaMiddleware opens for read-only requests, so
+management commands and background threads keep reading what they write.
+Writes, the admin and the clients that have just voted stay on the primary,
+so a voter sees their own ballot in the results right away instead of waiting
+for the replicas to catch up. ``primary()`` goes back to the primary for part
+of a request.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_use_replicas = ContextVar('polls_use_replicas', default=False)
+
+
+@contextmanager
+def _reading_replicas(value):
+    """Set whether the reads made inside the block may go to a replica."""
+    token = _use_replicas.set(value)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+def replicas():
+    """Let the reads of the polls app made inside the block go to a replica."""
+    return _reading_replicas(True)
+
+
+def primary():
+    """Send every read of the polls app made inside the block to the primary."""
+    return _reading_replicas(False)
+
+
+def reading_replicas():
+    """
+    Check whether reads may go to a replica.
+
+    :return True inside a replicas() block and outside any primary() block nested in it, False otherwise.
+    """
+    return _use_replicas.get()
+
+
+class ReplicaRouter:
+    """Route the polls app's reads to a random replica and its writes to the primary."""
+
+    app_label = 'polls'
+
+    def db_for_read(self, model, **hints):
+        """
+        Pick the database to read a polls model from.
+
+        Related objects are read from the database their instance came from, so
+        one page does not mix rows of replicas that are at different points.
+
+        :param model is the model class.
+        :param **hints is the routing hints, such as the instance.
+        :return a replica alias, default outside a replicas() block, or None for other apps.
+        """
+        if model._meta.app_label != self.app_label:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        aliases = settings.POLLS_READ_REPLICAS
+        if not aliases or not reading_replicas():
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        """
+        Send every write of a polls model to the primary.
+
+        :param model is the model class.
+        :param **hints is the routing hints.
+        :return default, or None for other apps.
+        """
+        if model._meta.app_label != self.app_label:
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """
+        Allow relations between objects of the primary and its replicas, which hold the same rows.
+
+        :return True if both objects come from the primary or a replica, None otherwise.
+        """
+        databases = {DEFAULT_DB_ALIAS, *settings.POLLS_READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """
+        Migrate the primary only; the replicas get their schema with the data.
+
+        :return False for replicas, None otherwise.
+        """
+        if db in settings.POLLS_READ_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,55 @@
+"""Full-text search over questions and their choices.
+
+On SQLite the search runs against the ``polls_search`` FTS5 index (see
+QuestionSearch), ranked by bm25. Other databases have no such index and fall
+back to case-insensitive containment, unranked.
+"""
+import re
+from django.db import connections
+from django.db.models import F, Q
+
+_WORD = re.compile(r'\w+')
+
+
+def match_expression(terms):
+    """
+    Turn what a user typed into an FTS5 query: every word must appear, as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are never interpreted.
+
+    :param terms is the search text.
+    :return the MATCH expression, or None if the text has no words.
+    """
+    words = _WORD.findall(terms)
+    if not words:
+        return None
+    return ' '.join('"%s"*' % word for word in words)
+
+
+def is_ranked(using):
+    """
+    Check whether search results on a database come from the full-text index, with a rank.
+
+    :param using is the database alias.
+    :return True on SQLite, False otherwise.
+    """
+    return connections[using].vendor == 'sqlite'
+
+
+def search(queryset, terms):
+    """
+    Keep the questions whose text or choices match, best match first.
+
+    :param queryset is the questions to search.
+    :param terms is the search text.
+    :return the matching questions, ordered by ``rank`` (lower is better) when is_ranked(), newest first otherwise.
+    """
+    expression = match_expression(terms)
+    if expression is None:
+        return queryset.none()
+    if not is_ranked(queryset.db):
+        words = Q()
+        for word in _WORD.findall(terms):
+            words &= Q(question_text__icontains=word) | Q(choice__choice_text__icontains=word)
+        return queryset.filter(pk__in=queryset.model.objects.filter(words).values('pk')).order_by('-pk')
+    return queryset.filter(search__document__match=expression).annotate(rank=F('search__rank')).order_by('rank', '-pk')
@@ -0,0 +1,32 @@
+"""Signal receivers that keep the cached results, snapshots and question versions in sync with admin edits."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import bump_catalogue_version, bump_version
+from .models import Choice, Question
+from .snapshots import discard
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_results(sender, instance, **kwargs):
+    """Drop the cached results and move the index to a new version when a question is added, edited or removed."""
+    bump_version(instance.pk)
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Question)
+def discard_question_snapshot(sender, instance, created, **kwargs):
+    """Drop the snapshot and move the version when a question is edited, as its end date may have moved."""
+    if not created:
+        discard(instance.pk)
+        Question.objects.filter(pk=instance.pk).touch()
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_choice_results(sender, instance, **kwargs):
+    """Drop the cached results and the snapshot and move the versions when a choice is added, edited or removed."""
+    bump_version(instance.question_id)
+    bump_catalogue_version()
+    discard(instance.question_id)
+    Question.objects.filter(pk=instance.question_id).touch()
@@ -0,0 +1,88 @@
+"""Frozen results of ended questions.
+
+Once a question's end date has passed no ballot can change its tally, so the
+first read after the end freezes the counts, percentages, ranks and the
+rendered results page into a ResultsSnapshot. Later reads serve that row instead of
+aggregating the votes again. The backfill_snapshots command freezes every ended
+question up front.
+"""
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import ResultsSnapshot
+from .results import compute_results
+
+
+def has_ended(question, now=None):
+    """
+    Check whether a question's results can no longer change.
+
+    :param question is the question.
+    :param now is the time to compare against, defaults to the current time.
+    :return True if the question has an end date in the past, False otherwise.
+    """
+    return question.end_date is not None and question.end_date < (now or timezone.now())
+
+
+def render_results(question, results):
+    """
+    Render the results page of a question.
+
+    :param question is the question.
+    :param results is the question's results from polls.results.
+    :return the rendered page.
+    """
+    return render_to_string('polls/results.html', {'question': question, 'object': question, 'results': results,
+                                                   'choices': results['choices']})
+
+
+def freeze(question):
+    """
+    Aggregate a question's tally once and store it with the rendered page.
+
+    :param question is the question, which should have ended.
+    :return the ResultsSnapshot.
+    """
+    results = compute_results(question.id)
+    snapshot = ResultsSnapshot(question=question, total=results['total'], tallies=results['choices'],
+                               html=render_results(question, results))
+    # If another request froze it first, both computed the same final tally.
+    ResultsSnapshot.objects.bulk_create([snapshot], ignore_conflicts=True)
+    return snapshot
+
+
+def get_snapshot(question):
+    """
+    Get the snapshot of an ended question, freezing it on the first read.
+
+    Use ``Question.objects.select_related('snapshot')`` to find an existing
+    snapshot without another query.
+
+    :param question is the question.
+    :return the ResultsSnapshot, or None if the question has not ended.
+    """
+    if not has_ended(question):
+        return None
+    try:
+        return question.snapshot
+    except ResultsSnapshot.DoesNotExist:
+        return freeze(question)
+
+
+def discard(question_id):
+    """
+    Drop the snapshot of a question whose dates or choices were edited.
+
+    :param question_id is the id of the question.
+    """
+    ResultsSnapshot.objects.filter(question_id=question_id).delete()
+
+
+def discard_many(question_ids):
+    """
+    Drop the snapshots of questions whose tallies changed after they ended.
+
+    That happens when the vote buffer flushes ballots cast before the end date.
+
+    :param question_ids is the ids of the questions.
+    """
+    ResultsSnapshot.objects.filter(question_id__in=question_ids).delete()
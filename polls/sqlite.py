@@ -0,0 +1,29 @@
+"""Connection setup for SQLite: WAL journal, busy timeout and cache pragmas."""
+from django.conf import settings
+
+# The WAL journal mode is stored in the database file, so it is set on the first connection to each file only.
+_wal_databases = set()
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """
+    Run the PRAGMA statements from ``SQLITE_PRAGMAS`` on every new SQLite connection.
+
+    They run on the DB-API connection rather than through a cursor, so they are
+    not counted as queries of the request that opened the connection.
+
+    :param sender is the database wrapper class.
+    :param connection is the new database connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    for name, value in pragmas.items():
+        if not name.isidentifier() or not str(value).replace('-', '').isalnum():
+            raise ValueError("Invalid SQLite pragma: %s = %s" % (name, value))
+        if name == 'journal_mode' and str(value).upper() == 'WAL':
+            database = connection.settings_dict['NAME']
+            if database in _wal_databases:
+                continue
+            _wal_databases.add(database)
+        connection.connection.execute('PRAGMA %s = %s' % (name, value)).close()
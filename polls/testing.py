@@ -0,0 +1,40 @@
+"""Test helpers for keeping the hot paths within their query budgets."""
+from contextlib import ExitStack, contextmanager
+from django.db import connections
+from .middleware import budget_for
+
+
+class QueryBudgetMixin:
+    """Assertions on the number of queries run by a block of code."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        """
+        Fail if the block runs more than ``budget`` queries, on the primary and the replicas together.
+
+        :param budget is the number of queries allowed.
+        """
+        captured = []
+
+        def capture(alias):
+            def wrapper(execute, sql, params, many, context):
+                captured.append((alias, sql))
+                return execute(sql, params, many, context)
+            return wrapper
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(capture(connection.alias)))
+            yield captured
+        if len(captured) > budget:
+            queries = '\n'.join('%d. [%s] %s' % (i, alias, sql) for i, (alias, sql) in enumerate(captured, 1))
+            self.fail("%d queries executed, at most %d allowed\nCaptured queries were:\n%s"
+                      % (len(captured), budget, queries))
+
+    def assertWithinBudget(self, view):
+        """
+        Fail if the block runs more queries than the view's budget in POLLS_QUERY_BUDGETS.
+
+        :param view is the name of the view.
+        """
+        return self.assertMaxQueries(budget_for(view)['queries'])
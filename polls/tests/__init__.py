@@ -0,0 +1,25 @@
+"""Tests of the polls app.
+
+The audit trail of a test run goes to a temporary directory instead of the
+project's ``POLLS_AUDIT_LOG``, which is removed when the run ends.
+"""
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+from polls.audit import AuditHandler
+
+_audit_directory = tempfile.mkdtemp(prefix='polls-audit-')
+_audit_handlers = [handler for handler in logging.getLogger('polls.audit').handlers
+                   if isinstance(handler, AuditHandler)]
+for _handler in _audit_handlers:
+    _handler.reopen(os.path.join(_audit_directory, 'audit.log'))
+
+
+@atexit.register
+def _remove_audit_directory():
+    """Close the audit handlers so nothing is written after the directory is gone, then remove it."""
+    for handler in _audit_handlers:
+        handler.close()
+    shutil.rmtree(_audit_directory, ignore_errors=True)
@@ -0,0 +1,20 @@
+"""URLs that serve the async polls views, for the async view tests."""
+import asyncio
+from django.contrib import admin
+from django.http import HttpResponse
+from django.urls import include, path
+from polls.urls import app_name, async_urlpatterns
+
+
+async def slow(request):
+    """Wait a little without holding a thread, like a view awaiting another service."""
+    await asyncio.sleep(0.25)
+    return HttpResponse('done')
+
+
+urlpatterns = [
+    path('polls/', include((async_urlpatterns, app_name))),
+    path('admin/', admin.site.urls),
+    path('accounts/', include('django.contrib.auth.urls')),
+    path('slow/', slow),
+]
@@ -0,0 +1,178 @@
+"""Test case for the JSON API."""
+import datetime
+import gzip
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Question
+from polls.voting import cast_vote
+
+
+def create_question(question_text, days, end_days=None):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = timezone.now() + datetime.timedelta(days=end_days) if end_days is not None else None
+    return Question.objects.create(question_text=question_text, pub_date=time, end_date=end)
+
+
+def polls_queries(queries):
+    """Return the captured queries that touch the polls tables."""
+    return [query for query in queries if 'polls_' in query['sql']]
+
+
+@override_settings(POLLS_CONDITIONAL_GET=True)
+class PollListTests(TestCase):
+    """Tests for the list of open polls."""
+
+    def setUp(self):
+        """Create two open polls, an ended one and one not published yet."""
+        cache.clear()
+        self.old = create_question(question_text='Old Question.', days=-5)
+        self.new = create_question(question_text='New Question.', days=-1)
+        create_question(question_text='Ended Question.', days=-5, end_days=-1)
+        create_question(question_text='Future Question.', days=5)
+        self.url = reverse('polls:api_polls')
+
+    def test_lists_open_polls_newest_first(self):
+        """Only the open polls are listed, newest first, with every field."""
+        polls = self.client.get(self.url).json()['polls']
+        self.assertEqual([poll['question_text'] for poll in polls], ['New Question.', 'Old Question.'])
+        self.assertEqual(set(polls[0]), {'id', 'question_text', 'pub_date', 'end_date'})
+
+    def test_field_selection(self):
+        """``?fields=`` keeps only the fields asked for."""
+        response = self.client.get(self.url, {'fields': 'question_text,id'})
+        self.assertEqual(response.json()['polls'][0], {'id': self.new.id, 'question_text': 'New Question.'})
+
+    def test_unknown_field(self):
+        """Asking for a field the API does not have is a 400 that names it."""
+        response = self.client.get(self.url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_cached_page_costs_no_query(self):
+        """A page of the list already in the cache is served without a polls query."""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()['polls']), 2)
+        self.assertEqual(polls_queries(queries), [])
+
+    @override_settings(POLLS_INDEX_PAGE_SIZE=1)
+    def test_pages_follow_the_cursor(self):
+        """The next_cursor of a page leads to the next one, and the last page has none."""
+        first = self.client.get(self.url, {'fields': 'question_text'}).json()
+        self.assertEqual(first['polls'], [{'question_text': 'New Question.'}])
+        second = self.client.get(self.url, {'fields': 'question_text', 'cursor': first['next_cursor']}).json()
+        self.assertEqual(second, {'polls': [{'question_text': 'Old Question.'}], 'next_cursor': None})
+
+    def test_matching_etag_is_not_modified(self):
+        """A matching ETag gets a 304 until a poll ends and the list changes."""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.old.end_date = timezone.now() - datetime.timedelta(hours=1)
+        self.old.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['polls']), 1)
+
+    def test_gzip(self):
+        """The body is gzip encoded for clients that accept it, and only for them."""
+        for day in range(10):
+            create_question(question_text='Question %d.' % day, days=-day - 2)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'New Question.', gzip.decompress(response.content))
+        self.assertNotIn('Content-Encoding', self.client.get(self.url))
+
+    def test_etag_depends_on_encoding(self):
+        """The gzip and identity bodies have different ETags, each matching only itself."""
+        gzipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        identity = self.client.get(self.url)['ETag']
+        self.assertNotEqual(gzipped, identity)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=gzipped)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], identity)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=gzipped)
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(POLLS_CONDITIONAL_GET=True)
+class PollDetailAndResultsTests(TestCase):
+    """Tests for a poll and its results."""
+
+    def setUp(self):
+        """Log in and create a poll with two choices."""
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user("John", "john@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        self.detail_url = reverse('polls:api_poll', args=(self.question.id,))
+        self.results_url = reverse('polls:api_results', args=(self.question.id,))
+
+    def test_detail(self):
+        """A poll is shown with its fields and its choices."""
+        data = self.client.get(self.detail_url).json()
+        self.assertEqual(data['question_text'], 'Past Question.')
+        self.assertEqual(data['choices'], [{'id': self.first.id, 'choice_text': 'First'},
+                                           {'id': self.second.id, 'choice_text': 'Second'}])
+
+    def test_detail_field_selection(self):
+        """``?fields=`` keeps only the fields asked for on a poll too."""
+        data = self.client.get(self.detail_url, {'fields': 'choices'}).json()
+        self.assertEqual(list(data), ['choices'])
+
+    def test_choice_edit_is_seen(self):
+        """Editing a choice moves the poll to a new version, so the cached body is not served."""
+        self.client.get(self.detail_url)
+        self.second.choice_text = 'Renamed'
+        self.second.save()
+        self.assertContains(self.client.get(self.detail_url), 'Renamed')
+
+    def test_results(self):
+        """The results hold the total, the participation and every choice's tally, share and rank."""
+        cast_vote(self.user, self.question, self.second)
+        data = self.client.get(self.results_url).json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['participation'], 100.0)
+        self.assertEqual([(row['tally'], row['percent'], row['rank']) for row in data['choices']],
+                         [(0, 0.0, 2), (1, 100.0, 1)])
+
+    def test_vote_invalidates_results(self):
+        """After a vote the old ETag no longer matches and the new total is sent."""
+        etag = self.client.get(self.results_url)['ETag']
+        cast_vote(self.user, self.question, self.first)
+        response = self.client.get(self.results_url, {'fields': 'total'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json(), {'total': 1})
+
+    def test_cached_results_cost_one_query(self):
+        """Cached results only cost the query checking that the poll is published."""
+        self.client.get(self.results_url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.results_url)
+        self.assertEqual(len(polls_queries(queries)), 1)
+
+    def test_login_required(self):
+        """Anonymous clients get a 401 for a poll and its results."""
+        self.client.logout()
+        self.assertEqual(self.client.get(self.detail_url).status_code, 401)
+        self.assertEqual(self.client.get(self.results_url).status_code, 401)
+
+    def test_missing_question(self):
+        """A poll that does not exist is a 404."""
+        url = reverse('polls:api_results', args=(self.question.id + 1,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_unpublished_question(self):
+        """A poll that is not published yet is a 404, like on the index."""
+        future = create_question(question_text='Future Question.', days=5)
+        self.assertEqual(self.client.get(reverse('polls:api_poll', args=(future.id,))).status_code, 404)
+        self.assertEqual(self.client.get(reverse('polls:api_results', args=(future.id,))).status_code, 404)
@@ -0,0 +1,90 @@
+"""Test case for the async views."""
+import asyncio
+import datetime
+import time
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls.instrumentation import view_stats
+from polls.models import Question
+
+FORM = 'application/x-www-form-urlencoded'
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+@override_settings(ROOT_URLCONF='polls.tests.async_urls')
+class AsyncViewTests(TestCase):
+    """Tests for the async index, results and vote views."""
+
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user("John", "john@gmail.com", "12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = self.question.choice_set.create(choice_text='First')
+        self.async_client.login(username="John", password="12345")
+
+    async def test_index(self):
+        """The async index lists published questions."""
+        response = await self.async_client.get(reverse('polls:index'))
+        self.assertContains(response, 'Past Question.')
+
+    async def test_vote_and_results(self):
+        """An async vote is counted and shown on the async results page."""
+        response = await self.async_client.post(reverse('polls:vote', args=(self.question.id,)),
+                                                'choice=%d' % self.choice.id, content_type=FORM)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, reverse('polls:results', args=(self.question.id,)))
+        response = await self.async_client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, '">1</td>')
+
+    async def test_results_have_no_live_stream(self):
+        """The blocking live stream is not served with the async views, so the results page does not open it."""
+        cache.clear()
+        response = await self.async_client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertNotContains(response, 'EventSource')
+        response = await self.async_client.get('/polls/%d/results/stream/' % self.question.id)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_vote_without_choice(self):
+        """Voting without a choice shows the question again with an error."""
+        response = await self.async_client.post(reverse('polls:vote', args=(self.question.id,)), '',
+                                                content_type=FORM)
+        self.assertContains(response, "You didn&#x27;t select a choice.")
+
+    @override_settings(POLLS_RATE_LIMITS={'vote': {'user': {'capacity': 1, 'per_second': 1}}})
+    async def test_vote_rate_limit(self):
+        """A second vote within the user's rate limit is refused with 429."""
+        url = reverse('polls:vote', args=(self.question.id,))
+        response = await self.async_client.post(url, 'choice=%d' % self.choice.id, content_type=FORM)
+        self.assertEqual(response.status_code, 302)
+        response = await self.async_client.post(url, 'choice=%d' % self.choice.id, content_type=FORM)
+        self.assertEqual(response.status_code, 429)
+        cache.clear()
+
+    async def test_results_requires_login(self):
+        """Anonymous users are sent to the login page."""
+        self.async_client.cookies.clear()
+        response = await self.async_client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(POLLS_READ_REPLICAS=['default'])
+    async def test_middleware_does_not_serialize_requests(self):
+        """The polls middlewares run async, so concurrent requests to an awaiting view overlap."""
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[self.async_client.get('/slow/') for _ in range(5)])
+        elapsed = time.perf_counter() - started
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertLess(elapsed, 0.25 * 3)
+
+    async def test_async_queries_are_counted(self):
+        """The queries an async view runs in the sync thread count against its budget."""
+        view_stats.reset()
+        await self.async_client.get(reverse('polls:index'))
+        self.assertGreater(view_stats.snapshot()['index']['queries']['mean'], 0)
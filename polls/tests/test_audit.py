@@ -0,0 +1,105 @@
+"""Test case for the audit trail."""
+import datetime
+import json
+import logging
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+import polls.tests
+from polls.audit import AuditHandler, JsonFormatter
+from polls.models import Question
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+class AuditEventTests(TestCase):
+    """Tests for the audit events sent by the auth signals and the vote view."""
+
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user("John", "john@gmail.com", "12345")
+
+    def events(self, logs):
+        return [(record.getMessage(), record.audit) for record in logs.records]
+
+    def test_login_and_logout(self):
+        """Logging in and out are recorded with the user and the client ip."""
+        with self.assertLogs('polls.audit', level='INFO') as logs:
+            self.client.post(reverse('login'), {'username': 'John', 'password': '12345'}, REMOTE_ADDR='10.0.0.1')
+            self.client.post(reverse('logout'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(self.events(logs), [('login', {'ip': '10.0.0.1', 'user': 'John'}),
+                                             ('logout', {'ip': '10.0.0.1', 'user': 'John'})])
+
+    def test_failed_login(self):
+        """A failed login is recorded as a warning with the username that was tried."""
+        with self.assertLogs('polls.audit', level='WARNING') as logs:
+            self.client.post(reverse('login'), {'username': 'John', 'password': 'wrong'})
+        self.assertEqual(logs.records[0].getMessage(), 'login_failed')
+        self.assertEqual(logs.records[0].audit['user'], 'John')
+
+    def test_vote(self):
+        """A ballot is recorded with its question and choice."""
+        question = create_question(question_text='Past Question.', days=-5)
+        choice = question.choice_set.create(choice_text='First')
+        self.client.login(username="John", password="12345")
+        with self.assertLogs('polls.audit', level='INFO') as logs:
+            self.client.post(reverse('polls:vote', args=(question.id,)), {'choice': choice.id})
+        self.assertEqual(logs.records[-1].getMessage(), 'vote')
+        self.assertEqual(logs.records[-1].audit['question'], question.id)
+        self.assertEqual(logs.records[-1].audit['choice'], choice.id)
+
+
+class AuditHandlerTests(TestCase):
+    """Tests for the queued rotating file handler."""
+
+    def test_records_are_written_as_json_lines(self):
+        """Queued records reach the file once the handler is closed."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'audit.log')
+            handler = AuditHandler(path)
+            handler.setFormatter(JsonFormatter())
+            logger = logging.getLogger('polls.tests.audit')
+            logger.addHandler(handler)
+            logger.propagate = False
+            try:
+                logger.warning('login_failed', extra={'audit': {'user': 'John', 'ip': '10.0.0.1'}})
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            with open(path) as log_file:
+                line = json.loads(log_file.readline())
+        self.assertEqual(line['event'], 'login_failed')
+        self.assertEqual(line['level'], 'WARNING')
+        self.assertEqual(line['user'], 'John')
+        self.assertEqual(line['ip'], '10.0.0.1')
+
+    def test_reopen_moves_the_next_records(self):
+        """Records queued before reopen() stay in the old file, later ones go to the new file."""
+        with tempfile.TemporaryDirectory() as directory:
+            old, new = os.path.join(directory, 'old.log'), os.path.join(directory, 'new.log')
+            handler = AuditHandler(old)
+            logger = logging.getLogger('polls.tests.audit')
+            logger.addHandler(handler)
+            logger.propagate = False
+            try:
+                logger.warning('before')
+                handler.reopen(new)
+                logger.warning('after')
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            with open(old) as old_file, open(new) as new_file:
+                self.assertEqual((old_file.read(), new_file.read()), ('before\n', 'after\n'))
+
+    def test_test_run_does_not_write_the_project_audit_log(self):
+        """The test run's audit handler writes to a temporary file."""
+        handler = next(handler for handler in logging.getLogger('polls.audit').handlers
+                       if isinstance(handler, AuditHandler))
+        self.assertEqual(os.path.dirname(handler.target.baseFilename), polls.tests._audit_directory)
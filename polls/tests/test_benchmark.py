@@ -0,0 +1,34 @@
+"""Test case for the benchmark helpers."""
+from django.test import SimpleTestCase
+from django.template.loader import render_to_string
+from polls.benchmark import RenderTimer, percentile, summarize
+
+
+class BenchmarkHelperTests(SimpleTestCase):
+    """Tests for the bench_polls statistics."""
+
+    def test_percentile_nearest_rank(self):
+        """percentile() picks the nearest-rank sample."""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_summarize(self):
+        """summarize() reports latency in ms, throughput, queries and statuses."""
+        samples = [(0.010, 200, 3), (0.020, 200, 5), (0.030, 302, 4)]
+        result = summarize(samples, elapsed=0.5)
+        self.assertEqual(result['requests'], 3)
+        self.assertEqual(result['p50_ms'], 20.0)
+        self.assertEqual(result['requests_per_s'], 6.0)
+        self.assertEqual(result['queries_per_request'], 4.0)
+        self.assertEqual(result['statuses'], {'200': 2, '302': 1})
+
+    def test_render_timer(self):
+        """The render timer counts the template renders made while it is active."""
+        with RenderTimer() as renders:
+            render_to_string('polls/results.html', {'question': {'id': 1}, 'choices': []})
+        render_to_string('polls/results.html', {'question': {'id': 1}, 'choices': []})
+        self.assertEqual(renders.renders, 1)
+        self.assertGreater(renders.seconds, 0)
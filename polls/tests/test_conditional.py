@@ -0,0 +1,217 @@
+"""Test case for the conditional GETs of the index and results pages."""
+import datetime
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from polls.checks import check_conditional_get_cache
+from polls.models import Question
+from polls.voting import cast_vote
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+def polls_queries(queries):
+    """Return the captured queries that touch the polls tables."""
+    return [query for query in queries if 'polls_' in query['sql']]
+
+
+@override_settings(POLLS_CONDITIONAL_GET=True)
+class ResultsConditionalTests(TestCase):
+    """Tests for the ETag of ResultsView."""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user("John", "john@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = self.question.choice_set.create(choice_text='First')
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_etag_is_sent(self):
+        """The results page carries an ETag, but no Last-Modified as votes do not record a time."""
+        response = self.client.get(self.url)
+        self.assertTrue(response['ETag'])
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_matching_etag_is_not_modified(self):
+        """A refresh with the current ETag gets a 304 without any query on the polls tables."""
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(polls_queries(queries), [])
+
+    def test_vote_does_not_write_the_question(self):
+        """A vote moves the results version in the cache without updating the question row."""
+        with CaptureQueriesContext(connection) as queries:
+            cast_vote(self.user, self.question, self.choice)
+        self.assertFalse([query for query in queries if 'UPDATE "polls_question"' in query['sql']])
+
+    def test_vote_changes_etag(self):
+        """A vote moves the question's version, so the old ETag no longer matches."""
+        etag = self.client.get(self.url)['ETag']
+        cast_vote(self.user, self.question, self.choice)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_choice_edit_changes_etag(self):
+        """An admin edit of a choice moves the question's version."""
+        etag = self.client.get(self.url)['ETag']
+        self.choice.choice_text = 'Renamed'
+        self.choice.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Renamed')
+
+    def test_evicted_version_changes_etag(self):
+        """A results version lost from the cache starts again at a new number, so old ETags stop matching."""
+        etag = self.client.get(self.url)['ETag']
+        cache.clear()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_question(self):
+        """A question that does not exist is still a 404."""
+        response = self.client.get(reverse('polls:results', args=(999,)), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(POLLS_CONDITIONAL_GET=True)
+class IndexConditionalTests(TestCase):
+    """Tests for the ETag and Last-Modified of IndexView."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user("John", "john@gmail.com", "12345")
+        User.objects.create_user("Jane", "jane@gmail.com", "12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.url = reverse('polls:index')
+
+    def test_matching_etag_is_not_modified(self):
+        """A refresh with the current ETag gets a 304 without any query."""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_vote_keeps_etag(self):
+        """The index does not show tallies, so votes leave its ETag alone."""
+        choice = self.question.choice_set.create(choice_text='First')
+        etag = self.client.get(self.url)['ETag']
+        cast_vote(self.user, self.question, choice)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_new_question_changes_etag(self):
+        """A newly published question changes the index ETag."""
+        etag = self.client.get(self.url)['ETag']
+        create_question(question_text='New Question.', days=-1)
+        self.assertContains(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag), 'New Question.')
+
+    def test_ending_question_changes_etag(self):
+        """A question whose end date passes changes the index ETag, without any edit."""
+        now = timezone.now()
+        self.question.end_date = now + datetime.timedelta(hours=1)
+        self.question.save()
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with mock.patch('django.utils.timezone.now', return_value=now + datetime.timedelta(hours=2)):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['latest_question_list'][0].is_open)
+
+    def test_publication_changes_etag(self):
+        """A question whose publication date passes changes the index ETag, without any edit."""
+        now = timezone.now()
+        create_question(question_text='Future Question.', days=1)
+        etag = self.client.get(self.url)['ETag']
+        with mock.patch('django.utils.timezone.now', return_value=now + datetime.timedelta(days=2)):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['latest_question_list'][0].question_text, 'Future Question.')
+
+    def test_etag_depends_on_user(self):
+        """The index shows the user's name, so every user gets their own ETag."""
+        self.client.login(username="John", password="12345")
+        john = self.client.get(self.url)['ETag']
+        self.client.login(username="Jane", password="12345")
+        self.assertNotEqual(self.client.get(self.url)['ETag'], john)
+
+    def test_page_with_messages_has_no_etag(self):
+        """A page that shows flash messages is never answered with a 304."""
+        self.client.login(username="John", password="12345")
+        ended = create_question(question_text='Ended Question.', days=-5)
+        ended.end_date = timezone.now() - datetime.timedelta(days=1)
+        ended.save()
+        response = self.client.get(reverse('polls:detail', args=(ended.id,)), follow=True)
+        self.assertContains(response, "already ended")
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(ROOT_URLCONF='polls.tests.async_urls', POLLS_CONDITIONAL_GET=True)
+class AsyncConditionalTests(TestCase):
+    """Tests for the conditional GETs of the async views."""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        User.objects.create_user("John", "john@gmail.com", "12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.question.choice_set.create(choice_text='First')
+        self.async_client.login(username="John", password="12345")
+
+    async def test_results_not_modified(self):
+        """The async results view answers a matching ETag with 304."""
+        url = reverse('polls:results', args=(self.question.id,))
+        etag = (await self.async_client.get(url))['ETag']
+        response = await self.async_client.get(url, **{'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    async def test_index_not_modified(self):
+        """The async index view answers a matching ETag with 304."""
+        etag = (await self.async_client.get(reverse('polls:index')))['ETag']
+        response = await self.async_client.get(reverse('polls:index'), **{'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(POLLS_CONDITIONAL_GET=False)
+class ConditionalSettingTests(TestCase):
+    """Tests for turning the cache-backed validators off."""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        User.objects.create_user("John", "john@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+
+    def test_pages_carry_no_validators(self):
+        """With conditional GETs off, the index, the results page and the poll list send no ETag."""
+        for url in (reverse('polls:index'), reverse('polls:results', args=(self.question.id,)),
+                    reverse('polls:api_polls')):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_check_refuses_a_per_process_cache(self):
+        """The deploy check flags conditional GETs backed by a LocMemCache, and only those."""
+        self.assertEqual(check_conditional_get_cache(None), [])
+        with self.settings(POLLS_CONDITIONAL_GET=True):
+            self.assertEqual([error.id for error in check_conditional_get_cache(None)], ['polls.E001'])
+            deploy_checks = checks.registry.registry.get_checks(include_deployment_checks=True)
+            self.assertIn(check_conditional_get_cache, deploy_checks)
+        memcached = {'default': {'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache'}}
+        with self.settings(POLLS_CONDITIONAL_GET=True, CACHES=memcached):
+            self.assertEqual(check_conditional_get_cache(None), [])
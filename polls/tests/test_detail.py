@@ -40,3 +40,31 @@ class QuestionDetailViewTests(TestCase):
         url = reverse('polls:detail', args=(past_question.id,))
         response = self.client.get(url)
         self.assertContains(response, past_question.question_text)
+
+    def test_detail_query_count(self):
+        """The detail page loads the question and its choices once, however many choices it has."""
+        question = create_question(question_text='Past Question.', days=-5)
+        for i in range(10):
+            question.choice_set.create(choice_text='Choice %d' % i)
+        url = reverse('polls:detail', args=(question.id,))
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertContains(response, 'Choice 9')
+
+    def test_missing_question(self):
+        """The detail view of a question that does not exist redirects to the index page."""
+        response = self.client.get(reverse('polls:detail', args=(999,)))
+        self.assertRedirects(response, reverse('polls:index'))
+
+    def test_choice_list_fragment_is_cached(self):
+        """The choice list is rendered from the fragment cache until a choice is edited."""
+        question = create_question(question_text='Past Question.', days=-5)
+        choice = question.choice_set.create(choice_text='First')
+        url = reverse('polls:detail', args=(question.id,))
+        self.client.get(url)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, 'First')
+        choice.choice_text = 'Renamed'
+        choice.save()
+        self.assertContains(self.client.get(url), 'Renamed')
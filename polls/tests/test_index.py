@@ -1,7 +1,11 @@
 """Test case for IndexView."""
+import base64
 import datetime
 
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import reverse
 from polls.models import Question
@@ -50,3 +54,83 @@ class QuestionIndexViewTests(TestCase):
         response = self.client.get(reverse('polls:index'))
         self.assertQuerysetEqual(response.context['latest_question_list'],
                                  ['<Question: Past question 2.>', '<Question: Past question 1.>'])
+
+    def test_ended_question_has_no_vote_link(self):
+        """An ended question is listed with its results link but without a vote link."""
+        question = create_question(question_text="Ended question.", days=-30)
+        question.end_date = timezone.now() - datetime.timedelta(days=1)
+        question.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertFalse(response.context['latest_question_list'][0].is_open)
+        self.assertNotContains(response, 'href="%s"' % reverse('polls:detail', args=(question.id,)))
+        self.assertContains(response, 'href="%s"' % reverse('polls:results', args=(question.id,)))
+
+    def test_open_status_is_computed_in_one_query(self):
+        """The open/closed status of every listed question comes from the index query itself."""
+        for i in range(10):
+            create_question(question_text="Question %d." % i, days=-i - 1)
+        self.client.get(reverse('polls:index'))
+        # The validators come from the cache, so only the page is queried.
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('polls:index'))
+        self.assertTrue(all(question.is_open for question in response.context['latest_question_list']))
+
+    def test_row_fragment_follows_edits(self):
+        """A cached index row is rendered again once its question is edited or ends."""
+        question = create_question(question_text="Past question.", days=-1)
+        self.client.get(reverse('polls:index'))
+        question.question_text = "Renamed question."
+        question.save()
+        self.assertContains(self.client.get(reverse('polls:index')), "Renamed question.")
+        Question.objects.filter(pk=question.pk).update(end_date=timezone.now() - datetime.timedelta(hours=1))
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, 'href="%s"' % reverse('polls:detail', args=(question.id,)))
+
+
+@override_settings(POLLS_INDEX_PAGE_SIZE=2)
+class QuestionIndexPaginationTests(TestCase):
+    """Tests for the cursor pagination of IndexView."""
+
+    def test_cursor_walks_every_page(self):
+        """Following the next cursor lists every question exactly once, newest first."""
+        for i in range(5):
+            create_question(question_text="Question %d." % i, days=-i - 1)
+        seen = []
+        url = reverse('polls:index')
+        while url:
+            response = self.client.get(url)
+            seen += [question.question_text for question in response.context['latest_question_list']]
+            cursor = response.context['next_cursor']
+            url = cursor and reverse('polls:index') + '?cursor=' + cursor
+        self.assertEqual(seen, ["Question %d." % i for i in range(5)])
+
+    def test_open_filter(self):
+        """?status=open hides questions that have ended."""
+        create_question(question_text="Open question.", days=-1)
+        ended = create_question(question_text="Ended question.", days=-30)
+        ended.end_date = timezone.now() - datetime.timedelta(days=1)
+        ended.save()
+        response = self.client.get(reverse('polls:index') + '?status=open')
+        self.assertQuerysetEqual(response.context['latest_question_list'], ['<Question: Open question.>'])
+
+    def test_malformed_cursor_shows_first_page(self):
+        """An unreadable cursor falls back to the first page."""
+        create_question(question_text="Past question.", days=-1)
+        response = self.client.get(reverse('polls:index') + '?cursor=garbage')
+        self.assertQuerysetEqual(response.context['latest_question_list'], ['<Question: Past question.>'])
+
+    def test_out_of_range_cursor_shows_first_page(self):
+        """A cursor whose id does not fit in the database falls back to the first page."""
+        create_question(question_text="Past question.", days=-1)
+        token = base64.urlsafe_b64encode(b'2020-01-01T00:00:00+00:00|99999999999999999999999').decode()
+        response = self.client.get(reverse('polls:index') + '?cursor=' + token)
+        self.assertQuerysetEqual(response.context['latest_question_list'], ['<Question: Past question.>'])
+
+    def test_logged_in_index_skips_the_votes(self):
+        """The index page does not look up the user's last votes."""
+        User.objects.create_user("John", "john@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        create_question(question_text="Past question.", days=-1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('polls:index'))
+        self.assertFalse([query for query in queries if 'polls_vote' in query['sql']])
@@ -0,0 +1,79 @@
+"""Test case for the query budget middleware."""
+import datetime
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db.utils import ConnectionHandler
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls.instrumentation import view_stats
+from polls.models import Question
+from polls.testing import QueryBudgetMixin
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Tests for the per-view instrumentation and the hot path query budgets."""
+
+    def setUp(self):
+        view_stats.reset()
+        User = get_user_model()
+        self.user = User.objects.create_user("John", "john@gmail.com", "12345", is_staff=True)
+        self.client.login(username="John", password="12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choices = [self.question.choice_set.create(choice_text='Choice %d' % i) for i in range(10)]
+
+    def test_index_budget(self):
+        """The index page stays within its query budget."""
+        for i in range(30):
+            create_question(question_text='Question %d.' % i, days=-1)
+        with self.assertWithinBudget('IndexView'):
+            self.client.get(reverse('polls:index'))
+
+    def test_detail_budget(self):
+        """The detail page stays within its query budget."""
+        with self.assertWithinBudget('DetailView'):
+            self.client.get(reverse('polls:detail', args=(self.question.id,)))
+
+    def test_results_budget(self):
+        """The results page stays within its query budget."""
+        with self.assertWithinBudget('ResultsView'):
+            self.client.get(reverse('polls:results', args=(self.question.id,)))
+
+    def test_vote_budget(self):
+        """A ballot stays within its query budget."""
+        with self.assertWithinBudget('vote'):
+            self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choices[0].id})
+
+    def test_budget_counts_every_database(self):
+        """Queries on a replica count against the budget as well as those on the primary."""
+        sqlite = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        databases = ConnectionHandler({'default': sqlite, 'replica1': sqlite})
+        try:
+            with mock.patch('polls.testing.connections', databases):
+                with self.assertRaisesMessage(AssertionError, '2. [replica1] SELECT 1'):
+                    with self.assertMaxQueries(1):
+                        for alias in ('default', 'replica1'):
+                            databases[alias].cursor().execute('SELECT 1')
+        finally:
+            databases.close_all()
+
+    def test_views_are_recorded(self):
+        """Every request is added to its view's histograms."""
+        self.client.get(reverse('polls:index'))
+        self.client.get(reverse('polls:index'))
+        stats = self.client.get(reverse('polls:stats')).json()['views']
+        self.assertEqual(stats['IndexView']['requests'], 2)
+        self.assertGreater(stats['IndexView']['queries']['mean'], 0)
+
+    @override_settings(POLLS_QUERY_BUDGETS={'default': {'queries': 1}})
+    def test_over_budget_is_logged(self):
+        """Requests over budget are logged through the polls logger."""
+        with self.assertLogs('polls', level='WARNING') as logs:
+            self.client.get(reverse('polls:index'))
+        self.assertIn('IndexView', logs.output[0])
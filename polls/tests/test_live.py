@@ -0,0 +1,87 @@
+"""Test case for the live results stream."""
+import datetime
+import json
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from polls.live import TallyHub, hub
+from polls.models import Question
+from polls.voting import cast_vote
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+def read_event(subscription):
+    """Return the tally of the next event waiting for a subscription."""
+    event = subscription.events.get_nowait()
+    return json.loads(event.split('data: ', 1)[1])
+
+
+class TallyHubTests(TestCase):
+    """Tests for the fan-out hub."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user("John", "john@gmail.com", "12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = self.question.choice_set.create(choice_text='First')
+        self.hub = TallyHub()
+        self.hub.start = mock.Mock()
+
+    def test_subscribe_sends_current_tally(self):
+        """A new subscriber gets the current tally straight away."""
+        subscription = self.hub.subscribe(self.question.id)
+        self.assertEqual(read_event(subscription)['total'], 0)
+
+    def test_updates_are_coalesced(self):
+        """Many votes and many subscribers cost one tally query per tick."""
+        subscriptions = [self.hub.subscribe(self.question.id) for _ in range(5)]
+        for subscription in subscriptions:
+            read_event(subscription)
+        with mock.patch('polls.voting.hub', self.hub):
+            cast_vote(self.user, self.question, self.choice)
+            self.hub.publish(self.question.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.hub.tick(), 1)
+        for subscription in subscriptions:
+            self.assertEqual(read_event(subscription)['total'], 1)
+        self.assertEqual(self.hub.tick(), 0)
+
+    def test_unsubscribed_questions_are_not_loaded(self):
+        """Votes on questions nobody watches are ignored."""
+        self.hub.publish(self.question.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.hub.tick(), 0)
+
+
+class ResultsStreamViewTests(TestCase):
+    """Tests for the results_stream view."""
+
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user("John", "john@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.question.choice_set.create(choice_text='First')
+
+    def test_stream_starts_with_tally(self):
+        """The stream is an event stream that opens with the current tally."""
+        with mock.patch.object(hub, 'start'):
+            response = self.client.get(reverse('polls:results_stream', args=(self.question.id,)))
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            first = next(iter(response.streaming_content)).decode()
+            response.close()
+        self.assertTrue(first.startswith('event: tally\n'))
+        self.assertIn('"choice_text":"First"', first)
+
+    def test_results_page_opens_the_stream(self):
+        """The sync results page subscribes to the stream."""
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, 'new EventSource("%s")' % reverse('polls:results_stream',
+                                                                        args=(self.question.id,)))
@@ -0,0 +1,132 @@
+"""Test case for the vote rate limits."""
+import datetime
+import json
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from polls import ratelimit
+from polls.models import Question, Vote
+
+LIMITS = {'vote': {'user': {'capacity': 2, 'per_second': 1}, 'ip': {'capacity': 3, 'per_second': 1}}}
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+@override_settings(POLLS_RATE_LIMITS=LIMITS)
+class VoteRateLimitTests(TestCase):
+    """Tests for the token buckets in front of the vote view."""
+
+    def setUp(self):
+        """Log in one of two users and create a question to vote on."""
+        cache.clear()
+        ratelimit.reset()
+        User = get_user_model()
+        self.john = User.objects.create_user("John", "john@gmail.com", "12345")
+        self.jane = User.objects.create_user("Jane", "jane@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        self.question = create_question(question_text='Past Question.', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='First')
+        self.url = reverse('polls:vote', args=(self.question.id,))
+
+    def tearDown(self):
+        """Leave no empty bucket behind for the next test's voters."""
+        cache.clear()
+
+    def vote(self):
+        """Vote for the first choice as the logged in user."""
+        return self.client.post(self.url, {'choice': self.choice.id})
+
+    def test_user_is_refused_after_the_burst(self):
+        """A vote past the user's burst is refused with 429 and a Retry-After."""
+        self.assertEqual(self.vote().status_code, 302)
+        self.assertEqual(self.vote().status_code, 302)
+        response = self.vote()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(ratelimit.stats(), {'vote': {'user': 1}})
+
+    def test_refused_vote_runs_no_polls_query(self):
+        """A refused vote is turned away before any query on the polls tables."""
+        self.vote()
+        self.vote()
+        with CaptureQueriesContext(connection) as queries:
+            self.vote()
+        self.assertFalse([query for query in queries if 'polls_' in query['sql']])
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_ip_is_shared_by_its_users(self):
+        """The users of one ip share the ip's bucket."""
+        self.vote()
+        self.vote()
+        self.client.login(username="Jane", password="12345")
+        self.assertEqual(self.vote().status_code, 302)
+        self.assertEqual(self.vote().status_code, 429)
+        self.assertEqual(ratelimit.stats(), {'vote': {'ip': 1}})
+
+    def test_bucket_refills_over_time(self):
+        """A bucket gets its tokens back at its rate."""
+        now = timezone.now().timestamp()
+        with mock.patch('polls.ratelimit.time.time', return_value=now):
+            self.vote()
+            self.vote()
+            self.assertEqual(self.vote().status_code, 429)
+        with mock.patch('polls.ratelimit.time.time', return_value=now + 1):
+            self.assertEqual(self.vote().status_code, 302)
+
+    @override_settings(POLLS_RATE_LIMITS={})
+    def test_no_limit_when_not_configured(self):
+        """Without POLLS_RATE_LIMITS votes are never refused."""
+        for _ in range(5):
+            self.assertEqual(self.vote().status_code, 302)
+
+    def test_rejections_are_reported_by_stats(self):
+        """The stats view counts the refused votes per endpoint and bucket."""
+        self.john.is_staff = True
+        self.john.save()
+        for _ in range(3):
+            self.vote()
+        stats = self.client.get(reverse('polls:stats')).json()
+        self.assertEqual(stats['rate_limit_rejections'], {'vote': {'user': 1}})
+
+
+@override_settings(POLLS_RATE_LIMITS=LIMITS)
+class BatchVoteRateLimitTests(TestCase):
+    """Tests for the vote tokens taken by each ballot of a batch."""
+
+    def setUp(self):
+        """Log in and create three questions with a choice each."""
+        cache.clear()
+        ratelimit.reset()
+        get_user_model().objects.create_user("John", "john@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        self.questions = [create_question(question_text='Question %d.' % i, days=-1) for i in range(3)]
+        self.ballots = {question.id: question.choice_set.create(choice_text='Yes').id for question in self.questions}
+
+    def tearDown(self):
+        """Leave no empty bucket behind for the next test's voters."""
+        cache.clear()
+
+    def submit(self, ballots):
+        """Send a batch of ballots as JSON."""
+        return self.client.post(reverse('polls:vote_batch'), json.dumps(ballots), content_type='application/json')
+
+    def test_every_ballot_takes_a_vote_token(self):
+        """A batch with more ballots than the user has vote tokens left is refused before any polls query."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.submit(self.ballots)
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse([query for query in queries if 'polls_' in query['sql']])
+        self.assertEqual(ratelimit.stats(), {'vote': {'user': 1}})
+        first, second = list(self.ballots.items())[:2]
+        self.assertEqual(self.submit(dict([first, second])).status_code, 200)
+        self.assertEqual(self.submit(dict([first])).status_code, 429)
+        self.assertEqual(Vote.objects.count(), 2)
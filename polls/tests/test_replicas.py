@@ -0,0 +1,152 @@
+"""Test case for the read replica router, its middleware and the SQLite replicator."""
+import datetime
+import os
+import sqlite3
+import tempfile
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls.management.commands.sync_replicas import copy_database
+from polls.middleware import ReplicaMiddleware
+from polls.models import Question
+from polls.routers import ReplicaRouter, primary, reading_replicas, replicas
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+@override_settings(POLLS_READ_REPLICAS=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    """Tests for ReplicaRouter."""
+
+    def setUp(self):
+        """Create the router."""
+        self.router = ReplicaRouter()
+
+    def test_reads_stay_on_the_primary_outside_a_request(self):
+        """Reads outside a replicas() block go to the primary."""
+        self.assertEqual(self.router.db_for_read(Question), 'default')
+
+    def test_reads_go_to_a_replica_inside_replicas(self):
+        """Reads inside replicas() go to a replica, except inside a nested primary()."""
+        with replicas():
+            self.assertEqual(self.router.db_for_read(Question), 'replica1')
+            with primary():
+                self.assertEqual(self.router.db_for_read(Question), 'default')
+            self.assertEqual(self.router.db_for_read(Question), 'replica1')
+
+    def test_related_objects_are_read_where_their_instance_came_from(self):
+        """Related objects are read from the database of their instance."""
+        question = Question(pk=1)
+        question._state.db = 'default'
+        with replicas():
+            self.assertEqual(self.router.db_for_read(Question, instance=question), 'default')
+
+    def test_writes_go_to_the_primary(self):
+        """Writes go to the primary even inside replicas()."""
+        with replicas():
+            self.assertEqual(self.router.db_for_write(Question), 'default')
+
+    def test_other_apps_are_not_routed(self):
+        """Models of other apps are left to the other routers."""
+        with replicas():
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertIsNone(self.router.db_for_write(User))
+
+    def test_replicas_are_not_migrated(self):
+        """Only the primary is migrated."""
+        self.assertFalse(self.router.allow_migrate('replica1', 'polls'))
+        self.assertIsNone(self.router.allow_migrate('default', 'polls'))
+
+    @override_settings(POLLS_READ_REPLICAS=[])
+    def test_without_replicas_everything_reads_the_primary(self):
+        """With no replicas listed every read goes to the primary."""
+        with replicas():
+            self.assertEqual(self.router.db_for_read(Question), 'default')
+
+
+@override_settings(POLLS_READ_REPLICAS=['replica1'])
+class ReplicaMiddlewareTests(TestCase):
+    """Tests for ReplicaMiddleware."""
+
+    def setUp(self):
+        """Wrap a view that records whether it may read the replicas."""
+        self.factory = RequestFactory()
+        self.seen = []
+        self.middleware = ReplicaMiddleware(self.view)
+
+    def view(self, request):
+        """Record whether the request may read the replicas."""
+        self.seen.append(reading_replicas())
+        return HttpResponse()
+
+    def test_reads_use_the_replicas(self):
+        """A GET may read the replicas."""
+        self.middleware(self.factory.get('/polls/'))
+        self.assertEqual(self.seen, [True])
+
+    def test_writes_use_the_primary_and_stick_to_it(self):
+        """A POST reads the primary and gets the sticky cookie."""
+        response = self.middleware(self.factory.post('/polls/1/vote/'))
+        self.assertEqual(self.seen, [False])
+        self.assertIn(ReplicaMiddleware.sticky_cookie, response.cookies)
+
+    def test_admin_uses_the_primary(self):
+        """Admin pages always read the primary."""
+        self.middleware(self.factory.get(reverse('admin:polls_question_changelist')))
+        self.assertEqual(self.seen, [False])
+
+    def test_client_sticks_to_the_primary_after_a_write(self):
+        """A client with a valid sticky cookie reads the primary; a forged one does not."""
+        cookie = self.middleware(self.factory.post('/polls/1/vote/')).cookies[ReplicaMiddleware.sticky_cookie]
+        request = self.factory.get('/polls/1/results/')
+        request.COOKIES[cookie.key] = cookie.value
+        self.middleware(request)
+        request.COOKIES[cookie.key] = 'forged'
+        self.middleware(request)
+        self.assertEqual(self.seen, [False, False, True])
+
+    @override_settings(POLLS_READ_REPLICAS=[])
+    def test_nothing_changes_without_replicas(self):
+        """Without replicas nothing reads them and no sticky cookie is set."""
+        response = self.middleware(self.factory.post('/polls/1/vote/'))
+        self.middleware(self.factory.get('/polls/'))
+        self.assertEqual(self.seen, [False, False])
+        self.assertNotIn(ReplicaMiddleware.sticky_cookie, response.cookies)
+
+    def test_vote_starts_the_sticky_window(self):
+        """A vote sets the sticky cookie for POLLS_REPLICA_STICKY_SECONDS."""
+        get_user_model().objects.create_user("John", "john@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        question = create_question(question_text='Past Question.', days=-1)
+        choice = question.choice_set.create(choice_text='First')
+        response = self.client.post(reverse('polls:vote', args=(question.id,)), {'choice': choice.id})
+        self.assertEqual(response.cookies[ReplicaMiddleware.sticky_cookie]['max-age'], 5)
+
+
+class CopyDatabaseTests(SimpleTestCase):
+    """Tests for the stand-in SQLite replicator."""
+
+    def test_copy_replaces_the_replica_contents(self):
+        """Each copy replaces the replica with what the primary holds at that time."""
+        with tempfile.TemporaryDirectory() as directory:
+            source, target = os.path.join(directory, 'primary.sqlite3'), os.path.join(directory, 'replica.sqlite3')
+            connection = sqlite3.connect(source)
+            connection.execute('CREATE TABLE ballot (id INTEGER PRIMARY KEY)')
+            connection.execute('INSERT INTO ballot VALUES (1), (2)')
+            connection.commit()
+            copy_database(source, target)
+            connection.execute('INSERT INTO ballot VALUES (3)')
+            connection.commit()
+            connection.close()
+            replica = sqlite3.connect(target)
+            self.assertEqual(replica.execute('SELECT COUNT(*) FROM ballot').fetchone()[0], 2)
+            copy_database(source, target)
+            self.assertEqual(replica.execute('SELECT COUNT(*) FROM ballot').fetchone()[0], 3)
+            replica.close()
@@ -0,0 +1,212 @@
+"""Test case for ResultsView."""
+import datetime
+from django.contrib.auth import get_user_model
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from polls import cache as results_cache
+from polls.buffer import VoteBuffer
+from polls.models import ChoiceShard, Question, ResultsSnapshot
+from polls.results import compute_results, get_results
+from polls.voting import cast_vote
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+def polls_queries(queries):
+    """Return the captured queries that touch the polls tables."""
+    return [query for query in queries if 'polls_' in query['sql']]
+
+
+class ResultsCacheTests(TestCase):
+    """Tests for the results cache."""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user("John", "john@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.choice = self.question.choice_set.create(choice_text='First')
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_second_hit_runs_no_polls_query(self):
+        """Results are served from the cache between votes, ETag included, without reaching the polls tables."""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'First')
+        self.assertEqual(polls_queries(queries), [])
+
+    def test_vote_invalidates_results(self):
+        """A vote makes the next hit render the new tally."""
+        self.client.get(self.url)
+        cast_vote(self.user, self.question, self.choice)
+        response = self.client.get(self.url)
+        self.assertContains(response, '">1</td>')
+
+    def test_choice_edit_invalidates_results(self):
+        """Editing a choice makes the next hit render the new text."""
+        self.client.get(self.url)
+        self.choice.choice_text = 'Renamed'
+        self.choice.save()
+        self.assertContains(self.client.get(self.url), 'Renamed')
+
+    def test_hit_and_miss_counters(self):
+        """Every lookup is counted as a hit or a miss."""
+        before = results_cache.stats()
+        self.client.get(self.url)
+        self.client.get(self.url)
+        after = results_cache.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_stats_is_staff_only(self):
+        """Only staff can read the counters."""
+        self.assertEqual(self.client.get(reverse('polls:stats')).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('polls:stats'))
+        self.assertIn('results_cache', response.json())
+
+
+class ResultsSnapshotTests(TestCase):
+    """Tests for the snapshots of ended questions."""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user("John", "john@gmail.com", "12345")
+        self.other = User.objects.create_user("Jane", "jane@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        cast_vote(self.user, self.question, self.first)
+        cast_vote(self.other, self.question, self.first)
+        self.question.end_date = timezone.now() - datetime.timedelta(days=1)
+        self.question.save()
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_first_read_freezes_results(self):
+        """The first read after the end stores the counts, percentages and page."""
+        response = self.client.get(self.url)
+        snapshot = ResultsSnapshot.objects.get(question=self.question)
+        self.assertEqual(snapshot.total, 2)
+        self.assertEqual([(row['choice_text'], row['tally'], row['percent']) for row in snapshot.tallies],
+                         [('First', 2, 100.0), ('Second', 0, 0.0)])
+        self.assertEqual(response.content.decode(), snapshot.html)
+
+    def test_snapshot_is_served_without_aggregating(self):
+        """Once frozen, a cache miss costs one query for the question and its snapshot."""
+        self.client.get(self.url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, '">2</td>')
+        self.assertEqual(len(polls_queries(queries)), 1)
+        self.assertIn('polls_resultssnapshot', polls_queries(queries)[0]['sql'])
+
+    def test_open_question_has_no_snapshot(self):
+        """Results of a question that can still be voted on are not frozen."""
+        self.question.end_date = None
+        self.question.save()
+        self.client.get(self.url)
+        self.assertFalse(ResultsSnapshot.objects.exists())
+
+    def test_edit_discards_snapshot(self):
+        """Editing a choice of an ended question freezes it again on the next read."""
+        self.client.get(self.url)
+        self.second.choice_text = 'Renamed'
+        self.second.save()
+        self.assertFalse(ResultsSnapshot.objects.exists())
+        self.assertContains(self.client.get(self.url), 'Renamed')
+
+    def test_late_buffered_ballot_refreshes_snapshot(self):
+        """A ballot cast before the end but flushed after it replaces the frozen results."""
+        self.client.get(self.url)
+        late = get_user_model().objects.create_user("Jack", "jack@gmail.com", "12345")
+        buffer = VoteBuffer()
+        buffer.enqueue(late.id, self.question.id, self.second.id)
+        buffer.flush()
+        self.assertFalse(ResultsSnapshot.objects.exists())
+        self.assertContains(self.client.get(self.url), '">1</td>')
+        self.assertEqual(ResultsSnapshot.objects.get().total, 3)
+
+    def test_backfill_command(self):
+        """The command freezes every ended question that has no snapshot."""
+        create_question(question_text='Open Question.', days=-1)
+        output = StringIO()
+        call_command('backfill_snapshots', stdout=output)
+        self.assertIn("Froze 1 question(s).", output.getvalue())
+        self.assertEqual(list(ResultsSnapshot.objects.values_list('question', flat=True)), [self.question.id])
+        call_command('backfill_snapshots', stdout=output)
+        self.assertIn("Froze 0 question(s).", output.getvalue())
+        call_command('backfill_snapshots', rebuild=True, stdout=output)
+        self.assertIn("Froze 1 question(s).", output.getvalue())
+
+
+class ResultsServiceTests(TestCase):
+    """Tests for the results service."""
+
+    def setUp(self):
+        """Create four users and a question with four votes over three choices, one of them in a shard."""
+        cache.clear()
+        User = get_user_model()
+        self.users = [User.objects.create_user(name, "%s@gmail.com" % name, "12345")
+                      for name in ("John", "Jane", "Jack", "Jill")]
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        self.third = self.question.choice_set.create(choice_text='Third')
+        cast_vote(self.users[0], self.question, self.second)
+        cast_vote(self.users[1], self.question, self.second)
+        cast_vote(self.users[2], self.question, self.first)
+        ChoiceShard.objects.create(choice=self.third, shard=0, votes=1)
+
+    def test_one_query(self):
+        """Counts, shares, ranks, the total and the participation come from one query."""
+        with self.assertNumQueries(1):
+            results = compute_results(self.question.id)
+        self.assertEqual(results['total'], 4)
+        self.assertEqual(results['registered'], 4)
+        self.assertEqual(results['participation'], 100.0)
+        self.assertEqual([(row['choice_text'], row['tally'], row['percent'], row['rank'])
+                          for row in results['choices']],
+                         [('First', 1, 25.0, 2), ('Second', 2, 50.0, 1), ('Third', 1, 25.0, 2)])
+
+    def test_participation_counts_active_users(self):
+        """Participation is the share of the active users who voted."""
+        get_user_model().objects.create_user("Joe", "joe@gmail.com", "12345", is_active=False)
+        get_user_model().objects.create_user("Jim", "jim@gmail.com", "12345")
+        self.assertEqual(compute_results(self.question.id)['participation'], 80.0)
+
+    def test_question_without_choices(self):
+        """A question without choices has no votes and no participation."""
+        question = create_question(question_text='Empty Question.', days=-1)
+        results = compute_results(question.id)
+        self.assertEqual((results['total'], results['participation'], results['choices']), (0, 0.0, []))
+
+    def test_results_are_cached_until_the_next_vote(self):
+        """Results come from the cache without a query until a vote moves the version."""
+        get_results(self.question.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_results(self.question.id)['total'], 4)
+        cast_vote(self.users[3], self.question, self.first)
+        self.assertEqual(get_results(self.question.id)['total'], 5)
+
+    def test_page_shows_shares_and_participation(self):
+        """The results page shows each choice's share and the participation."""
+        self.client.login(username="John", password="12345")
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, '<td id="percent-%d">50.0%%</td>' % self.second.id)
+        self.assertContains(response, '<span id="results-participation">100.0</span>')
@@ -0,0 +1,122 @@
+"""Test case for the full-text poll search."""
+import datetime
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Question
+from polls.search import match_expression, search
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+class SearchTests(TestCase):
+    """Tests for the search index and its queries."""
+
+    def setUp(self):
+        self.language = create_question(question_text='Best programming language?', days=-3)
+        self.python = self.language.choice_set.create(choice_text='Python')
+        self.language.choice_set.create(choice_text='Rust')
+        self.snake = create_question(question_text='Is a python a snake? Python python!', days=-2)
+        self.food = create_question(question_text='Favourite café food?', days=-1)
+
+    def titles(self, terms):
+        """Return the texts of the questions matching the search terms."""
+        return [question.question_text for question in search(Question.objects.all(), terms)]
+
+    def test_match_expression_quotes_words(self):
+        """User input is reduced to quoted prefix terms, so FTS5 syntax is never interpreted."""
+        self.assertEqual(match_expression('python "OR" rust*'), '"python"* "OR"* "rust"*')
+        self.assertIsNone(match_expression('*" -'))
+
+    def test_question_and_choice_text_are_searched(self):
+        """A word in a choice finds its question; a word in the question finds it too."""
+        self.assertEqual(self.titles('rust'), ['Best programming language?'])
+        self.assertEqual(self.titles('programming'), ['Best programming language?'])
+
+    def test_results_are_ranked(self):
+        """The question that mentions the term most comes first."""
+        self.assertEqual(self.titles('python'), ['Is a python a snake? Python python!', 'Best programming language?'])
+
+    def test_prefix_and_diacritics(self):
+        """Words match as prefixes and without their accents."""
+        self.assertEqual(self.titles('caf'), ['Favourite café food?'])
+        self.assertEqual(self.titles('cafe'), ['Favourite café food?'])
+
+    def test_every_word_must_match(self):
+        """Several words narrow the search."""
+        self.assertEqual(self.titles('python snake'), ['Is a python a snake? Python python!'])
+        self.assertEqual(self.titles('python food'), [])
+
+    def test_index_follows_edits(self):
+        """Renaming or removing a choice and deleting a question update the index."""
+        self.python.choice_text = 'Haskell'
+        self.python.save()
+        self.assertEqual(self.titles('haskell'), ['Best programming language?'])
+        self.python.delete()
+        self.assertEqual(self.titles('haskell'), [])
+        self.snake.delete()
+        self.assertEqual(self.titles('snake'), [])
+
+    def test_votes_do_not_touch_the_index(self):
+        """Counting votes leaves the index alone."""
+        Question.objects.filter(pk=self.language.pk).touch()
+        self.python.question.choice_set.update(votes=5)
+        self.assertEqual(self.titles('rust'), ['Best programming language?'])
+
+
+class IndexSearchTests(TestCase):
+    """Tests for ?q= on IndexView."""
+
+    def test_search_filter(self):
+        """Only matching published questions are listed."""
+        create_question(question_text='Best programming language?', days=-3)
+        create_question(question_text='Favourite food?', days=-2)
+        create_question(question_text='Future language?', days=5)
+        response = self.client.get(reverse('polls:index') + '?q=language')
+        self.assertQuerysetEqual(response.context['latest_question_list'],
+                                 ['<Question: Best programming language?>'])
+        self.assertContains(response, 'value="language"')
+
+    def test_search_without_words(self):
+        """A search with nothing to look for lists nothing."""
+        create_question(question_text='Favourite food?', days=-2)
+        response = self.client.get(reverse('polls:index') + '?q=%22')
+        self.assertContains(response, "No polls are available.")
+
+    @override_settings(POLLS_INDEX_PAGE_SIZE=2)
+    def test_search_pages(self):
+        """Search results are paginated by page number, every match listed once."""
+        for i in range(5):
+            create_question(question_text='Poll %d about cats' % i, days=-i - 1)
+        seen, page = [], 1
+        while page:
+            response = self.client.get(reverse('polls:index'), {'q': 'cats', 'page': page})
+            seen += [question.question_text for question in response.context['latest_question_list']]
+            page = response.context['next_page']
+        self.assertEqual(sorted(seen), ['Poll %d about cats' % i for i in range(5)])
+
+    def test_page_too_large_shows_first_page(self):
+        """A page number whose offset does not fit in the database falls back to the first page."""
+        create_question(question_text='Poll about cats', days=-1)
+        response = self.client.get(reverse('polls:index'), {'q': 'cats', 'page': '99999999999999999999999'})
+        self.assertEqual([question.question_text for question in response.context['latest_question_list']],
+                         ['Poll about cats'])
+
+
+class AdminSearchTests(TestCase):
+    """Tests for the search box of QuestionAdmin."""
+
+    def test_admin_search_uses_index(self):
+        """The admin search finds questions by their choices."""
+        get_user_model().objects.create_superuser("admin", "admin@gmail.com", "12345")
+        self.client.login(username="admin", password="12345")
+        question = create_question(question_text='Best programming language?', days=-3)
+        question.choice_set.create(choice_text='Python')
+        create_question(question_text='Favourite food?', days=-2)
+        response = self.client.get(reverse('admin:polls_question_changelist') + '?q=pyth')
+        self.assertEqual(list(response.context['cl'].result_list), [question])
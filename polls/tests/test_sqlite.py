@@ -0,0 +1,35 @@
+"""Test case for the SQLite connection setup."""
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from polls.sqlite import apply_pragmas
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    """Tests for apply_pragmas."""
+
+    databases = {'default'}
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': -4000})
+    def test_pragmas_are_applied(self):
+        """The configured pragmas are set on the connection."""
+        apply_pragmas(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -4000)
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': -4000})
+    def test_pragmas_are_not_counted_as_queries(self):
+        """The pragmas bypass the query wrappers, so they do not count against the view budgets."""
+        connection.ensure_connection()
+        with CaptureQueriesContext(connection) as queries:
+            apply_pragmas(sender=None, connection=connection)
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout; DROP TABLE polls_vote': 1})
+    def test_invalid_pragma_is_rejected(self):
+        """Pragma names that are not identifiers are refused."""
+        with self.assertRaises(ValueError):
+            apply_pragmas(sender=None, connection=connection)
@@ -0,0 +1,109 @@
+"""Test case for the polls_export and polls_import commands."""
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+from polls.models import Question, Choice, Vote
+from polls.voting import cast_vote
+
+
+def create_question(question_text, days):
+    """Create a question to be use in test."""
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(question_text=question_text, pub_date=time)
+
+
+class ExportImportTests(TestCase):
+    """Tests for exporting the polls to NDJSON and importing them back."""
+
+    def setUp(self):
+        """Create a question with two choices and one vote for each."""
+        User = get_user_model()
+        self.alice = User.objects.create_user("Alice", "alice@gmail.com", "12345")
+        self.bob = User.objects.create_user("Bob", "bob@gmail.com", "12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        cast_vote(self.alice, self.question, self.first)
+        cast_vote(self.bob, self.question, self.second)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'polls.ndjson')
+
+    def tearDown(self):
+        """Remove the export file."""
+        self.directory.cleanup()
+
+    def export(self):
+        """Export the polls to the test file and return its records."""
+        call_command('polls_export', output=self.path, chunk_size=1, stderr=StringIO())
+        with open(self.path) as source:
+            return [json.loads(line) for line in source]
+
+    def test_export_writes_one_record_per_line(self):
+        """Questions, then choices with their tallies, then votes with usernames, one per line."""
+        records = self.export()
+        self.assertEqual([record['model'] for record in records],
+                         ['question', 'choice', 'choice', 'vote', 'vote'])
+        self.assertEqual(records[1], {'model': 'choice', 'id': self.first.id, 'question': self.question.id,
+                                      'choice_text': 'First', 'votes': 1})
+        self.assertIn({'model': 'vote', 'question': self.question.id, 'choice': self.second.id, 'user': 'Bob'},
+                      records)
+
+    def test_import_remaps_ids(self):
+        """Imported rows get new ids and keep their links to each other."""
+        self.export()
+        call_command('polls_import', self.path, batch_size=1, stdout=StringIO())
+        copy = Question.objects.exclude(pk=self.question.pk).get()
+        self.assertEqual(copy.question_text, 'Past Question.')
+        self.assertEqual(copy.pub_date, self.question.pub_date)
+        choices = list(copy.choice_set.order_by('pk').values_list('choice_text', 'votes'))
+        self.assertEqual(choices, [('First', 1), ('Second', 1)])
+        ballots = Vote.objects.filter(question=copy).values_list('user__username', 'selected_choice__choice_text')
+        self.assertEqual(sorted(ballots), [('Alice', 'First'), ('Bob', 'Second')])
+
+    def test_import_skips_unknown_voters(self):
+        """Votes of users missing from the database are skipped and left out of the tallies."""
+        self.export()
+        Question.objects.all().delete()
+        get_user_model().objects.filter(username='Bob').delete()
+        output = StringIO()
+        call_command('polls_import', self.path, stdout=output)
+        self.assertIn("Imported 1 question(s), 2 choice(s), 1 vote(s); skipped 1 vote(s); recounted 1 choice(s).",
+                      output.getvalue())
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertEqual(list(Choice.objects.order_by('pk').values_list('choice_text', 'votes')),
+                         [('First', 1), ('Second', 0)])
+
+    def test_import_counts_duplicate_ballots_once(self):
+        """A second ballot of the same user on a question is skipped and counted once in the tally."""
+        records = self.export()
+        Question.objects.all().delete()
+        with open(self.path, 'a') as output:
+            output.write(json.dumps(records[-1]) + '\n')
+        output = StringIO()
+        call_command('polls_import', self.path, stdout=output)
+        self.assertIn("2 vote(s); skipped 1 vote(s)", output.getvalue())
+        self.assertEqual(list(Choice.objects.order_by('pk').values_list('votes', flat=True)), [1, 1])
+
+    def test_import_can_create_voters(self):
+        """With create_users, missing voters are created without a usable password."""
+        self.export()
+        Question.objects.all().delete()
+        get_user_model().objects.filter(username='Bob').delete()
+        call_command('polls_import', self.path, create_users=True, stdout=StringIO())
+        bob = get_user_model().objects.get(username='Bob')
+        self.assertFalse(bob.has_usable_password())
+        self.assertEqual(Vote.objects.get(user=bob).selected_choice.choice_text, 'Second')
+
+    def test_import_rejects_foreign_lines(self):
+        """A line that is not a polls_export record stops the import."""
+        with open(self.path, 'w') as output:
+            output.write('not json\n')
+        with self.assertRaises(CommandError):
+            call_command('polls_import', self.path, stdout=StringIO())
@@ -1,16 +1,26 @@
 """Test case for DetailView."""
 import datetime
+import json
 import os
 import itertools
+import tempfile
+from unittest import mock
 from django.contrib.auth.models import User
 from django.http import HttpRequest
 from django.conf import settings
 from importlib import import_module
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
 from django.urls import reverse
-from polls.models import Question, Choice
+from io import StringIO
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from polls.models import Question, Choice, ChoiceShard, Vote
+from polls.buffer import VoteBuffer
+from polls.voting import cast_vote
 
 
 def create_question(question_text, days):
@@ -38,3 +48,344 @@ class VotingTests(TestCase):
         question = create_question(question_text='Past Question.', days=-5)
         response = self.client.get(reverse('polls:vote', args=(question.id,)))
         self.assertEqual(response.status_code, 200)
+
+
+class VoteEngineTests(TestCase):
+    """Tests for the atomic vote engine and the reconcile command."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user("John", "john@gmail.com", "12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+
+    def test_vote_increments_selected_choice(self):
+        """A new ballot adds one vote to the selected choice."""
+        cast_vote(self.user, self.question, self.first)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+
+    def test_change_vote_moves_the_tally(self):
+        """Changing a ballot takes the vote away from the old choice."""
+        cast_vote(self.user, self.question, self.first)
+        cast_vote(self.user, self.question, self.second)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.votes, self.second.votes), (0, 1))
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_same_vote_twice_counts_once(self):
+        """Voting again for the same choice leaves the tally unchanged."""
+        cast_vote(self.user, self.question, self.first)
+        cast_vote(self.user, self.question, self.first)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+
+    def test_vote_query_count_does_not_grow_with_choices(self):
+        """The number of queries for a ballot does not depend on the number of choices."""
+        cast_vote(self.user, self.question, self.first)
+        for i in range(20):
+            self.question.choice_set.create(choice_text='Extra %d' % i)
+        with self.assertNumQueries(6):
+            cast_vote(self.user, self.question, self.second)
+
+    def test_vote_view(self):
+        """Posting a choice records the vote and redirects to the results page."""
+        self.client.login(username="John", password="12345")
+        response = self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.first.id})
+        self.assertRedirects(response, reverse('polls:results', args=(self.question.id,)))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+
+    def test_last_vote_shown_on_detail(self):
+        """The detail page shows the user's last vote for that question."""
+        cast_vote(self.user, self.question, self.second)
+        self.client.login(username="John", password="12345")
+        response = self.client.get(reverse('polls:detail', args=(self.question.id,)))
+        self.assertContains(response, "Your last vote is Second")
+
+    def test_login_does_not_write_questions(self):
+        """Logging in does not touch the questions table."""
+        for i in range(10):
+            create_question(question_text='Question %d.' % i, days=-1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.login(username="John", password="12345")
+        self.assertFalse([query for query in queries if 'polls_question' in query['sql']])
+
+    def test_duplicate_ballot_is_rejected(self):
+        """The database refuses a second ballot by the same user on the same question."""
+        Vote.objects.create(user=self.user, question=self.question, selected_choice=self.first)
+        with self.assertRaises(IntegrityError):
+            Vote.objects.create(user=self.user, question=self.question, selected_choice=self.second)
+
+    def test_reconcile_votes(self):
+        """reconcile_votes rebuilds Choice.votes from the Vote rows."""
+        cast_vote(self.user, self.question, self.first)
+        Choice.objects.filter(pk=self.first.pk).update(votes=7)
+        Choice.objects.filter(pk=self.second.pk).update(votes=3)
+        call_command('reconcile_votes', stdout=StringIO())
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.votes, self.second.votes), (1, 0))
+
+
+class VoteBufferTests(TestCase):
+    """Tests for the write-behind vote buffer."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.john = User.objects.create_user("John", "john@gmail.com", "12345")
+        self.jane = User.objects.create_user("Jane", "jane@gmail.com", "12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+
+    def assertTally(self, first, second):
+        """Check the stored tallies of both choices."""
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.votes, self.second.votes), (first, second))
+
+    def test_flush_applies_last_ballot_per_user(self):
+        """Only the latest queued ballot of a user counts."""
+        buffer = VoteBuffer()
+        buffer.enqueue(self.john.id, self.question.id, self.first.id)
+        buffer.enqueue(self.jane.id, self.question.id, self.first.id)
+        buffer.enqueue(self.john.id, self.question.id, self.second.id)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertTally(1, 1)
+        self.assertEqual(Vote.objects.count(), 2)
+
+    def test_flush_moves_existing_ballots(self):
+        """A buffered ballot replaces the user's stored ballot."""
+        cast_vote(self.john, self.question, self.first)
+        buffer = VoteBuffer()
+        buffer.enqueue(self.john.id, self.question.id, self.second.id)
+        buffer.flush()
+        self.assertTally(0, 1)
+
+    def test_journal_is_replayed(self):
+        """Ballots journaled by a buffer that never flushed are applied by the next one."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'journal.ndjson')
+            VoteBuffer(durability='file', path=path).enqueue(self.john.id, self.question.id, self.first.id)
+            buffer = VoteBuffer(durability='file', path=path)
+            buffer.drain()
+        self.assertTally(1, 0)
+
+    @override_settings(POLLS_VOTE_BUFFER={'ENABLED': True})
+    def test_vote_view_enqueues(self):
+        """In buffered mode the vote view queues the ballot instead of writing it."""
+        buffer = VoteBuffer()
+        self.client.login(username="John", password="12345")
+        with mock.patch('polls.buffer._buffer', buffer):
+            self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.first.id})
+        self.assertEqual(Vote.objects.count(), 0)
+        buffer.flush()
+        self.assertTally(1, 0)
+
+
+class VoteBufferFailureTests(TransactionTestCase):
+    """Tests for the vote buffer when the database refuses a flush; SQLite only checks foreign keys on commit."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.john = User.objects.create_user("John", "john@gmail.com", "12345")
+        self.jane = User.objects.create_user("Jane", "jane@gmail.com", "12345")
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+
+    def test_ballot_for_a_deleted_choice_is_dropped(self):
+        """The valid ballots of a failed batch are stored and the refused one is not queued again."""
+        with tempfile.TemporaryDirectory() as directory:
+            buffer = VoteBuffer(durability='file', path=os.path.join(directory, 'journal.ndjson'))
+            buffer.enqueue(self.john.id, self.question.id, self.first.id)
+            buffer.enqueue(self.jane.id, self.question.id, self.second.id)
+            self.second.delete()
+            with self.assertLogs('polls', level='ERROR') as logs:
+                self.assertEqual(buffer.flush(), 1)
+            buffer.drain()
+            self.assertEqual(os.listdir(directory), [os.path.basename(buffer.path)])
+            with open(buffer.path) as journal:
+                self.assertEqual(journal.read(), '')
+        self.assertEqual(buffer.pending, {})
+        self.assertIn("Dropped the buffered ballot of user %d" % self.jane.id, logs.output[-1])
+        self.assertEqual(list(Vote.objects.values_list('user', 'selected_choice')), [(self.john.id, self.first.id)])
+
+    def test_other_errors_requeue_the_rest(self):
+        """A ballot that fails for another reason is kept, with the ones after it, for the next flush."""
+        buffer = VoteBuffer()
+        buffer.enqueue(self.john.id, self.question.id, self.first.id)
+        buffer.enqueue(self.jane.id, self.question.id, self.second.id)
+        with mock.patch('polls.buffer.apply_ballots', side_effect=RuntimeError), self.assertLogs('polls'):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertEqual(len(buffer.pending), 2)
+        self.assertEqual(buffer.flush(), 2)
+
+    def test_journal_of_a_running_process_is_left_alone(self):
+        """Each process journals to its own file and only replays those of the processes that are gone."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'journal.ndjson')
+            for pid, user in ((1, self.john), (2, self.jane)):
+                with open('%s.%d' % (path, pid), 'w') as journal:
+                    journal.write(json.dumps([user.id, self.question.id, self.first.id]) + '\n')
+            with mock.patch('polls.buffer._running', side_effect=lambda pid: pid == 1):
+                buffer = VoteBuffer(durability='file', path=path)
+            self.assertEqual(buffer.path, '%s.%d' % (path, os.getpid()))
+            self.assertEqual(buffer.pending, {(self.jane.id, self.question.id): self.first.id})
+            self.assertTrue(os.path.exists(path + '.1'))
+            buffer.drain()
+
+
+@override_settings(POLLS_VOTE_SHARDS=4)
+class ShardedCounterTests(TestCase):
+    """Tests for the sharded vote counters."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.users = [User.objects.create_user("User%d" % i, "user%d@gmail.com" % i, "12345") for i in range(6)]
+        self.question = create_question(question_text='Past Question.', days=-5)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+
+    def tallies(self):
+        """Return the tally of both choices."""
+        return list(self.question.choice_set.with_tally().order_by('pk').values_list('tally', flat=True))
+
+    def test_votes_go_to_shards(self):
+        """Ballots land in the shard rows and are counted by with_tally()."""
+        for user in self.users:
+            cast_vote(user, self.question, self.first)
+        cast_vote(self.users[0], self.question, self.second)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 0)
+        self.assertEqual(ChoiceShard.objects.filter(choice=self.first).count(), 4)
+        self.assertEqual(self.tallies(), [5, 1])
+
+    def test_results_page_sums_shards(self):
+        """The results page shows the folded votes plus the shards."""
+        Choice.objects.filter(pk=self.first.pk).update(votes=2)
+        cast_vote(self.users[0], self.question, self.first)
+        self.client.login(username="User0", password="12345")
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, '">3</td>')
+
+    def test_fold_vote_shards(self):
+        """fold_vote_shards moves the shard counts into Choice.votes."""
+        for user in self.users:
+            cast_vote(user, self.question, self.first)
+        call_command('fold_vote_shards', stdout=StringIO())
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 6)
+        self.assertFalse(ChoiceShard.objects.exclude(votes=0).exists())
+        self.assertEqual(self.tallies(), [6, 0])
+
+    def test_reconcile_resets_shards(self):
+        """reconcile_votes rebuilds Choice.votes and clears the shards."""
+        for user in self.users[:3]:
+            cast_vote(user, self.question, self.second)
+        call_command('reconcile_votes', stdout=StringIO())
+        self.assertEqual(self.tallies(), [0, 3])
+        self.assertFalse(ChoiceShard.objects.exclude(votes=0).exists())
+
+
+class BatchVoteTests(TestCase):
+    """Tests for voting on many questions in one request."""
+
+    def setUp(self):
+        """Log in and create three open questions with two choices each."""
+        cache.clear()
+        self.user = get_user_model().objects.create_user("John", "john@gmail.com", "12345")
+        self.client.login(username="John", password="12345")
+        self.questions = [create_question(question_text='Question %d.' % i, days=-1) for i in range(3)]
+        self.choices = [[question.choice_set.create(choice_text='%s %d' % (question.question_text, n))
+                         for n in range(2)] for question in self.questions]
+        self.url = reverse('polls:vote_batch')
+
+    def tearDown(self):
+        """Leave no empty rate limit bucket behind for the next test."""
+        cache.clear()
+
+    def submit(self, ballots):
+        """Send a batch of ballots as JSON."""
+        return self.client.post(self.url, json.dumps(ballots), content_type='application/json')
+
+    def tallies(self):
+        """Return the tallies of every question, choice by choice."""
+        return [[choice.votes for choice in Choice.objects.filter(question=question).order_by('pk')]
+                for question in self.questions]
+
+    def test_every_ballot_is_counted(self):
+        """Every ballot of the batch is recorded and counted."""
+        response = self.submit({question.id: choices[1].id for question, choices in zip(self.questions, self.choices)})
+        self.assertEqual(set(response.json()['results'].values()), {'voted'})
+        self.assertEqual(self.tallies(), [[0, 1], [0, 1], [0, 1]])
+        self.assertEqual(Vote.objects.filter(user=self.user).count(), 3)
+
+    def test_changed_and_unchanged_ballots(self):
+        """A ballot for the current choice is unchanged; a new choice moves the vote."""
+        cast_vote(self.user, self.questions[0], self.choices[0][0])
+        cast_vote(self.user, self.questions[1], self.choices[1][0])
+        response = self.submit({self.questions[0].id: self.choices[0][0].id,
+                                self.questions[1].id: self.choices[1][1].id})
+        self.assertEqual(response.json()['results'], {str(self.questions[0].id): 'unchanged',
+                                                      str(self.questions[1].id): 'voted'})
+        self.assertEqual(self.tallies(), [[1, 0], [0, 1], [0, 0]])
+
+    def test_rejected_ballots(self):
+        """Ended, missing and mismatched ballots are reported and leave the tallies alone."""
+        self.questions[1].end_date = timezone.now() - datetime.timedelta(hours=1)
+        self.questions[1].save()
+        missing = self.questions[-1].id + 1
+        response = self.submit({self.questions[0].id: self.choices[0][0].id,
+                                self.questions[1].id: self.choices[1][0].id,
+                                self.questions[2].id: self.choices[0][1].id,
+                                missing: self.choices[0][0].id})
+        self.assertEqual(response.json()['results'], {str(self.questions[0].id): 'voted',
+                                                      str(self.questions[1].id): 'ended',
+                                                      str(self.questions[2].id): 'invalid_choice',
+                                                      str(missing): 'not_found'})
+        self.assertEqual(self.tallies(), [[1, 0], [0, 0], [0, 0]])
+
+    def test_query_count_does_not_grow_with_ballots(self):
+        """A batch runs as many queries for ten ballots as for one."""
+        more = [create_question(question_text='More %d.' % i, days=-1) for i in range(10)]
+        ballots = {question.id: question.choice_set.create(choice_text='Yes').id for question in more}
+        with CaptureQueriesContext(connection) as few:
+            self.submit({self.questions[0].id: self.choices[0][0].id})
+        with CaptureQueriesContext(connection) as many:
+            self.submit(ballots)
+        self.assertEqual(len(many), len(few))
+
+    @override_settings(POLLS_RATE_LIMITS={})
+    def test_malformed_body(self):
+        """Bodies that are not a map of integer ids, such as true, 1.9 or too large ids, are a 400."""
+        self.assertEqual(self.submit(['not', 'a', 'map']).status_code, 400)
+        self.assertEqual(self.submit({'one': 'two'}).status_code, 400)
+        question_id = self.questions[0].id
+        for choice_id in (True, 1.9, '1.9', ' 1', None, 2 ** 70, str(2 ** 70)):
+            with self.subTest(choice_id=choice_id):
+                response = self.submit({question_id: choice_id})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['error'], "Send a JSON object mapping question ids to choice ids.")
+        self.assertEqual(self.submit({str(2 ** 70): self.choices[0][0].id}).status_code, 400)
+        self.assertEqual(self.submit({question_id: str(self.choices[0][0].id)}).status_code, 200)
+        self.assertEqual(Vote.objects.count(), 1)
+
+    @override_settings(POLLS_VOTE_BATCH_MAX=2)
+    def test_too_many_ballots(self):
+        """A batch over POLLS_VOTE_BATCH_MAX is refused without recording any vote."""
+        response = self.submit({question.id: choices[0].id for question, choices in zip(self.questions, self.choices)})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_buffered_ballots_are_queued(self):
+        """With the vote buffer on, valid ballots are queued instead of written."""
+        with mock.patch('polls.views.get_buffer') as get_buffer:
+            response = self.submit({self.questions[0].id: self.choices[0][1].id})
+        self.assertEqual(response.json()['results'], {str(self.questions[0].id): 'queued'})
+        get_buffer.return_value.enqueue.assert_called_once_with(self.user.id, self.questions[0].id,
+                                                                self.choices[0][1].id)
@@ -0,0 +1,46 @@
+"""Test case for the template warmup."""
+import copy
+from unittest import mock
+from django.conf import settings
+from django.template import engines
+from django.test import TestCase, override_settings
+from polls.warmup import template_names, warm_templates
+
+
+def cached_templates():
+    """Return the TEMPLATES setting with the loaders wrapped in the cached loader, whatever DEBUG is."""
+    templates = copy.deepcopy(settings.TEMPLATES)
+    options = templates[0]['OPTIONS']
+    if not isinstance(options['loaders'][0], tuple):
+        options['loaders'] = [('django.template.loaders.cached.Loader', options['loaders'])]
+    return templates
+
+
+class TemplateWarmupTests(TestCase):
+    """Tests for the template warmup."""
+
+    def test_polls_and_project_templates_are_listed(self):
+        """The project and polls template directories are both walked."""
+        engine = engines['django'].engine
+        names = template_names(engine.dirs[0])
+        self.assertIn('registration/login.html', names)
+        self.assertIn('admin/base_site.html', names)
+
+    def test_warmup_needs_the_cached_loader(self):
+        """Without the cached loader nothing is compiled, as it would not be kept."""
+        templates = copy.deepcopy(settings.TEMPLATES)
+        templates[0]['OPTIONS']['loaders'] = ['django.template.loaders.filesystem.Loader',
+                                              'django.template.loaders.app_directories.Loader']
+        with override_settings(TEMPLATES=templates), mock.patch('polls.warmup.template_names') as names:
+            self.assertEqual(warm_templates(), 0)
+        names.assert_not_called()
+
+    @override_settings(TEMPLATES=cached_templates())
+    def test_warmup_fills_the_cached_loader(self):
+        """After the warmup the polls templates come from the cached loader."""
+        engine = engines['django'].engine
+        loader = engine.template_loaders[0]
+        loader.reset()
+        self.assertGreaterEqual(warm_templates(), 6)
+        self.assertTrue({'polls/index.html', 'polls/detail.html', 'polls/results.html'} <= set(
+            key.split('-')[0] for key in loader.get_template_cache))
@@ -1,11 +1,28 @@
 """URLs for index page, detail page, and result page."""
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
 
 app_name = 'polls'
-urlpatterns = [
+shared_urlpatterns = [
+    path('api/polls/', api.poll_list, name='api_polls'),
+    path('api/polls/<int:pk>/', api.poll_detail, name='api_poll'),
+    path('api/polls/<int:pk>/results/', api.poll_results, name='api_results'),
+    path('vote/', views.vote_batch, name='vote_batch'),
+]
+sync_urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
     path('<int:pk>/', views.DetailView.as_view(), name="detail"),
     path('<int:pk>/results/', views.ResultsView.as_view(), name="results"),
+    path('<int:pk>/results/stream/', views.results_stream, name="results_stream"),
     path('<int:question_id>/vote/', views.vote, name="vote"),
+    path('stats/', views.stats, name="stats"),
+]
+async_urlpatterns = [
+    path('', async_views.index, name='index'),
+    path('<int:pk>/', views.DetailView.as_view(), name="detail"),
+    path('<int:pk>/results/', async_views.results, name="results"),
+    path('<int:question_id>/vote/', async_views.vote, name="vote"),
+    path('stats/', views.stats, name="stats"),
 ]
+urlpatterns = (async_urlpatterns if settings.POLLS_ASYNC_VIEWS else sync_urlpatterns) + shared_urlpatterns
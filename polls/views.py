@@ -1,75 +1,37 @@
 """Views for index page, detail page, and result page."""
-from datetime import datetime
+import json
+import re
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseRedirect
-from .models import Question, Choice, Vote
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from . import audit, cache as results_cache
+from .buffer import get_buffer
+from .conditional import index_etag, index_last_modified, results_etag, results_version
+from .instrumentation import view_stats
+from .live import hub
+from .models import Question, Choice
+from .pagination import MAX_INT, keyset_page, offset_page
+from .ratelimit import rate_limit, stats as rate_limit_stats, take, too_many_requests
+from .results import get_results
+from .routers import primary
+from .search import search
+from .snapshots import get_snapshot
+from .voting import attach_last_votes, cast_ballots, cast_vote, check_ballots
+from django.conf import settings
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views import generic
+from django.views.decorators.http import condition, require_POST
 from django.utils import timezone
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
-from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
-from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.contrib.auth.mixins import LoginRequiredMixin
-import logging
-
-log = logging.getLogger("polls")
-logging.basicConfig(level=logging.INFO)
-
-
-def get_client_ip(request):
-    """Get the client's ip address."""
-
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[-1].strip()
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
-
-
-@receiver(user_logged_in)
-def update_choice_login(request, **kwargs):
-    """Update your last vote when login."""
-    for question in Question.objects.all():
-        try:
-            question.last_vote = str(request.user.vote_set.get(question=question).selected_choice)
-            question.save()
-        except(Vote.DoesNotExist):
-            question.last_vote = None
-
-
-@receiver(user_logged_in)
-def log_user_logged_in(sender, request, user, **kwargs):
-    """Log when user login."""
-
-    ip = get_client_ip(request)
-    date = datetime.now()
-    log.info('Login user: %s , IP: %s , Date: %s', user, ip, str(date))
-
-
-@receiver(user_logged_out)
-def log_user_logged_out(sender, request, user, **kwargs):
-    """Log when user logout."""
-
-    ip = get_client_ip(request)
-    date = datetime.now()
-    log.info('Logout user: %s , IP: %s , Date: %s', user, ip, str(date))
-
-
-@receiver(user_login_failed)
-def log_user_login_failed(sender, request, credentials, **kwargs):
-    """Log when user fail to login."""
-
-    ip = get_client_ip(request)
-    date = datetime.now()
-    log.warning('Login user(failed): %s , IP: %s , Date: %s', credentials['username'], ip, str(date))
-
 
+@method_decorator(condition(etag_func=index_etag, last_modified_func=index_last_modified), name='get')
 class IndexView(generic.ListView):
-    """View for detail page."""
+    """View for index page, paginated with a cursor on (pub_date, id) and answering conditional GETs."""
 
     template_name = 'polls/index.html'
     context_object_name = 'latest_question_list'
@@ -78,9 +40,44 @@ class IndexView(generic.ListView):
         """
         Get the queryset of question.
 
-        :return question's queryset.
+        Pass ``?status=open`` to list only the questions that can still be voted on,
+        and ``?q=`` to search the questions and their choices.
+
+        :return question's queryset, annotated with whether each question is open for voting,
+                newest first or best match first when searching.
+        """
+        now = timezone.now()
+        questions = Question.objects.filter(pub_date__lte=now).with_status(now)
+        if self.request.GET.get('status') == 'open':
+            questions = questions.open(now)
+        terms = self.request.GET.get('q', '').strip()
+        if terms:
+            return search(questions, terms)
+        return questions.order_by('-pub_date', '-pk')
+
+    def get_context_data(self, **kwargs):
+        """
+        Cut the page of questions.
+
+        Pages are cut after the cursor, or at the page number for search results.
+
+        :param **kwargs is the keyword argument.
+        :return context of the index page.
         """
-        return Question.objects.filter(pub_date__lte=timezone.now()).order_by('-pub_date')
+        terms = self.request.GET.get('q', '').strip()
+        next_cursor = next_page = None
+        if terms:
+            questions, next_page = offset_page(self.object_list, self.request.GET.get('page'),
+                                               settings.POLLS_INDEX_PAGE_SIZE)
+        else:
+            questions, next_cursor = keyset_page(self.object_list, self.request.GET.get('cursor'),
+                                                 settings.POLLS_INDEX_PAGE_SIZE)
+        context = super().get_context_data(object_list=questions, **kwargs)
+        context['next_cursor'] = next_cursor
+        context['next_page'] = next_page
+        context['q'] = terms
+        context['status'] = self.request.GET.get('status', 'all')
+        return context
 
 
 class DetailView(LoginRequiredMixin,generic.DetailView):
@@ -100,42 +97,126 @@ class DetailView(LoginRequiredMixin,generic.DetailView):
                 redirect to the question page otherwise.
         """
         try:
-            question = Question.objects.get(pk=kwargs['pk'])
-            if not question.can_vote():
-                error = "You can't vote on this poll because this poll is already ended."
-                return HttpResponseRedirect(reverse('polls:index'), messages.error(request, error))
+            question = self.get_queryset().get(pk=kwargs['pk'])
         except ObjectDoesNotExist:
             error = "Poll does not exist."
             return HttpResponseRedirect(reverse('polls:index'), messages.error(request, error))
-        self.object = self.get_object()
-        context = self.get_context_data(object=self.get_object())
-        template_name = 'polls/detail.html'
-        return render(request, context=context, template_name=template_name)
+        if not question.can_vote():
+            error = "You can't vote on this poll because this poll is already ended."
+            return HttpResponseRedirect(reverse('polls:index'), messages.error(request, error))
+        self.object = question
+        attach_last_votes(request.user, [question])
+        context = self.get_context_data(object=question)
+        return self.render_to_response(context)
 
     def get_queryset(self):
         """
         Get the queryset of question.
 
+        Publication and end dates are checked by can_vote() in get(). The choices
+        are only loaded when the cached choice list fragment misses.
+
         :return question's queryset.
         """
-        return Question.objects.filter(pub_date__lte=timezone.now()).order_by('-pub_date')
+        return Question.objects.all()
 
 
 class ResultsView(LoginRequiredMixin,generic.DetailView):
-    """View for result page."""
+    """View for result page, served from the results cache between votes and from a snapshot once ended."""
 
     model = Question
     template_name = 'polls/results.html'
 
+    @method_decorator(condition(etag_func=results_etag))
+    def get(self, request, *args, **kwargs):
+        """
+        Return the cached results page, or the snapshot of an ended question, rendering it otherwise.
+
+        :param request is the HttpRequest object.
+        :param *args is the argument.
+        :param **kwargs is the keyword argument.
+        :return the results page.
+        """
+        version = self.results_version = results_version(request, kwargs['pk'])
+        content = results_cache.get_results(kwargs['pk'], version)
+        if content is not None:
+            return HttpResponse(content)
+        # Read the primary on a miss, so a lagging replica never fills the cache for the new version.
+        with primary():
+            self.object = self.get_object()
+            snapshot = get_snapshot(self.object)
+            if snapshot is not None:
+                response = HttpResponse(snapshot.html)
+            else:
+                response = self.render_to_response(self.get_context_data(object=self.object))
+                response.render()
+        results_cache.set_results(kwargs['pk'], version, response.content)
+        return response
+
+    def get_queryset(self):
+        """
+        Get the queryset of question with its snapshot, if any, joined in.
+
+        :return question's queryset.
+        """
+        return Question.objects.select_related('snapshot')
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the results: every choice's tally, share and rank, the total and the participation.
+
+        :param **kwargs is the keyword argument.
+        :return context of the results page.
+        """
+        context = super().get_context_data(**kwargs)
+        context['results'] = get_results(self.object.id, getattr(self, 'results_version', None))
+        context['choices'] = context['results']['choices']
+        return context
+
+
+@login_required()
+def results_stream(request, pk):
+    """
+    Stream the tally of a question as Server-Sent Events.
+
+    The response blocks its worker thread until the client disconnects, so it is
+    only routed with the sync views; see polls.live.
+
+    :param request is the HttpRequest object.
+    :param pk is the id of the question.
+    :return an event stream that pushes the tally whenever votes land.
+    """
+    get_object_or_404(Question, pk=pk)
+    subscription = hub.subscribe(pk)
+    response = StreamingHttpResponse(subscription.stream(hub), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@staff_member_required
+def stats(request):
+    """
+    Report the runtime counters of the polls app.
+
+    :param request is the HttpRequest object.
+    :return JSON with the results cache hit/miss counters, the per-view query and time histograms
+            and the requests refused by the rate limits.
+    """
+    return JsonResponse({'results_cache': results_cache.stats(), 'views': view_stats.snapshot(),
+                         'rate_limit_rejections': rate_limit_stats()})
+
 
 @login_required()
+@rate_limit('vote')
 def vote(request, question_id):
     """
     Submit the vote for the poll.
 
     :param request is the HttpRequest object.
     :param question_id is the id of the question.
-    :return redirect to index page if question can't be voted,
+    :return 429 if the user or the ip is over the vote rate limit,
+            redirect to index page if question can't be voted,
             redirect to the same page with an error message if the choice is not selected,
             redirect to the results page otherwise.
     """
@@ -152,17 +233,70 @@ def vote(request, question_id):
             'error_message': "You didn't select a choice.",
         })
     else:
-        Vote.objects.update_or_create(user=user, question=question, defaults={'selected_choice': selected_choice})
-        for choice in question.choice_set.all():
-            choice.votes = Vote.objects.filter(question=question).filter(selected_choice=choice).count()
-            choice.save()
-        for question in Question.objects.all():
-            try:
-                question.last_vote = str(request.user.vote_set.get(question=question).selected_choice)
-                question.save()
-            except(Vote.DoesNotExist):
-                question.last_vote = None
-        date = datetime.now()
-        log = logging.getLogger("polls")
-        log.info("User: %s, Poll's ID: %d, Date: %s.", user, question_id, str(date))
+        buffer = get_buffer()
+        if buffer is not None:
+            buffer.enqueue(user.id, question.id, selected_choice.id)
+        else:
+            cast_vote(user, question, selected_choice)
+        audit.record('vote', request, user, question=question.id, choice=selected_choice.id)
         return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
+
+
+def ballot_id(value):
+    """
+    Read a question or choice id from a batch ballot.
+
+    :param value is a JSON integer or a string of digits, such as an object key.
+    :return the id as an int.
+    :raise ValueError if the value is of another type, such as true or 1.9, or out of the 64-bit range.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("Not an id: %r" % (value,))
+    if isinstance(value, str) and not re.fullmatch(r'-?[0-9]+', value):
+        raise ValueError("Not an id: %r" % (value,))
+    number = int(value)
+    if not -MAX_INT - 1 <= number <= MAX_INT:
+        raise ValueError("Id out of range: %r" % (value,))
+    return number
+
+
+@require_POST
+@login_required()
+@rate_limit('vote_batch')
+def vote_batch(request):
+    """
+    Submit the votes for many polls at once, such as every question of a survey.
+
+    The body is a JSON object mapping question ids to choice ids. All questions
+    are checked in one query and all ballots are written in one transaction.
+
+    :param request is the HttpRequest object.
+    :return JSON mapping every question id to voted, unchanged, queued, not_found, ended or invalid_choice,
+            400 if the body is not such an object or has more than ``POLLS_VOTE_BATCH_MAX`` ballots,
+            429 if the user or the ip is over the batch vote rate limit, or has fewer vote tokens than ballots.
+    """
+    try:
+        choices = {ballot_id(question_id): ballot_id(choice_id)
+                   for question_id, choice_id in json.loads(request.body).items()}
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': "Send a JSON object mapping question ids to choice ids."}, status=400)
+    if len(choices) > settings.POLLS_VOTE_BATCH_MAX:
+        return JsonResponse({'error': "At most %d ballots per request." % settings.POLLS_VOTE_BATCH_MAX}, status=400)
+    # Every ballot costs what a single vote does, so batching does not get around the vote limits.
+    wait = take('vote', request, cost=len(choices))
+    if wait:
+        return too_many_requests(wait)
+    user = request.user
+    buffer = get_buffer()
+    if buffer is not None:
+        valid, statuses = check_ballots(choices)
+        for question_id, choice_id in valid.items():
+            buffer.enqueue(user.id, question_id, choice_id)
+            statuses[question_id] = 'queued'
+    else:
+        statuses = cast_ballots(user, choices)
+    cast = {question_id: choices[question_id] for question_id, status in statuses.items()
+            if status in ('voted', 'queued')}
+    if cast:
+        audit.record('vote_batch', request, user, ballots=cast)
+    return JsonResponse({'results': {str(question_id): statuses[question_id] for question_id in choices}})
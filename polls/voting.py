@@ -0,0 +1,215 @@
+"""Vote engine that applies ballots to the tallies as atomic deltas."""
+import random
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, IntegerField, OuterRef, Value, When
+from .cache import bump_version
+from .live import hub
+from .models import Choice, ChoiceShard, Question, Vote
+from .snapshots import discard_many
+
+
+def add_votes(choice_id, delta):
+    """
+    Add ``delta`` to a choice's counter.
+
+    With ``POLLS_VOTE_SHARDS`` set, the delta goes to one of that many shard rows picked at random,
+    so concurrent ballots for the same choice do not all wait on one row lock.
+
+    :param choice_id is the id of the choice.
+    :param delta is the number of votes to add, negative to take votes away.
+    """
+    shards = settings.POLLS_VOTE_SHARDS
+    if not shards:
+        Choice.objects.filter(pk=choice_id).update(votes=F('votes') + delta)
+        return
+    shard = ChoiceShard.objects.filter(choice_id=choice_id, shard=random.randrange(shards))
+    if not shard.update(votes=F('votes') + delta):
+        ChoiceShard.objects.bulk_create([ChoiceShard(choice_id=choice_id, shard=i) for i in range(shards)],
+                                        ignore_conflicts=True)
+        shard.update(votes=F('votes') + delta)
+
+
+def cast_vote(user, question, selected_choice):
+    """
+    Record the user's ballot and move the tally from the old choice to the new one.
+
+    The cost is a fixed number of queries no matter how many choices or votes the poll has.
+
+    :param user is the voter.
+    :param question is the question being voted on.
+    :param selected_choice is the choice picked by the user.
+    :return the user's Vote for this question.
+    """
+    # The first statement is a write, so SQLite takes the write lock up front and waits on
+    # busy_timeout instead of failing to upgrade a read lock half way through the transaction.
+    with transaction.atomic():
+        add_votes(selected_choice.id, 1)
+        vote = Vote.objects.select_for_update().filter(user=user, question=question).first()
+        if vote is None:
+            vote = Vote.objects.create(user=user, question=question, selected_choice=selected_choice)
+        elif vote.selected_choice_id == selected_choice.id:
+            transaction.set_rollback(True)
+            return vote
+        else:
+            add_votes(vote.selected_choice_id, -1)
+            vote.selected_choice = selected_choice
+            vote.save(update_fields=['selected_choice'])
+    bump_version(question.id)
+    hub.publish(question.id)
+    return vote
+
+
+def apply_ballots(ballots):
+    """
+    Apply many ballots at once with bulk writes in a single transaction.
+
+    :param ballots is a dict mapping (user id, question id) to the selected choice id.
+    :return the number of ballots that changed a tally.
+    """
+    return len(_apply_ballots(ballots))
+
+
+def _apply_ballots(ballots):
+    """Apply many ballots in one transaction and return the (user id, question id) keys that changed a tally."""
+    if not ballots:
+        return []
+    user_ids = {user_id for user_id, _ in ballots}
+    question_ids = {question_id for _, question_id in ballots}
+    deltas = Counter()
+    new_votes, changed_votes = [], []
+    with transaction.atomic():
+        existing = Vote.objects.select_for_update().filter(user_id__in=user_ids, question_id__in=question_ids)
+        existing = {(vote.user_id, vote.question_id): vote for vote in existing}
+        for key, choice_id in ballots.items():
+            vote = existing.get(key)
+            if vote is None:
+                new_votes.append(Vote(user_id=key[0], question_id=key[1], selected_choice_id=choice_id))
+            elif vote.selected_choice_id != choice_id:
+                deltas[vote.selected_choice_id] -= 1
+                vote.selected_choice_id = choice_id
+                changed_votes.append(vote)
+            else:
+                continue
+            deltas[choice_id] += 1
+        Vote.objects.bulk_create(new_votes)
+        Vote.objects.bulk_update(changed_votes, ['selected_choice'])
+        deltas = {choice_id: delta for choice_id, delta in deltas.items() if delta}
+        if deltas:
+            shift = Case(*[When(pk=choice_id, then=Value(delta)) for choice_id, delta in deltas.items()],
+                         output_field=IntegerField())
+            Choice.objects.filter(pk__in=deltas).update(votes=F('votes') + shift)
+        touched = {vote.question_id for vote in new_votes + changed_votes}
+        if touched:
+            # Buffered ballots may land after their question ended and was frozen; freeze it again on the next read.
+            discard_many(touched)
+    for question_id in touched:
+        bump_version(question_id)
+        hub.publish(question_id)
+    return [(vote.user_id, vote.question_id) for vote in new_votes + changed_votes]
+
+
+def reconcile_votes(question_ids=None, batch_size=1000):
+    """
+    Recount Choice.votes from the Vote rows, reset the shards and fix the choices that drifted.
+
+    :param question_ids is the ids of the questions to reconcile, or None for every question.
+    :param batch_size is the number of choices read and written at a time.
+    :return the number of choices whose tally was fixed.
+    """
+    choices = Choice.objects.only('id', 'question_id', 'votes').order_by('pk')
+    votes = Vote.objects.all()
+    shards = ChoiceShard.objects.exclude(votes=0)
+    if question_ids is not None:
+        choices = choices.filter(question_id__in=question_ids)
+        votes = votes.filter(question_id__in=question_ids)
+        shards = shards.filter(choice__question_id__in=question_ids)
+    with transaction.atomic():
+        shards.update(votes=0)
+        counts = dict(votes.order_by().values_list('selected_choice').annotate(total=Count('id')))
+        drifted = []
+        for choice in choices.iterator(chunk_size=batch_size):
+            total = counts.get(choice.id, 0)
+            if choice.votes != total:
+                choice.votes = total
+                drifted.append(choice)
+        Choice.objects.bulk_update(drifted, ['votes'], batch_size=batch_size)
+        touched = {choice.question_id for choice in drifted}
+        if touched:
+            discard_many(touched)
+    for question_id in touched:
+        bump_version(question_id)
+        hub.publish(question_id)
+    return len(drifted)
+
+
+def check_ballots(choices, now=None):
+    """
+    Check many ballots in one query: each question must exist, be open and have the selected choice.
+
+    :param choices is a dict mapping question id to the selected choice id.
+    :param now is the time to compare against, defaults to the current time.
+    :return (valid, rejected) where valid maps question id to choice id for the ballots that
+            can be cast, and rejected maps question id to not_found, ended or invalid_choice.
+    """
+    if not choices:
+        return {}, {}
+    chosen = Case(*[When(pk=question_id, then=Value(choice_id)) for question_id, choice_id in choices.items()],
+                  output_field=IntegerField())
+    rows = Question.objects.filter(pk__in=choices).with_status(now).annotate(
+        chosen=chosen, valid=Exists(Choice.objects.filter(question=OuterRef('pk'), pk=OuterRef('chosen'))),
+    ).values_list('pk', 'is_open', 'valid')
+    valid, rejected = {}, {question_id: 'not_found' for question_id in choices}
+    for question_id, is_open, has_choice in rows:
+        if not is_open:
+            rejected[question_id] = 'ended'
+        elif not has_choice:
+            rejected[question_id] = 'invalid_choice'
+        else:
+            del rejected[question_id]
+            valid[question_id] = choices[question_id]
+    return valid, rejected
+
+
+def cast_ballots(user, choices):
+    """
+    Record a user's ballots on many questions with one check and one write transaction.
+
+    :param user is the voter.
+    :param choices is a dict mapping question id to the selected choice id.
+    :return dict mapping every question id to voted, unchanged, not_found, ended or invalid_choice.
+    """
+    valid, statuses = check_ballots(choices)
+    applied = {question_id for _, question_id in _apply_ballots(
+        {(user.id, question_id): choice_id for question_id, choice_id in valid.items()})}
+    for question_id in valid:
+        statuses[question_id] = 'voted' if question_id in applied else 'unchanged'
+    return statuses
+
+
+def last_votes(user, question_ids):
+    """
+    Look up the user's ballots for a page of questions in one query.
+
+    :param user is the voter.
+    :param question_ids is the ids of the questions on the page.
+    :return dict mapping question id to the text of the selected choice.
+    """
+    if not user.is_authenticated:
+        return {}
+    ballots = Vote.objects.filter(user=user, question_id__in=question_ids)
+    return dict(ballots.values_list('question_id', 'selected_choice__choice_text'))
+
+
+def attach_last_votes(user, questions):
+    """
+    Set ``last_vote`` on each question to the user's selected choice, or an empty string.
+
+    :param user is the voter.
+    :param questions is the questions shown on the page.
+    """
+    questions = list(questions)
+    votes = last_votes(user, [question.id for question in questions])
+    for question in questions:
+        question.last_vote = votes.get(question.id, "")